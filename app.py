@@ -6,9 +6,11 @@ load_dotenv()
 import os
 import re
 import json
+import time
 import nltk
 import requests
 from functools import wraps
+from itertools import chain
 from datetime import datetime, timedelta
 import warnings
 
@@ -18,7 +20,7 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 
 nltk.download('stopwords', quiet=True)
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, send_file, Response, stream_with_context, abort
 from markupsafe import Markup
 from flask_cors import CORS, cross_origin
 
@@ -26,25 +28,25 @@ from clerk_backend_api import Clerk
 
 from model.predict import predict
 from utils.cleaning import count_offensive_words, OFFENSIVE_WORDS
-import plotly.graph_objects as go
-import plotly.io as pio
 
 from helpers.youtube_fetch import (
-    get_comments_by_video,
-    get_comments_by_channel,
     extract_video_id,
     extract_channel_id
 )
 from helpers.analysis import (
-    analyze_comments_sentiment_hate,
-    prepare_timeline_data,
-    generate_insights,
-    calculate_kpis
+    new_aggregates,
+    summarize_aggregates
 )
+from helpers.csv_analysis import analyze_csv_stream, result_owner as csv_result_owner, result_path as csv_result_path
+from helpers.result_store import save_result, get_result, query_result_comments
+from helpers import http_cache
+from helpers.history_store import record_analysis, recent_analyses, hate_trend, import_legacy_json
+from helpers import admission, api_cache, youtube_quota, tweet_store, watch_store, scheduler
+from helpers.export import EXPORT_FORMATS, iter_csv, iter_ndjson, parquet_available, parquet_path
 
-# Ensure twitter utils import
-from twitter_utils import fetch_tweets
-from apify_client import ApifyClient
+from helpers.instagram_fetch import parse_post_urls, MAX_RESULTS_PER_POST
+from helpers.sources import YouTubeSource, TwitterSource, InstagramSource, SourceError, analyze_source
+from helpers.records import CommentBatch
 
 # Initialize Flask app
 template_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static', 'templates')
@@ -79,6 +81,29 @@ else:
 # Enable CORS globally
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# Compression, validators and fingerprinted static URLs
+http_cache.init_app(app)
+
+# One-time import of the legacy data/user_analyses.json into the history store
+try:
+    imported = import_legacy_json()
+    if imported:
+        print(f"[INFO] Imported {imported} legacy analyses into the history store")
+except Exception as e:
+    print(f"[WARNING] Legacy history import failed: {e}")
+
+# One-time import of the old cache/twitter_*.json files into the tweet store
+try:
+    imported = tweet_store.import_json_cache()
+    if imported:
+        print(f"[INFO] Imported {imported} cached tweets into the tweet store")
+except Exception as e:
+    print(f"[WARNING] Tweet cache import failed: {e}")
+
+# Background refresh of watched channels/videos (WATCH_SCHEDULER=0 to run it as its own process instead)
+if scheduler.ENABLED:
+    scheduler.start()
+
 # -----------------------
 # Authentication Helpers
 # -----------------------
@@ -256,7 +281,17 @@ def signup():
 @login_required
 def profile():
     # Render a page with Clerk UserProfile component
-    return render_template('auth/profile.html')
+    history = recent_analyses(g.user['id'], limit=10)
+    return render_template('auth/profile.html', history=history)
+
+@app.route('/api/history/trend')
+@login_required
+def history_trend_api():
+    """The signed-in user's hate-speech % over time for one target: /api/history/trend?source=youtube&target=<id>"""
+    target = request.args.get('target', '').strip()
+    if not target:
+        return jsonify({'error': 'target is required.'}), 400
+    return jsonify({'trend': hate_trend(g.user['id'], request.args.get('source', 'youtube'), target)})
 
 @app.route('/logout')
 def logout():
@@ -271,9 +306,22 @@ def logout():
 # -----------------------
 # Protected Routes
 # -----------------------
+def _is_csv_upload():
+    return request.method == 'POST' and request.files.get('csv_file') is not None and request.files['csv_file'].filename != ''
+
+def _csv_rejected(exc):
+    return render_template('input.html', sentiment="", hate_speech="", user_input="",
+                           sentiment_score={"Positive": 0, "Neutral": 0, "Negative": 0},
+                           hate_score={"Hate Speech": 0, "None": 0}, offensive_word_count=0,
+                           vulgarity="--", sentiment_chart=None, bar_chart_div=None,
+                           line_chart_div=None, highlighted_input=None, sentiment_emoji="",
+                           offensive_words_found=[],
+                           csv_error=f"Too many analyses in progress — please retry in {exc.retry_after}s.")
+
 @app.route('/input', methods=['GET', 'POST'])
 @app.route('/analyser/input', methods=['GET', 'POST'])
 @login_required
+@admission.admission_controlled('csv_upload', when=_is_csv_upload, on_reject=_csv_rejected)
 def input_page():
     # Logic remains same, just protected
     # [Rest of the function logic...]
@@ -294,28 +342,28 @@ def input_page():
     offensive_found = []
 
     if request.method == 'POST':
-        import pandas as pd
-
         if 'csv_file' in request.files and request.files['csv_file'].filename != '':
             csv_file = request.files['csv_file']
-            try:
-                df = pd.read_csv(csv_file)
-                text_column = None
-                possible_columns = ['text', 'tweet', 'content', 'message', 'caption']
-                for col in df.columns:
-                    if any(possible_col in col.lower() for possible_col in possible_columns):
-                        text_column = col
-                        break
-                if text_column is None and len(df.columns) > 0:
-                    text_column = df.columns[0]
-                if text_column and len(df) > 0:
-                    rows_to_analyze = min(5, len(df))
-                    texts = df[text_column].head(rows_to_analyze).fillna('').tolist()
-                    input_text = '\n'.join(texts)
-                else:
-                    input_text = "Could not find text data in the CSV file."
-            except Exception as e:
-                input_text = f"Error processing CSV file: {str(e)}"
+            csv_summary = analyze_csv_stream(csv_file.stream, user_id=(g.user or {}).get('id'))
+            if 'error' not in csv_summary:
+                return render_template(
+                    'input.html',
+                    sentiment=sentiment,
+                    hate_speech=hate_speech,
+                    user_input=input_text,
+                    sentiment_score=sentiment_score,
+                    hate_score=hate_score,
+                    offensive_word_count=offensive_word_count,
+                    vulgarity=vulgarity,
+                    sentiment_chart=None,
+                    bar_chart_div=bar_chart_div,
+                    line_chart_div=line_chart_div,
+                    highlighted_input=highlighted_input,
+                    sentiment_emoji=sentiment_emoji,
+                    offensive_words_found=[],
+                    csv_summary=csv_summary
+                )
+            input_text = csv_summary['error']
         else:
             input_text = request.form.get('user_input', '')
 
@@ -369,25 +417,6 @@ def input_page():
             hate_score["Hate Speech"] = 100
             hate_score["None"] = 0
 
-        # charts code
-        labels = ['Positive', 'Neutral', 'Negative']
-        values = [sentiment_score['Positive'], sentiment_score['Neutral'], sentiment_score['Negative']]
-        fig_bar_sentiment = go.Figure(data=[go.Bar(x=labels, y=values, text=[f'{v:.0f}%' for v in values], textposition='auto', hoverinfo='y+text')])
-        fig_bar_sentiment.update_layout(margin=dict(t=20, b=20, l=20, r=20), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300, font=dict(family='Inter, sans-serif', color='white'), xaxis=dict(title='', tickfont=dict(size=14, color='#ffffff')), yaxis=dict(title='Score', tickfont=dict(size=12, color='#ffffff'), range=[0, 100]))
-        sentiment_chart = pio.to_html(fig_bar_sentiment, full_html=False)
-
-        from collections import Counter
-        offensive_freq = Counter([w for w in words if w in OFFENSIVE_WORDS_LIST])
-        if not offensive_freq:
-            bar_labels = ['No offensive words found']
-            bar_values = [0]
-        else:
-            bar_labels = list(offensive_freq.keys())
-            bar_values = list(offensive_freq.values())
-        fig_bar = go.Figure(data=[go.Bar(x=bar_labels, y=bar_values, textposition='auto', textfont=dict(color='white'), hoverinfo='x+y')])
-        fig_bar.update_layout(margin=dict(t=10, b=0, l=0, r=0), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=250, font=dict(family='Inter, sans-serif', color='white'))
-        bar_chart_div = pio.to_html(fig_bar, full_html=False)
-
         return render_template(
             'input.html',
             sentiment=sentiment,
@@ -397,7 +426,7 @@ def input_page():
             hate_score=hate_score,
             offensive_word_count=offensive_word_count,
             vulgarity=vulgarity,
-            sentiment_chart=sentiment_chart,
+            sentiment_chart=None,
             bar_chart_div=bar_chart_div,
             line_chart_div=line_chart_div,
             highlighted_input=highlighted_input,
@@ -422,18 +451,126 @@ def input_page():
         offensive_words_found=[]
     )
 
+@app.route('/analyser/input/results/<job_id>')
+@login_required
+def csv_results_download(job_id):
+    path = csv_result_path(job_id)
+    # Like stored results, a job's rows are only served to the user who uploaded it
+    owner = csv_result_owner(job_id)
+    if path and os.path.exists(path) and (owner is None or owner != (g.user or {}).get('id')):
+        abort(404)
+    if not path or not os.path.exists(path):
+        flash("That result file is no longer available.", "error")
+        return redirect(url_for('input_page'))
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name=f"hatesense-{job_id[:8]}.csv")
+
+# -----------------------
+# Dashboard (watched channels/videos, refreshed by helpers.scheduler)
+# -----------------------
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    return redirect(url_for('home'))
+    # A read of the precomputed snapshots — nothing is fetched or classified here
+    watches = watch_store.list_watches(g.user['id'])
+    for w in watches:
+        if w['computed_at']:
+            w['updated'] = datetime.fromtimestamp(w['computed_at']).strftime('%Y-%m-%d %H:%M')
+    return render_template('dashboard.html', watches=watches,
+                           default_interval_minutes=scheduler.DEFAULT_INTERVAL // 60,
+                           min_interval_minutes=scheduler.MIN_INTERVAL // 60)
+
+@app.route('/api/dashboard')
+@login_required
+def dashboard_api():
+    return jsonify({'watches': watch_store.list_watches(g.user['id']), 'scheduler': scheduler.metrics()})
+
+@app.route('/dashboard/watch', methods=['POST'])
+@login_required
+def dashboard_add_watch():
+    youtube_input = request.form.get('youtube_url', '').strip()
+    try:
+        past_days = min(max(1, int(request.form.get('past_days', 7))), 30)
+        interval = max(scheduler.MIN_INTERVAL, int(request.form.get('interval_minutes') or scheduler.DEFAULT_INTERVAL // 60) * 60)
+    except ValueError:
+        past_days, interval = 7, scheduler.DEFAULT_INTERVAL
+
+    video_id = extract_video_id(youtube_input)
+    channel_id = None
+    if not video_id:
+        channel_id = extract_channel_id(youtube_input)
+        if not channel_id and re.match(r"^UC[A-Za-z0-9_\-]{20,}$", youtube_input):
+            channel_id = youtube_input
+    if not video_id and not channel_id:
+        flash("Invalid YouTube URL or ID.", "error")
+        return redirect(url_for('dashboard'))
+
+    watch_store.add_watch(g.user['id'], 'video' if video_id else 'channel', video_id or channel_id,
+                          past_days=past_days, interval_seconds=interval)
+    flash("Watching — the first analysis will appear here shortly.", "info")
+    return redirect(url_for('dashboard'))
+
+@app.route('/dashboard/watch/<int:watch_id>/refresh', methods=['POST'])
+@login_required
+def dashboard_refresh_watch(watch_id):
+    watch_store.request_refresh(g.user['id'], watch_id)
+    return redirect(url_for('dashboard'))
+
+@app.route('/dashboard/watch/<int:watch_id>/delete', methods=['POST'])
+@login_required
+def dashboard_remove_watch(watch_id):
+    watch_store.remove_watch(g.user['id'], watch_id)
+    return redirect(url_for('dashboard'))
+
+def _owns(stored):
+    """Stored results are private to the user who ran the analysis."""
+    return stored['user_id'] is not None and stored['user_id'] == (g.user or {}).get('id')
 
 @app.route('/export')
 @login_required
 def export():
-    return redirect(url_for('home'))
+    """
+    Streams a stored analysis: /export?id=<result_id>&format=csv|ndjson|parquet.
+    CSV/NDJSON are generated row by row; `offset=N` resumes after N rows.
+    Parquet is built once per result and served with HTTP range support.
+    """
+    result_id = request.args.get('id', '')
+    fmt = request.args.get('format', 'csv').lower()
+    result = get_result(result_id)
+    if result is not None and not _owns(result):
+        abort(404)
+    if result is None or fmt not in EXPORT_FORMATS:
+        flash("Nothing to export — run an analysis first.", "error")
+        return redirect(url_for('home'))
+
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        offset = 0
+    filename = f"hatesense-{result_id[:8]}.{fmt}"
+
+    if fmt == 'parquet':
+        if not parquet_available():
+            return jsonify({'error': 'Parquet export is not available on this server (pyarrow missing).'}), 501
+        return send_file(parquet_path(result_id), mimetype=EXPORT_FORMATS[fmt],
+                         as_attachment=True, download_name=filename, conditional=True)
+
+    body = iter_csv(result_id, offset=offset) if fmt == 'csv' else iter_ndjson(result_id, offset=offset)
+    resp = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[fmt])
+    resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp.headers['X-Total-Rows'] = str(result['total_comments'])
+    resp.headers['X-Row-Offset'] = str(offset)
+    return resp
 
 @app.route('/youtube-analysis', methods=['GET', 'POST'])
 @login_required
+@admission.admission_controlled(
+    'youtube_analysis',
+    when=lambda: request.method == 'POST',
+    on_reject=lambda exc: render_template('youtube_analysis.html', results={
+        'error': f"Too many analyses in progress — please retry in {exc.retry_after}s."
+    })
+)
 def youtube_analysis():
     # Same logic as before, just kept the view handling inside
     # To save space in this rewrite, assume the content is mostly same but protected
@@ -454,6 +591,7 @@ def youtube_analysis():
         try:
             youtube_input = request.form.get('youtube_url', '').strip()
             past_days = min(max(1, int(request.form.get('past_days', 7))), 30)
+            include_replies = request.form.get('include_replies') == 'on'
 
             if not youtube_input:
                 return render_template('youtube_analysis.html', results={'error': 'Please enter a YouTube video URL or channel ID'})
@@ -468,64 +606,205 @@ def youtube_analysis():
             if not video_id and not channel_id:
                 return render_template('youtube_analysis.html', results={'error': 'Invalid YouTube URL or ID.'})
 
-            if video_id:
-                comments_data = get_comments_by_video(video_id, past_days)
-            else:
-                comments_data = get_comments_by_channel(channel_id, past_days)
-
-            if isinstance(comments_data, dict) and 'error' in comments_data:
-                return render_template('youtube_analysis.html', results={'error': comments_data['error']})
-            
-            if not isinstance(comments_data, list) or len(comments_data) == 0:
-                 return render_template('youtube_analysis.html', results={'error': 'No comments found.'})
-
-            normalized_comments = []
-            for raw in comments_data:
-                text = (raw.get('text') or '').strip()
-                if not text: continue
-                
-                try: sent_raw = predict(text, mode='sentiment')
-                except: sent_raw = 'Neutral'
-                try: hate_raw = predict(text, mode='hate')
-                except: hate_raw = 'Safe'
-
-                normalized_comments.append({
-                    'text': text,
-                    'username': raw.get('username', 'Unknown'),
-                    'date': raw.get('date', ''),
-                    'likes': int(raw.get('likes', 0)),
-                    'sentiment': str(sent_raw),
-                    'hate_speech': str(hate_raw)
+            source = YouTubeSource(video_id=video_id, channel_id=channel_id, past_days=past_days,
+                                   replies=include_replies)
+            fetch_stats = source.stats
+
+            # fetch → dedupe → classify → aggregate/store run concurrently, a page at a time
+            aggregates = new_aggregates()
+            stream = analyze_source(source, aggregates)
+            first = next(stream, None)
+            if first is None:
+                return render_template('youtube_analysis.html', results={'error': 'No comments found.'})
+
+            # Comments stay server-side; the page only gets the summary and pages them in
+            results = {}
+            def summary():
+                results.update(summarize_aggregates(aggregates))
+                results.update({
+                    'channel_info': {'name': 'Analyzed Content'},
+                    'fetch_stats': fetch_stats,
+                    'error': None
                 })
-
-            analyzed_comments = analyze_comments_sentiment_hate(normalized_comments)
-            kpis = calculate_kpis(analyzed_comments)
-            
-            # Simple return for now to avoid huge file complexity in this rewrite step
-            results = {
-                'analyzed_comments': analyzed_comments,
-                'total_comments': len(analyzed_comments),
-                'kpis': kpis,
-                'insights': generate_insights(analyzed_comments),
-                'channel_info': {'name': 'Analyzed Content'}, 
-                'error': None
-            }
-            
-            # Serialize for Chart.js
-            results_json = json.dumps(results, default=str)
-
-            return render_template('youtube_analysis.html', results=results, results_json=results_json)
+                return {'input': youtube_input, 'past_days': past_days, 'replies': include_replies,
+                        'summary': dict(results)}
+
+            results['result_id'] = save_result(
+                chain([first], stream),
+                user_id=(g.user or {}).get('id'),
+                source='youtube',
+                meta=summary
+            )
+            print(f"[INFO] YouTube fetch {video_id or channel_id}: {fetch_stats}")
+
+            record_analysis(
+                (g.user or {}).get('id'), 'youtube', results['kpis'],
+                target=video_id or channel_id, result_id=results['result_id']
+            )
+
+            return _render_youtube_results(results)
             
         except Exception as e:
             return render_template('youtube_analysis.html', results={'error': str(e)})
 
+    # Re-open a stored analysis: /youtube-analysis?result=<id>
+    stored = get_result(request.args.get('result', ''))
+    if stored and _owns(stored) and stored['meta'].get('summary'):
+        etag = http_cache.result_etag(stored, 'page')
+        if http_cache.not_modified(etag, stored['created_at']):
+            return http_cache.apply_validators(app.response_class(status=304), etag, stored['created_at'])
+        results = dict(stored['meta']['summary'], result_id=stored['id'])
+        resp = app.make_response(_render_youtube_results(results))
+        return http_cache.apply_validators(resp, etag, stored['created_at'])
+
     return render_template('youtube_analysis.html', results=None)
 
-@app.route('/instagram-analysis')
+def _render_youtube_results(results):
+    # Serialize for Chart.js (summary only — no per-comment data)
+    results_json = json.dumps(results, default=str)
+    return render_template('youtube_analysis.html', results=results, results_json=results_json)
+
+@app.route('/api/results/<result_id>/comments')
+@login_required
+def result_comments_api(result_id):
+    """Paginated, filterable comments of a stored analysis."""
+    stored = get_result(result_id)
+    if stored is None or not _owns(stored):
+        return jsonify({'error': 'Unknown result id.'}), 404
+    try:
+        per_page = int(request.args.get('per_page', 25))
+        after = int(request.args['after']) if request.args.get('after') else None
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'per_page, after and before must be integers.'}), 400
+    # Stored results never change, so the query string fully identifies the response
+    etag = http_cache.result_etag(stored, 'comments', request.query_string.decode('utf-8', 'replace'))
+    if http_cache.not_modified(etag, stored['created_at']):
+        return http_cache.apply_validators(app.response_class(status=304), etag, stored['created_at'])
+    resp = jsonify(query_result_comments(
+        result_id,
+        sentiment=request.args.get('sentiment') or None,
+        hate_speech=request.args.get('hate_speech') or None,
+        date_from=request.args.get('date_from') or None,
+        date_to=request.args.get('date_to') or None,
+        after=after,
+        before=before,
+        per_page=per_page,
+    ))
+    return http_cache.apply_validators(resp, etag, stored['created_at'])
+
+@app.route('/api/admission/metrics')
+@login_required
+def admission_metrics():
+    """Queueing delay and rejection counters for the admission-controlled routes."""
+    return jsonify(admission.metrics())
+
+@app.route('/api/cache/metrics')
 @login_required
+def api_cache_metrics():
+    """Hit/miss/eviction counters for the shared upstream API response cache."""
+    return jsonify(api_cache.metrics())
+
+@app.route('/api/youtube/quota')
+@login_required
+def youtube_quota_usage():
+    """Today's YouTube Data API quota consumption per priority and what's left."""
+    return jsonify(youtube_quota.usage())
+
+@app.route('/twitter-analysis', methods=['GET', 'POST'])
+@login_required
+@admission.admission_controlled('twitter_analysis', when=lambda: request.method == 'POST')
+def twitter_analysis():
+    """Twitter page; POST {query, max_results} returns the labelled tweets and a summary as JSON."""
+    if request.method == 'GET':
+        return render_template('twitter.html', query=request.args.get('q', ''))
+
+    payload = request.get_json(silent=True) or {}
+    query = (payload.get('query') or '').strip()
+    if not query:
+        return jsonify({'error': 'Please enter a hashtag, keyword, or username'}), 400
+    try:
+        max_results = int(payload.get('max_results') or 30)
+    except (TypeError, ValueError):
+        max_results = 30
+
+    # Cached, stale-while-revalidate or live (only tweets newer than the stored ones)
+    source = TwitterSource(query, max_results=max_results)
+    aggregates = new_aggregates()
+    analyzed = list(analyze_source(source, aggregates))
+    tweets = {str(t.get('id')): t for t in source.tweets}
+
+    summary = summarize_aggregates(aggregates)
+    kpis = summary['kpis']
+    sentiment_distribution, hate_distribution = summary['sentiment_distribution'], summary['hate_distribution']
+    if source.stats['source'] != 'mock' and analyzed:
+        record_analysis((g.user or {}).get('id'), 'twitter', kpis, target=query)
+
+    return jsonify({
+        'tweets': [{
+            'id': a['id'],
+            'text': a['text'],
+            'username': tweets.get(str(a['id']), {}).get('username') or '',
+            'created_at': tweets.get(str(a['id']), {}).get('created_at'),
+            'sentiment': a['sentiment'],
+            'hate_speech': a['hate_speech']
+        } for a in analyzed],
+        'summary': {
+            'total': kpis['total_comments'],
+            'hate_pct': kpis['hate_speech_pct'],
+            'positive_pct': kpis['positive_pct'],
+            'positive_count': sentiment_distribution['Positive'],
+            'neutral_count': sentiment_distribution['Neutral'],
+            'negative_count': sentiment_distribution['Negative'],
+            'hate_count': hate_distribution['Hate Speech']
+        },
+        'source': source.stats['source']
+    })
+
+@app.route('/instagram-analysis', methods=['GET', 'POST'])
+@login_required
+@admission.admission_controlled(
+    'instagram_analysis',
+    when=lambda: request.method == 'POST',
+    on_reject=lambda exc: render_template('instagram_analysis.html', results={
+        'error': f"Too many analyses in progress — please retry in {exc.retry_after}s."
+    })
+)
 def instagram_analysis():
-    # Placeholder for Instagram Analysis if it was there or requested
-    return render_template('instagram_analysis.html', results=None)
+    """Comments of Instagram posts/reels via the Apify scraper, classified as dataset pages arrive."""
+    if request.method == 'GET':
+        return render_template('instagram_analysis.html', results=None)
+
+    urls = parse_post_urls(request.form.get('instagram_urls', ''))
+    if not urls:
+        return render_template('instagram_analysis.html', results={'error': 'Please enter at least one Instagram post or reel URL.'})
+    try:
+        results_limit = min(max(1, int(request.form.get('results_limit', 50))), MAX_RESULTS_PER_POST)
+    except ValueError:
+        results_limit = 50
+
+    source = InstagramSource(urls, results_limit)
+    aggregates = new_aggregates()
+    try:
+        # scrape → classify run concurrently: the first dataset page is labelled while the actor keeps going
+        analyzed_comments = CommentBatch().extend(analyze_source(source, aggregates))
+    except SourceError as e:
+        return render_template('instagram_analysis.html', results={'error': str(e)})
+    fetch_stats = source.stats
+    print(f"[INFO] Instagram fetch {len(urls)} post(s): {fetch_stats}")
+
+    if not analyzed_comments:
+        return render_template('instagram_analysis.html', results={'error': 'No comments found.'})
+
+    results = summarize_aggregates(aggregates)
+    results.update({'fetch_stats': fetch_stats, 'error': None})
+    record_analysis(
+        (g.user or {}).get('id'), 'instagram', results['kpis'], target=source.target
+    )
+    # Charts get the summary only; the comment table is rendered server-side
+    results_json = json.dumps(results, default=str)
+    results['analyzed_comments'] = analyzed_comments
+    return render_template('instagram_analysis.html', results=results, results_json=results_json)
 
 if __name__ == '__main__':
     app.run(debug=True, port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
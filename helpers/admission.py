@@ -0,0 +1,278 @@
+# helpers/admission.py — admission control for expensive routes, shared across workers
+
+import os
+import math
+import time
+import uuid
+import threading
+from functools import wraps
+
+from flask import g, request, jsonify, make_response
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('admission.db')
+
+# Concurrency caps (running analyses)
+GLOBAL_MAX_CONCURRENT = int(os.getenv('ADMISSION_GLOBAL_MAX', 4))
+PER_USER_MAX_CONCURRENT = int(os.getenv('ADMISSION_PER_USER_MAX', 1))
+# Token bucket per user: sustained rate and burst
+RATE_PER_MINUTE = float(os.getenv('ADMISSION_RATE_PER_MINUTE', 6))
+BURST = float(os.getenv('ADMISSION_BURST', 3))
+# Bounded wait queue
+QUEUE_MAX = int(os.getenv('ADMISSION_QUEUE_MAX', 8))
+MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT', 10))
+# Slots held by a crashed worker expire after this long; a running request renews its
+# slot every SLOT_TTL_SECONDS / 3, so long analyses keep it however long they take
+SLOT_TTL_SECONDS = float(os.getenv('ADMISSION_SLOT_TTL', 300))
+
+_WAIT_BUCKETS_MS = (0, 50, 250, 1000, 5000)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    route TEXT NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_slots_user ON slots (user_id);
+CREATE TABLE IF NOT EXISTS waiters (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    user_id TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; carries a Retry-After hint in seconds."""
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _bump(conn, name, amount=1.0):
+    conn.execute(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+        (name, amount),
+    )
+
+def _record_wait(conn, waited_ms):
+    _bump(conn, 'admitted')
+    _bump(conn, 'wait_ms_total', waited_ms)
+    conn.execute(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)',
+        ('wait_ms_max', waited_ms),
+    )
+    bucket = next((b for b in reversed(_WAIT_BUCKETS_MS) if waited_ms >= b), 0)
+    _bump(conn, f'wait_ms_bucket_{bucket}')
+
+# -----------------------------
+# Token bucket
+# -----------------------------
+def _take_token(conn, user_id, now):
+    """Consume one token; returns 0 on success or the seconds until one is available."""
+    rate = RATE_PER_MINUTE / 60.0
+    row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE user_id = ?', (user_id,)).fetchone()
+    tokens = BURST if row is None else min(BURST, row['tokens'] + (now - row['updated_at']) * rate)
+    if tokens < 1.0:
+        return (1.0 - tokens) / rate if rate > 0 else SLOT_TTL_SECONDS
+    conn.execute(
+        'INSERT INTO buckets (user_id, tokens, updated_at) VALUES (?, ?, ?) '
+        'ON CONFLICT(user_id) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+        (user_id, tokens - 1.0, now),
+    )
+    return 0
+
+def _refund_token(conn, user_id):
+    conn.execute('UPDATE buckets SET tokens = MIN(?, tokens + 1) WHERE user_id = ?', (BURST, user_id))
+
+# -----------------------------
+# Slots
+# -----------------------------
+def _ahead(conn, queued_until, now):
+    """
+    Waiters queued before the one whose entry expires at `queued_until` (None: a new
+    arrival, behind everyone) that could run now. Entries all get the same lifetime,
+    so expires_at orders the queue by enqueue time. Waiters held back by their own
+    per-user cap don't count: they couldn't use a free slot anyway.
+    """
+    return conn.execute(
+        'SELECT COUNT(*) FROM waiters w WHERE w.expires_at >= ? AND (? IS NULL OR w.expires_at < ?)'
+        ' AND (SELECT COUNT(*) FROM slots s WHERE s.user_id = w.user_id) < ?',
+        (now, queued_until, queued_until, PER_USER_MAX_CONCURRENT),
+    ).fetchone()[0]
+
+def _try_slot(conn, token, user_id, route, now, queued_until=None):
+    """Take a slot if one is free after those owed to the waiters ahead (oldest first)."""
+    conn.execute('DELETE FROM slots WHERE expires_at < ?', (now,))
+    total = conn.execute('SELECT COUNT(*) FROM slots').fetchone()[0]
+    mine = conn.execute('SELECT COUNT(*) FROM slots WHERE user_id = ?', (user_id,)).fetchone()[0]
+    if total >= GLOBAL_MAX_CONCURRENT or mine >= PER_USER_MAX_CONCURRENT:
+        return False
+    if total + _ahead(conn, queued_until, now) >= GLOBAL_MAX_CONCURRENT:
+        return False
+    conn.execute(
+        'INSERT INTO slots (token, user_id, route, acquired_at, expires_at) VALUES (?,?,?,?,?)',
+        (token, user_id, route, now, now + SLOT_TTL_SECONDS),
+    )
+    return True
+
+def acquire(user_id, route):
+    """
+    Admit one expensive request or raise AdmissionRejected.
+
+    Order: per-user token bucket → free slot under the global/per-user caps →
+    otherwise wait in a bounded queue (fast rejection when it's full) for up to
+    MAX_WAIT_SECONDS. Freed slots go to the oldest waiter first; a new arrival
+    only takes one nobody queued can use. Returns a token to pass to release().
+    """
+    user_id = user_id or 'anonymous'
+    token = uuid.uuid4().hex
+    conn = _conn()
+    start = time.time()
+
+    # Rejections are decided inside the transaction but raised after it commits,
+    # so their counters, the token refund and the waiter cleanup are kept
+    rejected = None
+    with transaction(conn):
+        wait = _take_token(conn, user_id, start)
+        if wait:
+            _bump(conn, 'rejected_rate_limited')
+            rejected = AdmissionRejected('rate_limited', wait)
+        elif _try_slot(conn, token, user_id, route, start):
+            _record_wait(conn, 0.0)
+            return token
+        else:
+            conn.execute('DELETE FROM waiters WHERE expires_at < ?', (start,))
+            queued = conn.execute('SELECT COUNT(*) FROM waiters').fetchone()[0]
+            if queued >= QUEUE_MAX:
+                _refund_token(conn, user_id)
+                _bump(conn, 'rejected_queue_full')
+                rejected = AdmissionRejected('queue_full', MAX_WAIT_SECONDS)
+            else:
+                queued_until = start + MAX_WAIT_SECONDS + 5
+                conn.execute('INSERT INTO waiters (token, user_id, expires_at) VALUES (?,?,?)',
+                             (token, user_id, queued_until))
+    if rejected:
+        raise rejected
+
+    delay = 0.05
+    while not rejected:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        now = time.time()
+        with transaction(conn):
+            if _try_slot(conn, token, user_id, route, now, queued_until):
+                conn.execute('DELETE FROM waiters WHERE token = ?', (token,))
+                _record_wait(conn, (now - start) * 1000.0)
+                return token
+            if now - start >= MAX_WAIT_SECONDS:
+                conn.execute('DELETE FROM waiters WHERE token = ?', (token,))
+                _refund_token(conn, user_id)
+                _bump(conn, 'rejected_wait_timeout')
+                rejected = AdmissionRejected('wait_timeout', MAX_WAIT_SECONDS)
+    raise rejected
+
+def renew(token):
+    """Push a running request's slot expiry SLOT_TTL_SECONDS ahead. False once the slot is gone."""
+    conn = _conn()
+    with transaction(conn):
+        cur = conn.execute('UPDATE slots SET expires_at = ? WHERE token = ?',
+                           (time.time() + SLOT_TTL_SECONDS, token))
+        return cur.rowcount == 1
+
+class _Lease:
+    """Renews a slot on a daemon thread while the guarded request runs."""
+
+    def __init__(self, token):
+        self.token = token
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='admission-lease', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(SLOT_TTL_SECONDS / 3):
+            try:
+                if not renew(self.token):
+                    return
+            except Exception as e:
+                print(f"[WARNING] Admission slot renewal failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+def release(token):
+    if not token:
+        return
+    conn = _conn()
+    with transaction(conn):
+        conn.execute('DELETE FROM slots WHERE token = ?', (token,))
+
+def metrics():
+    """Counters across all workers plus the current queue/slot occupancy."""
+    conn = _conn()
+    now = time.time()
+    out = {r['name']: r['value'] for r in conn.execute('SELECT name, value FROM metrics')}
+    admitted = out.get('admitted', 0)
+    out['wait_ms_avg'] = round(out.get('wait_ms_total', 0) / admitted, 1) if admitted else 0.0
+    out['running'] = conn.execute('SELECT COUNT(*) FROM slots WHERE expires_at >= ?', (now,)).fetchone()[0]
+    out['queued'] = conn.execute('SELECT COUNT(*) FROM waiters WHERE expires_at >= ?', (now,)).fetchone()[0]
+    out['limits'] = {
+        'global_max_concurrent': GLOBAL_MAX_CONCURRENT,
+        'per_user_max_concurrent': PER_USER_MAX_CONCURRENT,
+        'rate_per_minute': RATE_PER_MINUTE,
+        'burst': BURST,
+        'queue_max': QUEUE_MAX,
+        'max_wait_seconds': MAX_WAIT_SECONDS,
+    }
+    return out
+
+# -----------------------------
+# Flask decorator
+# -----------------------------
+def admission_controlled(route, when=None, on_reject=None):
+    """
+    Wraps a view in acquire()/release(). `when()` limits control to the expensive
+    branch (e.g. POSTs with a file); `on_reject(exc)` builds the 429 body, which
+    defaults to JSON. Retry-After is always set.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if when is not None and not when():
+                return f(*args, **kwargs)
+            user_id = (getattr(g, 'user', None) or {}).get('id') or request.remote_addr
+            try:
+                token = acquire(user_id, route)
+            except AdmissionRejected as exc:
+                if on_reject is not None:
+                    resp = on_reject(exc)
+                else:
+                    resp = jsonify({'error': 'Too many analyses in progress. Please retry shortly.',
+                                    'reason': exc.reason, 'retry_after': exc.retry_after})
+                resp = make_response(resp, 429)
+                resp.headers['Retry-After'] = str(exc.retry_after)
+                return resp
+            lease = _Lease(token)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                lease.stop()
+                release(token)
+        return wrapper
+    return decorator
@@ -0,0 +1,334 @@
+# helpers/alerts.py — threshold alerts on rolling per-channel rates, with hysteresis and webhook delivery
+#
+# A rule, e.g. "hate speech over 5m above 10% with at least 50 comments":
+#
+#   {"name": "hate-spike", "metric": "hate_pct", "window": "5m", "op": ">", "threshold": 10,
+#    "clear": 8, "min_count": 50, "renotify_seconds": 0}
+#
+# fires once when the value crosses `threshold` and resolves once it is back past `clear`
+# (hysteresis: 8–10% neither fires nor resolves) or the window drops under min_count.
+# Counters are rolled forward message by message; no comment is ever rescanned.
+
+import os
+import json
+import time
+import uuid
+import queue
+import random
+import threading
+from collections import deque
+
+import requests
+
+# Webhook delivery: attempts per event and URL, exponential backoff with jitter between them
+MAX_ATTEMPTS = int(os.getenv('ALERT_WEBHOOK_MAX_ATTEMPTS', 5))
+BACKOFF_SECONDS = float(os.getenv('ALERT_WEBHOOK_BACKOFF', 0.5))
+MAX_BACKOFF_SECONDS = float(os.getenv('ALERT_WEBHOOK_MAX_BACKOFF', 30))
+TIMEOUT_SECONDS = float(os.getenv('ALERT_WEBHOOK_TIMEOUT', 5))
+# Events waiting per webhook before new ones are dropped (a receiver that is down for long)
+QUEUE_MAX = int(os.getenv('ALERT_WEBHOOK_QUEUE_MAX', 1000))
+
+# Counter layout: total, positive, neutral, negative, hate
+_TOTAL, _POS, _NEU, _NEG, _HATE = range(5)
+_SENTIMENT_SLOT = {'Positive': _POS, 'Neutral': _NEU, 'Negative': _NEG}
+METRICS = {'hate_pct': _HATE, 'positive_pct': _POS, 'neutral_pct': _NEU, 'negative_pct': _NEG}
+_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+# Retried besides 5xx: timeouts and rate limiting
+_RETRY_STATUSES = {408, 429}
+# Event times more than this far ahead of the wall clock are clamped to it: one sender
+# with a wrong clock would otherwise drag the watermark ahead and make the rest late
+MAX_SKEW_SECONDS = float(os.getenv('STREAM_MAX_SKEW', 5))
+
+def event_second(ts, limit):
+    """The whole second a message counts at: its timestamp, but no later than `limit`."""
+    return int(min(ts, limit))
+
+# -----------------------------
+# Rules
+# -----------------------------
+def _window_seconds(window):
+    if isinstance(window, (int, float)):
+        return int(window)
+    window = str(window).strip().lower()
+    if window[-1:] in _UNITS and window[:-1].isdigit():
+        return int(window[:-1]) * _UNITS[window[-1]]
+    if window.isdigit():
+        return int(window)
+    raise ValueError(f"Unknown window {window!r}; use seconds or e.g. 30s, 5m, 1h")
+
+def normalize_rule(rule):
+    """Fill defaults and validate one rule dict; raises ValueError with a readable message."""
+    metric = rule.get('metric', 'hate_pct')
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}")
+    op = rule.get('op', '>')
+    if op not in ('>', '<'):
+        raise ValueError(f"Unknown op {op!r}; use '>' or '<'")
+    threshold = float(rule['threshold'])
+    # Default clear level: 20% of the threshold back towards "normal"
+    clear = float(rule['clear']) if rule.get('clear') is not None else (
+        threshold * 0.8 if op == '>' else min(100.0, threshold * 1.2))
+    if (op == '>' and clear > threshold) or (op == '<' and clear < threshold):
+        raise ValueError(f"clear ({clear}) must be on the normal side of threshold ({threshold})")
+    window = rule.get('window', '5m')
+    return {
+        'name': rule.get('name') or f"{metric}{op}{threshold:g}@{window}",
+        'metric': metric,
+        'op': op,
+        'threshold': threshold,
+        'clear': clear,
+        'window': str(window),
+        'seconds': _window_seconds(window),
+        'min_count': int(rule.get('min_count', 50)),
+        'renotify_seconds': float(rule.get('renotify_seconds', 0)),
+    }
+
+def load_rules(path):
+    """Rules from a JSON file holding a list of rule dicts."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [normalize_rule(r) for r in json.load(f)]
+
+# -----------------------------
+# Rolling counters
+# -----------------------------
+class RollingCounter:
+    """
+    Counts for the `length` seconds ending at a watermark, kept incrementally:
+    each message adds to its one-second bucket and the totals, and advancing
+    the watermark subtracts the buckets that fall out. O(1) amortized either way.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.totals = [0, 0, 0, 0, 0]
+        self._buckets = deque()   # [second, counts], oldest first
+
+    def add(self, second, slot, hate):
+        buckets = self._buckets
+        if not buckets or second > buckets[-1][0]:
+            buckets.append([second, [0, 0, 0, 0, 0]])
+            bucket = buckets[-1][1]
+        else:
+            # Out of order: a slightly late message lands in an earlier bucket
+            i = len(buckets) - 1
+            while i >= 0 and buckets[i][0] > second:
+                i -= 1
+            if i >= 0 and buckets[i][0] == second:
+                bucket = buckets[i][1]
+            else:
+                buckets.insert(i + 1, [second, [0, 0, 0, 0, 0]])
+                bucket = buckets[i + 1][1]
+        for counts in (bucket, self.totals):
+            counts[_TOTAL] += 1
+            counts[slot] += 1
+            if hate:
+                counts[_HATE] += 1
+
+    def expire(self, watermark):
+        cutoff = watermark - self.length
+        buckets = self._buckets
+        while buckets and buckets[0][0] <= cutoff:
+            _, counts = buckets.popleft()
+            for i in range(5):
+                self.totals[i] -= counts[i]
+
+    def pct(self, slot):
+        total = self.totals[_TOTAL]
+        return round(100.0 * self.totals[slot] / total, 1) if total else 0.0
+
+# -----------------------------
+# Engine
+# -----------------------------
+class AlertEngine:
+    """
+    Feed it scored messages ({'channel', 'ts', 'sentiment', 'hate_speech'}) with
+    observe(); every (rule, channel) pair is a small state machine that emits an
+    event only on a transition (firing/resolved), plus an optional reminder
+    every renotify_seconds while firing. Time is event time, like stream windows.
+    """
+
+    def __init__(self, rules, notify=None):
+        self.rules = [normalize_rule(r) for r in rules]
+        self.notify = notify
+        self.watermark = None
+        self.events = 0
+        self._lengths = sorted({r['seconds'] for r in self.rules})
+        self._counters = {}   # channel -> {seconds: RollingCounter}
+        self._state = {}      # (rule name, channel) -> state dict
+        self._lock = threading.Lock()
+
+    def observe(self, messages):
+        """Update counters with a batch and evaluate the rules; returns the events emitted."""
+        with self._lock:
+            previous = self.watermark
+            touched = set()
+            limit = time.time() + MAX_SKEW_SECONDS
+            for msg in messages:
+                second = event_second(msg['ts'], limit)
+                if self.watermark is None or second > self.watermark:
+                    self.watermark = second
+                counters = self._counters.get(msg['channel'])
+                if counters is None:
+                    counters = self._counters[msg['channel']] = {n: RollingCounter(n) for n in self._lengths}
+                slot = _SENTIMENT_SLOT.get(msg['sentiment'], _NEU)
+                hate = msg['hate_speech'] == 'Hate Speech'
+                for length, counter in counters.items():
+                    # Already out of this window: counting it would never be undone
+                    if second > self.watermark - length:
+                        counter.add(second, slot, hate)
+                touched.add(msg['channel'])
+            if self.watermark is None:
+                return []
+            # Time moved: every channel's windows slide, so quiet channels can resolve too
+            channels = list(self._counters) if self.watermark != previous else touched
+            events = []
+            for channel in channels:
+                for counter in self._counters[channel].values():
+                    counter.expire(self.watermark)
+                for rule in self.rules:
+                    event = self._evaluate(rule, channel)
+                    if event:
+                        events.append(event)
+        for event in events:
+            self.events += 1
+            if self.notify:
+                self.notify(event)
+        return events
+
+    def _evaluate(self, rule, channel):
+        counter = self._counters[channel][rule['seconds']]
+        count = counter.totals[_TOTAL]
+        value = counter.pct(METRICS[rule['metric']])
+        above = rule['op'] == '>'
+        breached = count >= rule['min_count'] and (value > rule['threshold'] if above else value < rule['threshold'])
+        recovered = count < rule['min_count'] or (value < rule['clear'] if above else value > rule['clear'])
+
+        key = (rule['name'], channel)
+        state = self._state.get(key)
+        now = self.watermark
+        if state is None and breached:
+            self._state[key] = {'since': now, 'notified_at': now}
+            return self._event(rule, channel, 'firing', value, count, now)
+        if state is not None and recovered:
+            del self._state[key]
+            return self._event(rule, channel, 'resolved', value, count, state['since'])
+        if state is not None and rule['renotify_seconds'] and now - state['notified_at'] >= rule['renotify_seconds']:
+            state['notified_at'] = now
+            return self._event(rule, channel, 'firing', value, count, state['since'], repeat=True)
+        return None
+
+    def _event(self, rule, channel, status, value, count, since, repeat=False):
+        return {
+            'id': uuid.uuid4().hex,
+            # Same for every event of one incident: receivers can group/dedupe on it
+            'key': f"{rule['name']}:{channel}:{since}",
+            'rule': rule['name'],
+            'channel': channel,
+            'status': status,
+            'repeat': repeat,
+            'metric': rule['metric'],
+            'window': rule['window'],
+            'op': rule['op'],
+            'threshold': rule['threshold'],
+            'clear': rule['clear'],
+            'value': value,
+            'count': count,
+            'since': since,
+            'at': self.watermark,
+        }
+
+    def firing(self):
+        """Currently firing (rule, channel) pairs with their latest values, for the HTTP endpoint."""
+        with self._lock:
+            out = []
+            for (name, channel), state in self._state.items():
+                rule = next(r for r in self.rules if r['name'] == name)
+                counter = self._counters[channel][rule['seconds']]
+                out.append({'rule': name, 'channel': channel, 'since': state['since'],
+                             'value': counter.pct(METRICS[rule['metric']]), 'count': counter.totals[_TOTAL]})
+            return out
+
+# -----------------------------
+# Webhook delivery
+# -----------------------------
+def backoff_delay(attempt, retry_after=None):
+    """Seconds before retry number `attempt` (0-based): Retry-After if given, else capped exponential with jitter."""
+    if retry_after is not None:
+        return min(MAX_BACKOFF_SECONDS, retry_after)
+    return random.uniform(0.5, 1.0) * min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * (2 ** attempt))
+
+class WebhookNotifier:
+    """
+    POSTs events as JSON to every URL from one background thread per URL, so a
+    slow or failing receiver doesn't hold up the others or the stream. Each event
+    keeps its X-Alert-Id across retries so receivers can drop duplicates.
+    """
+
+    def __init__(self, urls, max_attempts=None):
+        self.max_attempts = max_attempts or MAX_ATTEMPTS
+        self.stats = {'delivered': 0, 'retries': 0, 'failed': 0, 'dropped': 0}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._queues = []
+        for url in urls:
+            q = queue.Queue(maxsize=QUEUE_MAX)
+            self._queues.append(q)
+            threading.Thread(target=self._worker, args=(url, q), name='alert-webhook', daemon=True).start()
+
+    def __call__(self, event):
+        for q in self._queues:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                self._bump('dropped')
+                print(f"[WARNING] Alert webhook queue full; dropped {event['key']} ({event['status']})")
+
+    def _bump(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _worker(self, url, q):
+        while True:
+            event = q.get()
+            try:
+                self._deliver(url, event)
+            finally:
+                q.task_done()
+
+    def _deliver(self, url, event):
+        body = json.dumps(event)
+        headers = {'Content-Type': 'application/json', 'X-Alert-Id': event['id']}
+        for attempt in range(self.max_attempts):
+            retry_after = None
+            try:
+                resp = self._session.post(url, data=body, headers=headers, timeout=TIMEOUT_SECONDS)
+                if resp.status_code < 300:
+                    self._bump('delivered')
+                    return True
+                if resp.status_code < 500 and resp.status_code not in _RETRY_STATUSES:
+                    print(f"[WARNING] Alert webhook {url} refused {event['key']}: HTTP {resp.status_code}")
+                    break
+                try:
+                    retry_after = float(resp.headers['Retry-After'])
+                except (KeyError, ValueError):
+                    pass
+                reason = f"HTTP {resp.status_code}"
+            except requests.RequestException as e:
+                reason = str(e)
+            if attempt + 1 < self.max_attempts:
+                self._bump('retries')
+                time.sleep(backoff_delay(attempt, retry_after))
+            else:
+                print(f"[WARNING] Alert webhook {url} failed {self.max_attempts} times for {event['key']}: {reason}")
+        self._bump('failed')
+        return False
+
+    def flush(self, timeout=None):
+        """Block until every queued event was delivered or given up on (shutdown, tests)."""
+        deadline = None if timeout is None else time.time() + timeout
+        for q in self._queues:
+            while q.unfinished_tasks:
+                if deadline is not None and time.time() > deadline:
+                    return False
+                time.sleep(0.01)
+        return True
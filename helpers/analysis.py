@@ -4,6 +4,8 @@ from collections import Counter, defaultdict
 from datetime import datetime
 import re
 
+import numpy as np
+
 # Try to reuse your global list if available; else use a safe fallback
 try:
     from utils.cleaning import OFFENSIVE_WORDS as _GLOBAL_OFFENSIVE
@@ -118,7 +120,8 @@ def analyze_comments_sentiment_hate(comments):
     """
     comments: [
       { 'text': str, 'username': str, 'date': 'YYYY-MM-DD or ISO', 'likes': int,
-        'sentiment': optional, 'hate_speech': optional }, ...
+        'sentiment': optional, 'hate_speech': optional,
+        'sentiment_proba': optional, 'hate_proba': optional, 'is_reply': optional }, ...
     ]
     returns: analyzed_comments (list of normalized dicts)
     """
@@ -143,15 +146,156 @@ def analyze_comments_sentiment_hate(comments):
             "date": date_out,           # guaranteed YYYY-MM-DD
             "likes": likes,
             "sentiment": sentiment,     # Positive/Neutral/Negative
-            "hate_speech": hate         # Hate Speech / Safe Content
+            "hate_speech": hate,        # Hate Speech / Safe Content
+            "sentiment_proba": c.get("sentiment_proba"),  # model confidence or None
+            "hate_proba": c.get("hate_proba"),
+            "is_reply": bool(c.get("is_reply")),
         })
     return analyzed
 
+# ------------------------------------------------------------------------------------
+# Running aggregates: every summary below is computed from these counters, so
+# they can be fed batch by batch (streaming) or from a whole list at once.
+# ------------------------------------------------------------------------------------
+# Batches at least this long are folded with NumPy (update_aggregates_columns);
+# below it the per-comment loop is cheaper than building the arrays
+COLUMNAR_MIN_BATCH = 64
+
+def new_aggregates():
+    return {
+        "total": 0,
+        "sentiment": Counter(),
+        "hate": Counter(),
+        "days": Counter(),          # insertion order = first appearance (most_active_day ties)
+        "by_date": defaultdict(lambda: {"Positive": 0, "Negative": 0, "Neutral": 0, "total": 0, "hate": 0}),
+        "high_like": 0,
+        "replies": 0,
+        "reply_sentiment": Counter(),
+        "reply_hate": Counter(),
+    }
+
+def update_aggregates(agg, analyzed_comments):
+    """Fold a batch of analyzed comments into `agg` (from new_aggregates). Returns agg."""
+    if isinstance(analyzed_comments, list) and len(analyzed_comments) >= COLUMNAR_MIN_BATCH:
+        return update_aggregates_columns(agg, comment_columns(analyzed_comments))
+    return _update_aggregates_dicts(agg, analyzed_comments)
+
+def _update_aggregates_dicts(agg, analyzed_comments):
+    for c in (analyzed_comments or []):
+        agg["total"] += 1
+        agg["sentiment"][c.get("sentiment")] += 1
+        agg["hate"][c.get("hate_speech")] += 1
+        agg["days"][c.get("date")] += 1
+
+        d = c.get("date") or _parse_date_any(None)
+        s = c.get("sentiment") or "Neutral"
+        if s not in _EXPECTED_SENTIMENTS:
+            s = "Neutral"
+        row = agg["by_date"][d]
+        row[s] += 1
+        row["total"] += 1
+        if c.get("hate_speech") == "Hate Speech":
+            row["hate"] += 1
+
+        if c.get("likes", 0) >= 10:
+            agg["high_like"] += 1
+
+        if c.get("is_reply"):
+            agg["replies"] += 1
+            agg["reply_sentiment"][c.get("sentiment")] += 1
+            agg["reply_hate"][c.get("hate_speech")] += 1
+    return agg
+
+def _aggregate(analyzed_comments):
+    return update_aggregates(new_aggregates(), analyzed_comments)
+
+# ------------------------------------------------------------------------------------
+# Columnar aggregation: the same counters from label/date codes with np.bincount.
+# A batch is {'sentiment'|'hate_speech'|'date': (codes, labels), 'likes': ints,
+# 'is_reply': bools}; labels are in first-appearance order, so day ties still
+# resolve to the earliest day seen.
+# ------------------------------------------------------------------------------------
+def _factorize(values):
+    index = {}
+    codes = [index.setdefault(v, len(index)) for v in values]
+    return np.array(codes, dtype=np.int64), list(index)
+
+def comment_columns(analyzed_comments):
+    """Columnar form of a batch of analyzed comment dicts (see update_aggregates_columns)."""
+    comments = list(analyzed_comments or [])
+    return {
+        "sentiment": _factorize([c.get("sentiment") for c in comments]),
+        "hate_speech": _factorize([c.get("hate_speech") for c in comments]),
+        "date": _factorize([c.get("date") for c in comments]),
+        "likes": np.array([c.get("likes", 0) for c in comments], dtype=np.int64),
+        "is_reply": np.array([bool(c.get("is_reply")) for c in comments], dtype=bool),
+    }
+
+def _fold(counter, codes, labels, weights=None):
+    counts = np.bincount(codes, weights=weights, minlength=len(labels))
+    for label, n in zip(labels, counts.tolist()):
+        if n:
+            counter[label] += int(n)
+
+def update_aggregates_columns(agg, columns):
+    """Fold a columnar batch into `agg`; the result is identical to update_aggregates on the same comments."""
+    s_codes, s_labels = columns["sentiment"]
+    h_codes, h_labels = columns["hate_speech"]
+    d_codes, d_labels = columns["date"]
+    if not len(d_codes):
+        return agg
+    likes, is_reply = columns["likes"], columns["is_reply"]
+
+    agg["total"] += len(d_codes)
+    _fold(agg["sentiment"], s_codes, s_labels)
+    _fold(agg["hate"], h_codes, h_labels)
+    _fold(agg["days"], d_codes, d_labels)
+
+    # Per-day rows: unknown sentiments count as Neutral, missing dates as today
+    slot = np.array([["Positive", "Negative", "Neutral"].index(l) if l in _EXPECTED_SENTIMENTS else 2
+                     for l in s_labels], dtype=np.int64)[s_codes]
+    is_hate = np.array([l == "Hate Speech" for l in h_labels], dtype=bool)[h_codes]
+    n_days = len(d_labels)
+    by_slot = np.bincount(d_codes * 3 + slot, minlength=n_days * 3).reshape(n_days, 3).tolist()
+    hate_per_day = np.bincount(d_codes[is_hate], minlength=n_days).tolist()
+    for i, label in enumerate(d_labels):
+        pos, neg, neu = by_slot[i]
+        row = agg["by_date"][label or _parse_date_any(None)]
+        row["Positive"] += pos
+        row["Negative"] += neg
+        row["Neutral"] += neu
+        row["total"] += pos + neg + neu
+        row["hate"] += hate_per_day[i]
+
+    agg["high_like"] += int(np.count_nonzero(likes >= 10))
+    replies = int(np.count_nonzero(is_reply))
+    if replies:
+        agg["replies"] += replies
+        _fold(agg["reply_sentiment"], s_codes[is_reply], s_labels)
+        _fold(agg["reply_hate"], h_codes[is_reply], h_labels)
+    return agg
+
+def summarize_aggregates(agg):
+    """Everything the results page needs, from running aggregates."""
+    sentiment_distribution, hate_distribution = _distributions(agg)
+    return {
+        "total_comments": agg["total"],
+        "kpis": _kpis(agg),
+        "insights": _insights(agg),
+        "sentiment_distribution": sentiment_distribution,
+        "hate_distribution": hate_distribution,
+        "timeline_data": _timeline(agg),
+        "timeline_line": _hate_timeline(agg),
+    }
+
 # ------------------------------------------------------------------------------------
 # 2) KPIs
 # ------------------------------------------------------------------------------------
 def calculate_kpis(analyzed_comments):
-    total = len(analyzed_comments or [])
+    return _kpis(_aggregate(analyzed_comments))
+
+def _kpis(agg):
+    total = agg["total"]
     if total == 0:
         return {
             "total_comments": 0,
@@ -162,9 +306,9 @@ def calculate_kpis(analyzed_comments):
             "most_active_day": "N/A"
         }
 
-    s = Counter(c["sentiment"] for c in analyzed_comments)
-    h = Counter(c["hate_speech"] for c in analyzed_comments)
-    day_counter = Counter(c["date"] for c in analyzed_comments)
+    s = agg["sentiment"]
+    h = agg["hate"]
+    day_counter = agg["days"]
 
     kpis = {
         "total_comments": total,
@@ -174,6 +318,22 @@ def calculate_kpis(analyzed_comments):
         "neutral_pct": round(100.0 * s.get("Neutral", 0) / total, 1),
         "most_active_day": (day_counter.most_common(1)[0][0] if day_counter else "N/A"),
     }
+
+    # Reply threads (YouTube with replies expanded): how replies compare to top-level comments
+    replies = agg.get("replies", 0)
+    if replies:
+        rs, rh = agg["reply_sentiment"], agg["reply_hate"]
+        top = total - replies
+        top_hate = h.get("Hate Speech", 0) - rh.get("Hate Speech", 0)
+        kpis.update({
+            "reply_comments": replies,
+            "reply_hate_count": rh.get("Hate Speech", 0),
+            "reply_hate_pct": round(100.0 * rh.get("Hate Speech", 0) / replies, 1),
+            "reply_positive_pct": round(100.0 * rs.get("Positive", 0) / replies, 1),
+            "reply_negative_pct": round(100.0 * rs.get("Negative", 0) / replies, 1),
+            "reply_neutral_pct": round(100.0 * rs.get("Neutral", 0) / replies, 1),
+            "top_level_hate_pct": round(100.0 * top_hate / top, 1) if top else 0.0,
+        })
     return kpis
 
 # ------------------------------------------------------------------------------------
@@ -191,20 +351,16 @@ def prepare_timeline_data(analyzed_comments, past_days=None):
         }
       }
     """
-    by_date = defaultdict(lambda: {"Positive": 0, "Negative": 0, "Neutral": 0})
-    for c in (analyzed_comments or []):
-        d = c.get("date") or _parse_date_any(None)
-        s = c.get("sentiment") or "Neutral"
-        if s not in _EXPECTED_SENTIMENTS:
-            s = "Neutral"
-        by_date[d][s] += 1
+    return _timeline(_aggregate(analyzed_comments))
 
+def _timeline(agg):
+    by_date = agg["by_date"]
     labels = sorted(by_date.keys())
     # ensure not empty (prevents chart crash)
     if not labels:
         today = datetime.utcnow().strftime("%Y-%m-%d")
         labels = [today]
-        by_date[today] = {"Positive": 0, "Negative": 0, "Neutral": 0}
+        by_date = {today: {"Positive": 0, "Negative": 0, "Neutral": 0}}
 
     data = {
         "labels": labels,
@@ -216,6 +372,36 @@ def prepare_timeline_data(analyzed_comments, past_days=None):
     }
     return data
 
+def prepare_hate_timeline(analyzed_comments):
+    """
+    Per-day totals vs hate speech for the line chart:
+      {'labels': [...], 'datasets': {'total': [...], 'hate': [...]}}
+    """
+    return _hate_timeline(_aggregate(analyzed_comments))
+
+def _hate_timeline(agg):
+    by_date = agg["by_date"]
+    labels = sorted(by_date.keys())
+    return {
+        "labels": labels,
+        "datasets": {
+            "total": [by_date[d]["total"] for d in labels],
+            "hate": [by_date[d]["hate"] for d in labels],
+        }
+    }
+
+def calculate_distributions(analyzed_comments):
+    """Label counts for the sentiment and hate doughnut charts."""
+    return _distributions(_aggregate(analyzed_comments))
+
+def _distributions(agg):
+    s = agg["sentiment"]
+    h = agg["hate"]
+    return (
+        {k: s.get(k, 0) for k in ("Positive", "Neutral", "Negative")},
+        {k: h.get(k, 0) for k in ("Safe Content", "Hate Speech")},
+    )
+
 # ------------------------------------------------------------------------------------
 # 4) Insights
 # ------------------------------------------------------------------------------------
@@ -223,13 +409,16 @@ def generate_insights(analyzed_comments, past_days=None):
     """
     Builds simple, clear insights from analyzed comments only (no extra args needed).
     """
+    return _insights(_aggregate(analyzed_comments))
+
+def _insights(agg):
     insights = []
-    total = len(analyzed_comments or [])
+    total = agg["total"]
     if total == 0:
         return ["No comments found in the selected window. Try expanding the date range."]
 
-    s = Counter(c["sentiment"] for c in analyzed_comments)
-    h = Counter(c["hate_speech"] for c in analyzed_comments)
+    s = agg["sentiment"]
+    h = agg["hate"]
     pos, neg, neu = s.get("Positive", 0), s.get("Negative", 0), s.get("Neutral", 0)
     hate = h.get("Hate Speech", 0)
 
@@ -252,8 +441,18 @@ def generate_insights(analyzed_comments, past_days=None):
         insights.append("High neutral ratio—ask questions or pin prompts to drive more polarized engagement.")
 
     # Engagement hint
-    high_like = sum(1 for c in analyzed_comments if c.get("likes", 0) >= 10)
+    high_like = agg["high_like"]
     if high_like:
         insights.append(f"{high_like} comment(s) received 10+ likes—highlight top comments to boost engagement.")
 
+    # Replies vs top-level comments
+    replies = agg.get("replies", 0)
+    if replies and total > replies:
+        reply_hate = agg["reply_hate"].get("Hate Speech", 0)
+        top_rate = (hate - reply_hate) / (total - replies)
+        reply_rate = reply_hate / replies
+        if reply_rate > top_rate:
+            insights.append(f"Replies carry more hate speech ({round(100 * reply_rate, 1)}%) than top-level "
+                            f"comments ({round(100 * top_rate, 1)}%)—watch heated threads.")
+
     return insights
@@ -0,0 +1,162 @@
+# helpers/api_cache.py — TTL + LRU cache for upstream API responses, shared across workers (SQLite, WAL)
+
+import os
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('api_cache.db')
+
+# Total compressed bytes kept on disk; least recently used entries go first
+MAX_BYTES = int(os.getenv('API_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# Evict down to this fraction of MAX_BYTES so every put doesn't evict again
+_EVICT_TO = 0.9
+# Hits refresh last_access at most this often (saves a write per hit)
+_TOUCH_SECONDS = 60
+# Hit/miss counters are kept in memory and written out at most this often (and on every put)
+_FLUSH_SECONDS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# This process's counts not yet in the metrics table, per database: {path: Counter}
+_pending = {}
+_pending_lock = threading.Lock()
+_flushed_at = {}
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _bump(conn, name, amount=1):
+    conn.execute(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+        (name, amount),
+    )
+
+def _count(name):
+    with _pending_lock:
+        _pending.setdefault(DB_PATH, Counter())[name] += 1
+
+def _flush(conn):
+    """Add this process's pending counts to the metrics table (call inside a transaction)."""
+    with _pending_lock:
+        counts = _pending.pop(DB_PATH, None)
+        _flushed_at[DB_PATH] = time.time()
+    for name, amount in (counts or {}).items():
+        _bump(conn, name, amount)
+
+def _flush_due():
+    with _pending_lock:
+        return DB_PATH in _pending and time.time() - _flushed_at.get(DB_PATH, 0) >= _FLUSH_SECONDS
+
+def get(key):
+    """
+    Cached JSON value for `key`, or None when missing or expired. A plain read:
+    expired entries are left for the next put() to delete, hit/miss counts are buffered in
+    memory, and last_access is only rewritten once per _TOUCH_SECONDS.
+    """
+    conn = _conn()
+    now = time.time()
+    row = conn.execute('SELECT value, expires_at, last_access FROM entries WHERE key = ?', (key,)).fetchone()
+    hit = row is not None and row['expires_at'] > now
+    _count('hits' if hit else 'misses')
+    if hit and now - row['last_access'] > _TOUCH_SECONDS:
+        # Autocommit: one short write, no transaction held across the lookup
+        conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+    if _flush_due():
+        with transaction(conn):
+            _flush(conn)
+    return json.loads(zlib.decompress(row['value'])) if hit else None
+
+def _size(conn):
+    # Total entry bytes, kept up to date by put/_evict; counted once for a database that lacks it
+    row = conn.execute("SELECT value FROM metrics WHERE name = 'bytes'").fetchone()
+    if row is not None:
+        return row['value']
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+    conn.execute("INSERT INTO metrics (name, value) VALUES ('bytes', ?)", (total,))
+    return total
+
+def put(key, value, ttl):
+    """
+    Store a JSON-serializable value for `ttl` seconds. Expired entries are deleted
+    on every put; LRU entries go once the total passes MAX_BYTES.
+    """
+    if ttl <= 0:
+        return
+    blob = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+    now = time.time()
+    conn = _conn()
+    with transaction(conn):
+        total = _size(conn) - _purge_expired(conn, now)
+        old = conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        conn.execute(
+            'INSERT INTO entries (key, value, size, created_at, expires_at, last_access) VALUES (?,?,?,?,?,?)'
+            ' ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size,'
+            '  created_at = excluded.created_at, expires_at = excluded.expires_at, last_access = excluded.last_access',
+            (key, blob, len(blob), now, now + ttl, now),
+        )
+        total += len(blob) - (old['size'] if old else 0)
+        _bump(conn, 'puts')
+        _flush(conn)
+        if total > MAX_BYTES:
+            total = _evict(conn)
+        conn.execute("UPDATE metrics SET value = ? WHERE name = 'bytes'", (total,))
+
+def _purge_expired(conn, now):
+    """Delete expired entries (a range scan on idx_entries_expires). Returns the bytes freed."""
+    row = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE expires_at <= ?',
+                       (now,)).fetchone()
+    if row[0]:
+        conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+        _bump(conn, 'expired', row[0])
+    return row[1]
+
+def _evict(conn):
+    """Drop least recently used entries down to _EVICT_TO. Returns the bytes left."""
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+    target = MAX_BYTES * _EVICT_TO
+    evicted = 0
+    for row in conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+        if total <= target:
+            break
+        conn.execute('DELETE FROM entries WHERE key = ?', (row['key'],))
+        total -= row['size']
+        evicted += 1
+    _bump(conn, 'evictions', evicted)
+    return total
+
+def metrics():
+    """
+    Hit/miss/eviction counters across all workers plus current size. Other
+    workers' latest hits and misses show up once they flush (_FLUSH_SECONDS).
+    """
+    conn = _conn()
+    with transaction(conn):
+        _flush(conn)
+        _size(conn)
+    out = {r['name']: r['value'] for r in conn.execute('SELECT name, value FROM metrics')}
+    lookups = out.get('hits', 0) + out.get('misses', 0)
+    out['hit_ratio'] = round(out.get('hits', 0) / lookups, 3) if lookups else 0.0
+    out['entries'] = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+    out['max_bytes'] = MAX_BYTES
+    return out
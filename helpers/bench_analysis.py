@@ -0,0 +1,66 @@
+# helpers/bench_analysis.py — timings for the aggregation paths in helpers/analysis.py
+#
+#     python -m helpers.bench_analysis [--sizes 1000,100000,1000000] [--repeat 3]
+#
+# For each size: the per-comment dict loop, building columns from the dicts, folding
+# ready-made columns with NumPy, and update_aggregates as the app calls it. Every path
+# is checked to produce the same summary before its time is reported.
+
+import argparse
+import random
+import time
+
+from helpers.analysis import (
+    _update_aggregates_dicts,
+    comment_columns,
+    new_aggregates,
+    summarize_aggregates,
+    update_aggregates,
+    update_aggregates_columns,
+)
+
+def synthetic_comments(n, days=90, seed=1):
+    rng = random.Random(seed)
+    dates = [f"2026-{1 + d // 28:02d}-{1 + d % 28:02d}" for d in range(days)]
+    return [{
+        "text": "", "username": "u",
+        "date": rng.choice(dates),
+        "likes": rng.randint(0, 30),
+        "sentiment": rng.choice(("Positive", "Neutral", "Negative")),
+        "hate_speech": "Hate Speech" if rng.random() < 0.1 else "Safe Content",
+        "is_reply": rng.random() < 0.3,
+    } for _ in range(n)]
+
+def _best(fn, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, out
+
+def run(sizes, repeat=3):
+    rows = []
+    for n in sizes:
+        comments = synthetic_comments(n)
+        dict_ms, expected = _best(lambda: _update_aggregates_dicts(new_aggregates(), comments), repeat)
+        encode_ms, columns = _best(lambda: comment_columns(comments), repeat)
+        fold_ms, folded = _best(lambda: update_aggregates_columns(new_aggregates(), columns), repeat)
+        app_ms, via_app = _best(lambda: update_aggregates(new_aggregates(), comments), repeat)
+        expected = summarize_aggregates(expected)
+        assert summarize_aggregates(folded) == expected and summarize_aggregates(via_app) == expected
+        rows.append({'comments': n, 'dict_ms': dict_ms, 'columns_ms': encode_ms, 'fold_ms': fold_ms,
+                     'update_aggregates_ms': app_ms, 'speedup': dict_ms / app_ms})
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m helpers.bench_analysis',
+                                     description='Time the aggregation paths of helpers.analysis.')
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(f"{'comments':>10} {'dict loop':>10} {'columns':>10} {'fold':>10} {'update_agg':>11} {'speedup':>8}")
+    for r in run([int(s) for s in args.sizes.split(',')], args.repeat):
+        print(f"{r['comments']:>10} {r['dict_ms']:>8.1f}ms {r['columns_ms']:>8.1f}ms {r['fold_ms']:>8.2f}ms "
+              f"{r['update_aggregates_ms']:>9.1f}ms {r['speedup']:>7.1f}x")
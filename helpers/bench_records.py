@@ -0,0 +1,89 @@
+# helpers/bench_records.py — peak RSS of holding a large analysis: dicts vs CommentBatch
+#
+#     python -m helpers.bench_records [--comments 1000000] [--spill-mb 16]
+#
+# Each mode runs in a fresh interpreter, receives synthetic analyzed comments a page
+# at a time (as analyze_source yields them), keeps all of them, aggregates them and
+# reads them back once. Reported: peak RSS above the interpreter's baseline once
+# everything is held and aggregated, and after the read-back (which maps spilled text in).
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+PAGE = 100
+WORDS = ('great', 'video', 'terrible', 'take', 'honestly', 'the', 'best', 'worst', 'channel', 'editing',
+         'why', 'would', 'anyone', 'watch', 'this', 'love', 'it', 'so', 'much', 'again')
+
+def synthetic_pages(n, seed=3):
+    rng = random.Random(seed)
+    users = [f'user_{i}' for i in range(max(1, n // 20))]
+    for start in range(0, n, PAGE):
+        yield [{
+            'id': f'Ugx{start + i:012d}',
+            'text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))),
+            'username': rng.choice(users),
+            'date': f'2026-10-{rng.randint(1, 28):02d}',
+            'likes': rng.randint(0, 40),
+            'sentiment': rng.choice(('Positive', 'Neutral', 'Negative')),
+            'hate_speech': 'Hate Speech' if rng.random() < 0.1 else 'Safe Content',
+            'sentiment_proba': rng.random(),
+            'hate_proba': rng.random(),
+            'is_reply': rng.random() < 0.3,
+        } for i in range(min(PAGE, n - start))]
+
+def _peak_mb():
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(mode, n, spill_mb):
+    from helpers.analysis import new_aggregates, summarize_aggregates, update_aggregates, update_aggregates_columns
+    from helpers.records import CommentBatch
+
+    baseline = _peak_mb()
+    started = time.perf_counter()
+    if mode == 'dicts':
+        held = []
+        for page in synthetic_pages(n):
+            held.extend(page)
+        summary = summarize_aggregates(update_aggregates(new_aggregates(), held))
+    else:
+        held = CommentBatch(spill_bytes=spill_mb * 1024 * 1024 if mode == 'spill' else 1 << 62)
+        for page in synthetic_pages(n):
+            held.extend(page)
+        summary = summarize_aggregates(update_aggregates_columns(new_aggregates(), held.columns()))
+    held_mb = _peak_mb() - baseline
+    chars = sum(len(c['text']) for c in held)
+    return {'mode': mode, 'comments': n, 'held_rss_mb': round(held_mb, 1),
+            'peak_rss_mb': round(_peak_mb() - baseline, 1),
+            'seconds': round(time.perf_counter() - started, 2), 'chars': chars,
+            'hate_speech_pct': summary['kpis']['hate_speech_pct'],
+            'spilled': getattr(held, 'spilled', False)}
+
+def run(n, spill_mb, modes=('dicts', 'batch', 'spill')):
+    rows = []
+    for mode in modes:
+        out = subprocess.run([sys.executable, '-m', 'helpers.bench_records', '--child', mode,
+                              '--comments', str(n), '--spill-mb', str(spill_mb)],
+                             capture_output=True, text=True, check=True)
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m helpers.bench_records',
+                                     description='Peak RSS of holding analyzed comments as dicts vs CommentBatch.')
+    parser.add_argument('--comments', type=int, default=1_000_000)
+    parser.add_argument('--spill-mb', type=int, default=16)
+    parser.add_argument('--child', choices=('dicts', 'batch', 'spill'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, args.comments, args.spill_mb)))
+    else:
+        print(f"{'mode':>6} {'comments':>10} {'held+agg':>10} {'+read back':>11} {'time':>7}")
+        for r in run(args.comments, args.spill_mb):
+            print(f"{r['mode']:>6} {r['comments']:>10} {r['held_rss_mb']:>8.1f}MB {r['peak_rss_mb']:>9.1f}MB "
+                  f"{r['seconds']:>6.2f}s")
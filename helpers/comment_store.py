@@ -0,0 +1,211 @@
+# helpers/comment_store.py — already-fetched YouTube comments + per-video watermarks (SQLite, WAL)
+
+import time
+import sqlite3
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('comments.db')
+
+# Columns handed back to the analysis, in addition to the stored labels
+_COLUMNS = ('comment_id', 'text', 'username', 'date', 'likes', 'published_at',
+            'sentiment', 'hate_speech', 'sentiment_proba', 'hate_proba', 'parent_id', 'reply_count')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS yt_comments (
+    video_id TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    published_at TEXT NOT NULL,
+    date TEXT,
+    text TEXT,
+    username TEXT,
+    likes INTEGER,
+    sentiment TEXT,
+    hate_speech TEXT,
+    sentiment_proba REAL,
+    hate_proba REAL,
+    fetched_at REAL NOT NULL,
+    parent_id TEXT,
+    reply_count INTEGER,
+    PRIMARY KEY (video_id, comment_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_yt_comments_time ON yt_comments (video_id, published_at);
+CREATE TABLE IF NOT EXISTS yt_watermarks (
+    video_id TEXT PRIMARY KEY,
+    newest_published_at TEXT NOT NULL,
+    covered_from TEXT NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS yt_reply_watermarks (
+    video_id TEXT PRIMARY KEY,
+    newest_published_at TEXT NOT NULL,
+    covered_from TEXT NOT NULL,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+# Columns added after the table was first shipped: (name, type)
+_ADDED_COLUMNS = (('parent_id', 'TEXT'), ('reply_count', 'INTEGER'))
+
+def _conn():
+    conn = get_connection(DB_PATH, _SCHEMA)
+    if getattr(_conn, 'migrated', None) != DB_PATH:
+        have = {r['name'] for r in conn.execute('PRAGMA table_info(yt_comments)')}
+        for name, kind in _ADDED_COLUMNS:
+            if name not in have:
+                try:
+                    conn.execute(f'ALTER TABLE yt_comments ADD COLUMN {name} {kind}')
+                except sqlite3.OperationalError:
+                    pass   # another worker added it first
+        _conn.migrated = DB_PATH
+    return conn
+
+def _watermarks(replies):
+    # Runs with replies record their coverage apart: a top-level run stores no replies
+    return 'yt_reply_watermarks' if replies else 'yt_watermarks'
+
+def watermark(video_id, replies=False):
+    """
+    {'newest_published_at', 'covered_from', 'refreshed_at'} or None.
+
+    Every comment published between covered_from and newest_published_at is
+    stored, so a fetch only needs to page back to newest_published_at. With
+    replies=True, the mark of fetches that also stored every thread's replies.
+    """
+    row = _conn().execute(f'SELECT * FROM {_watermarks(replies)} WHERE video_id = ?', (video_id,)).fetchone()
+    return dict(row) if row else None
+
+def save_comments(video_id, comments):
+    """
+    Upsert freshly fetched comments (dicts with id/published_at, as returned by
+    the fetchers; replies carry parent_id). Labels of known comments are kept;
+    their like and reply counts are refreshed.
+    """
+    now = time.time()
+    rows = [
+        (video_id, c['id'], c.get('published_at') or '', c.get('date', ''), c.get('text', ''),
+         c.get('username', 'Unknown'), int(c.get('likes') or 0), now, c.get('parent_id'), c.get('reply_count'))
+        for c in comments if c.get('id')
+    ]
+    if not rows:
+        return
+    conn = _conn()
+    with transaction(conn):
+        conn.executemany(
+            'INSERT INTO yt_comments'
+            ' (video_id, comment_id, published_at, date, text, username, likes, fetched_at, parent_id, reply_count)'
+            ' VALUES (?,?,?,?,?,?,?,?,?,?)'
+            ' ON CONFLICT(video_id, comment_id) DO UPDATE SET likes = excluded.likes, fetched_at = excluded.fetched_at,'
+            '  reply_count = COALESCE(excluded.reply_count, reply_count)',
+            rows,
+        )
+
+def move_watermark(video_id, newest, covered_from, replies=False):
+    """
+    Record a finished fetch: `newest` is the newest publishedAt it saw (or None)
+    and `covered_from` the oldest publishedAt from which the stored set is now
+    known to be complete (replies included, with replies=True).
+    """
+    conn = _conn()
+    with transaction(conn):
+        conn.execute(
+            f'INSERT INTO {_watermarks(replies)} (video_id, newest_published_at, covered_from, refreshed_at)'
+            ' VALUES (?,?,?,?)'
+            ' ON CONFLICT(video_id) DO UPDATE SET'
+            '  newest_published_at = MAX(newest_published_at, excluded.newest_published_at),'
+            '  covered_from = excluded.covered_from, refreshed_at = excluded.refreshed_at',
+            (video_id, newest or covered_from, covered_from, time.time()),
+        )
+
+def _to_comment(video_id, row):
+    c = dict(row)
+    c['id'] = c.pop('comment_id')
+    c['video_id'] = video_id
+    if c['parent_id']:
+        c['is_reply'] = True
+    else:
+        del c['parent_id']
+    if c['reply_count'] is None:
+        del c['reply_count']
+    return c
+
+def get_comments(video_id, comment_ids):
+    """Stored comments by id, as {comment_id: comment}."""
+    ids = list(comment_ids)
+    if not ids:
+        return {}
+    rows = _conn().execute(
+        f'SELECT {", ".join(_COLUMNS)} FROM yt_comments'
+        f' WHERE video_id = ? AND comment_id IN ({",".join("?" * len(ids))})',
+        [video_id] + ids,
+    ).fetchall()
+    return {r['comment_id']: _to_comment(video_id, r) for r in rows}
+
+def iter_comments(video_id, oldest, newest, limit, exclude=(), batch_size=500, replies=False):
+    """
+    Stored comments published between `oldest` and `newest` (inclusive), newest
+    first, in batches of up to batch_size, at most `limit` in total. Replies are
+    left out unless replies=True, and then don't count towards `limit` (it counts
+    threads, as the fetchers do). Keyset paging on (published_at, comment_id)
+    keeps each batch an index range scan.
+    """
+    cols = ', '.join(_COLUMNS)
+    top_level = '' if replies else ' AND parent_id IS NULL'
+    left = int(limit)
+    last = None
+    conn = _conn()
+    while left > 0:
+        if last is None:
+            rows = conn.execute(
+                f'SELECT {cols} FROM yt_comments WHERE video_id = ? AND published_at >= ? AND published_at <= ?'
+                f'{top_level} ORDER BY published_at DESC, comment_id LIMIT ?',
+                (video_id, oldest, newest, batch_size),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f'SELECT {cols} FROM yt_comments WHERE video_id = ? AND published_at >= ?'
+                ' AND (published_at < ? OR (published_at = ? AND comment_id > ?))'
+                f'{top_level} ORDER BY published_at DESC, comment_id LIMIT ?',
+                (video_id, oldest, last[0], last[0], last[1], batch_size),
+            ).fetchall()
+        if not rows:
+            return
+        batch = []
+        for r in rows:
+            if left <= 0:
+                break
+            if r['comment_id'] in exclude:
+                continue
+            batch.append(_to_comment(video_id, r))
+            if not r['parent_id']:
+                left -= 1
+        if batch:
+            yield batch
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1]['published_at'], rows[-1]['comment_id'])
+
+def count_since(video_id, published_after):
+    """Stored threads (replies not counted) published at or after `published_after`."""
+    row = _conn().execute(
+        'SELECT COUNT(*) FROM yt_comments WHERE video_id = ? AND published_at >= ? AND parent_id IS NULL',
+        (video_id, published_after),
+    ).fetchone()
+    return row[0]
+
+def save_labels(classified):
+    """Store model labels for comments that were classified after being fetched."""
+    rows = [
+        (c.get('sentiment'), c.get('hate_speech'), c.get('sentiment_proba'), c.get('hate_proba'),
+         c['video_id'], c['id'])
+        for c in classified if c.get('id') and c.get('video_id')
+    ]
+    if not rows:
+        return
+    conn = _conn()
+    with transaction(conn):
+        conn.executemany(
+            'UPDATE yt_comments SET sentiment = ?, hate_speech = ?, sentiment_proba = ?, hate_proba = ?'
+            ' WHERE video_id = ? AND comment_id = ?',
+            rows,
+        )
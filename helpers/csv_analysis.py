@@ -0,0 +1,197 @@
+# helpers/csv_analysis.py — streamed, chunked CSV classification
+
+import os
+import csv
+import json
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from model.predict import predict_batch
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(BASE_DIR, 'data', 'csv_results')
+
+# Rows held in memory at once (per chunk); bounded regardless of upload size
+CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', 5000))
+# Uploads above this size are classified across a process pool
+PROCESS_POOL_MIN_BYTES = int(os.getenv('CSV_PROCESS_POOL_MIN_BYTES', 50 * 1024 * 1024))
+PROCESS_POOL_WORKERS = int(os.getenv('CSV_PROCESS_POOL_WORKERS', os.cpu_count() or 2))
+# Per-row result files are kept this long for download, then removed when a new one is written
+RESULT_TTL_SECONDS = float(os.getenv('CSV_RESULT_TTL', 24 * 3600))
+
+TEXT_COLUMN_HINTS = ['text', 'tweet', 'content', 'message', 'caption']
+RESULT_FIELDS = ['row', 'text', 'sentiment', 'hate_speech']
+
+_JOB_ID_CHARS = set('0123456789abcdef')
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def detect_text_column(columns):
+    """Pick the column that most likely holds the text (same rules as the old input_page)."""
+    for col in columns:
+        if any(hint in str(col).lower() for hint in TEXT_COLUMN_HINTS):
+            return col
+    return columns[0] if len(columns) > 0 else None
+
+def result_path(job_id):
+    """Path of the per-row result file for a job, or None for a malformed id."""
+    if not job_id or len(job_id) != 32 or not set(job_id) <= _JOB_ID_CHARS:
+        return None
+    return os.path.join(RESULTS_DIR, f"{job_id}.csv")
+
+def _owner_path(job_id):
+    return os.path.join(RESULTS_DIR, f"{job_id}.owner.json")
+
+def result_owner(job_id):
+    """User id that uploaded a job's CSV, or None (unknown job or no owner recorded)."""
+    if result_path(job_id) is None:
+        return None
+    try:
+        with open(_owner_path(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f).get('user_id')
+    except (OSError, ValueError):
+        return None
+
+def cleanup_results(now=None):
+    """Delete result files (and their owner files) older than RESULT_TTL_SECONDS. Returns how many were removed."""
+    cutoff = (now or time.time()) - RESULT_TTL_SECONDS
+    removed = 0
+    try:
+        entries = list(os.scandir(RESULTS_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass   # already removed by another worker
+    return removed
+
+def _classify_chunk(texts):
+    """Classify one chunk of texts. Top-level so it can run in a worker process."""
+    return predict_batch(texts, mode='sentiment'), predict_batch(texts, mode='hate')
+
+def _iter_text_chunks(fileobj, column, chunk_rows):
+    for chunk in pd.read_csv(fileobj, usecols=[column], chunksize=chunk_rows, dtype=str):
+        yield chunk[column].fillna('').astype(str).str.strip().tolist()
+
+def _file_size(fileobj):
+    try:
+        pos = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(pos)
+        return size
+    except Exception:
+        return 0
+
+# -----------------------------
+# Main entry point
+# -----------------------------
+def analyze_csv_stream(fileobj, chunk_rows=None, workers=None, user_id=None):
+    """
+    Classify every row of an uploaded CSV in fixed-size chunks.
+
+    Only one chunk (plus the in-flight chunks of the pool) is held in memory.
+    Per-row labels are appended to data/csv_results/<job_id>.csv as chunks complete;
+    files past RESULT_TTL_SECONDS are cleaned up first. `user_id` is recorded next to
+    the file (see result_owner) so only the uploader can download it.
+    Returns a summary dict: job_id, text_column, total_rows, classified_rows,
+    empty_rows, kpis, preview (first few classified rows) — or {'error': ...}.
+    """
+    chunk_rows = max(1, int(chunk_rows or CHUNK_ROWS))
+    try:
+        header = pd.read_csv(fileobj, nrows=0)
+        fileobj.seek(0)
+    except Exception as e:
+        return {'error': f"Error processing CSV file: {e}"}
+
+    column = detect_text_column(list(header.columns))
+    if column is None:
+        return {'error': "Could not find text data in the CSV file."}
+
+    if workers is None:
+        workers = PROCESS_POOL_WORKERS if _file_size(fileobj) >= PROCESS_POOL_MIN_BYTES else 1
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    cleanup_results()
+    job_id = uuid.uuid4().hex
+    out_path = result_path(job_id)
+    with open(_owner_path(job_id), 'w', encoding='utf-8') as f:
+        json.dump({'user_id': user_id}, f)
+
+    sentiments = Counter()
+    hates = Counter()
+    total = 0
+    empty = 0
+    preview = []
+
+    def _consume(texts, labels, writer):
+        nonlocal total, empty
+        sent_labels, hate_labels = labels
+        for text, s, h in zip(texts, sent_labels, hate_labels):
+            total += 1
+            if not text:
+                empty += 1
+                writer.writerow([total, '', '', ''])
+                continue
+            sentiments[s] += 1
+            hates[h] += 1
+            writer.writerow([total, text, s, h])
+            if len(preview) < 5:
+                preview.append({'text': text, 'sentiment': s, 'hate_speech': h})
+
+    try:
+        with open(out_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_FIELDS)
+            chunks = _iter_text_chunks(fileobj, column, chunk_rows)
+            if workers <= 1:
+                for texts in chunks:
+                    _consume(texts, _classify_chunk(texts), writer)
+            else:
+                # Keep at most 2 chunks per worker in flight so memory stays bounded
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    pending = []
+                    for texts in chunks:
+                        pending.append((texts, pool.submit(_classify_chunk, texts)))
+                        if len(pending) >= workers * 2:
+                            head_texts, fut = pending.pop(0)
+                            _consume(head_texts, fut.result(), writer)
+                    for head_texts, fut in pending:
+                        _consume(head_texts, fut.result(), writer)
+    except Exception as e:
+        for path in (out_path, _owner_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return {'error': f"Error processing CSV file: {e}"}
+
+    classified = total - empty
+    denom = classified or 1
+    kpis = {
+        "total_comments": classified,
+        "hate_speech_pct": round(100.0 * hates.get("Hate Speech", 0) / denom, 1),
+        "positive_pct": round(100.0 * sentiments.get("Positive", 0) / denom, 1),
+        "negative_pct": round(100.0 * sentiments.get("Negative", 0) / denom, 1),
+        "neutral_pct": round(100.0 * sentiments.get("Neutral", 0) / denom, 1),
+    }
+    return {
+        'job_id': job_id,
+        'text_column': str(column),
+        'total_rows': total,
+        'classified_rows': classified,
+        'empty_rows': empty,
+        'sentiment_counts': dict(sentiments),
+        'hate_counts': dict(hates),
+        'kpis': kpis,
+        'preview': preview,
+    }
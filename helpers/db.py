@@ -0,0 +1,56 @@
+# helpers/db.py — shared SQLite plumbing for the on-disk stores
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+_local = threading.local()
+# Opening serializes: two threads switching a brand-new file to WAL at once can fail with "database is locked"
+_open_lock = threading.Lock()
+
+def db_path(name):
+    """Absolute path of a database file under data/."""
+    return os.path.join(DATA_DIR, name)
+
+def get_connection(path, schema=None):
+    """
+    Returns a connection for the current thread and process.
+
+    Connections are never shared across threads or across a fork (gunicorn
+    workers each open their own). New connections run in WAL mode so readers
+    don't block the single writer, and execute `schema` once.
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.conns = {}
+    conn = _local.conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with _open_lock:
+            # isolation_level=None: autocommit, transactions are explicit (see transaction())
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            if schema:
+                conn.executescript(schema)
+        _local.conns[path] = conn
+    return conn
+
+@contextmanager
+def transaction(conn):
+    """BEGIN IMMEDIATE … COMMIT, rolled back on error. Writers serialize on the lock."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
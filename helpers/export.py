@@ -0,0 +1,96 @@
+# helpers/export.py — streaming exporters for stored analysis results
+
+import os
+import io
+import csv
+import json
+
+from helpers.db import DATA_DIR
+from helpers.result_store import COMMENT_FIELDS, iter_result_comments
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+EXPORT_DIR = os.path.join(DATA_DIR, 'exports')
+PARQUET_ROW_GROUP = 10000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# -----------------------------
+# Text formats: generators, one row in memory at a time
+# -----------------------------
+def iter_csv(result_id, offset=0, header=True):
+    """Yields CSV text chunks. A resumed download (offset > 0) omits the header."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header and not offset:
+        writer.writerow(COMMENT_FIELDS)
+    for c in iter_result_comments(result_id, offset=offset):
+        writer.writerow(['' if c[k] is None else c[k] for k in COMMENT_FIELDS])
+        if buf.tell() >= 64 * 1024:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+def iter_ndjson(result_id, offset=0):
+    """Yields NDJSON text chunks, one comment object per line."""
+    lines = []
+    size = 0
+    for c in iter_result_comments(result_id, offset=offset):
+        line = json.dumps(c, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= 64 * 1024:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield ''.join(lines)
+
+# -----------------------------
+# Parquet: written once per result in row groups, then served as a file
+# -----------------------------
+def parquet_available():
+    return pq is not None
+
+def _parquet_schema():
+    return pa.schema([
+        ('text', pa.string()), ('username', pa.string()), ('date', pa.string()),
+        ('likes', pa.int64()), ('sentiment', pa.string()), ('hate_speech', pa.string()),
+        ('sentiment_proba', pa.float64()), ('hate_proba', pa.float64()),
+    ])
+
+def parquet_path(result_id):
+    """
+    Path of the Parquet export for a result, building it on first request.
+    Results are immutable, so the file is reused and can be served with byte ranges.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow. Install it with `pip install pyarrow`.")
+    path = os.path.join(EXPORT_DIR, f"{result_id}.parquet")
+    if os.path.exists(path):
+        return path
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    schema = _parquet_schema()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pq.ParquetWriter(tmp, schema) as writer:
+        rows = []
+        for c in iter_result_comments(result_id):
+            rows.append(c)
+            if len(rows) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    os.replace(tmp, path)   # atomic: concurrent exporters never see a partial file
+    return path
@@ -0,0 +1,145 @@
+# helpers/history_store.py — append-only per-user analysis history (SQLite, WAL)
+
+import os
+import sys
+import json
+import time
+
+from helpers.db import DATA_DIR, db_path, get_connection, transaction
+
+DB_PATH = db_path('history.db')
+LEGACY_JSON = os.path.join(DATA_DIR, 'user_analyses.json')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT,
+    result_id TEXT,
+    created_at REAL NOT NULL,
+    total_comments INTEGER NOT NULL DEFAULT 0,
+    hate_speech_pct REAL,
+    positive_pct REAL,
+    negative_pct REAL,
+    neutral_pct REAL,
+    kpis_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_user_time ON analyses (user_id, created_at);
+DROP INDEX IF EXISTS idx_analyses_target_time;
+CREATE INDEX IF NOT EXISTS idx_analyses_user_target_time ON analyses (user_id, source, target, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_time ON analyses (created_at);
+CREATE TABLE IF NOT EXISTS imports (
+    name TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _insert(conn, user_id, source, kpis, target, result_id, created_at, total):
+    kpis = kpis or {}
+    conn.execute(
+        'INSERT INTO analyses (user_id, source, target, result_id, created_at, total_comments,'
+        ' hate_speech_pct, positive_pct, negative_pct, neutral_pct, kpis_json)'
+        ' VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+        (
+            user_id, source, target, result_id, created_at,
+            int(total if total is not None else kpis.get('total_comments', 0) or 0),
+            kpis.get('hate_speech_pct'), kpis.get('positive_pct'),
+            kpis.get('negative_pct'), kpis.get('neutral_pct'),
+            json.dumps(kpis, default=str),
+        ),
+    )
+
+def _row_to_dict(row):
+    out = dict(row)
+    out['kpis'] = json.loads(out.pop('kpis_json') or '{}')
+    return out
+
+# -----------------------------
+# Writes (append-only)
+# -----------------------------
+def record_analysis(user_id, source, kpis, target=None, result_id=None, created_at=None):
+    """Append one analysis summary. Rows are never updated in place."""
+    if not user_id:
+        return
+    conn = _conn()
+    with transaction(conn):
+        _insert(conn, user_id, source, kpis, target, result_id,
+                created_at or time.time(), (kpis or {}).get('total_comments'))
+
+def import_legacy_json(path=LEGACY_JSON):
+    """
+    One-time import of data/user_analyses.json ({user_id: [summary, ...]}).
+    Recorded in the imports table, so repeated calls (every worker at boot) are no-ops.
+    Legacy entries carry no timestamp; the file's mtime is used, keeping list order.
+    Returns the number of rows imported by this call.
+    """
+    if not os.path.exists(path):
+        return 0
+    name = os.path.basename(path)
+    conn = _conn()
+    if conn.execute('SELECT 1 FROM imports WHERE name = ?', (name,)).fetchone():
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except Exception as e:
+        print(f"[WARNING] Could not read {path}: {e}")
+        return 0
+
+    base_ts = os.path.getmtime(path)
+    rows = 0
+    with transaction(conn):
+        # Re-check under the write lock: another worker may have imported meanwhile
+        if conn.execute('SELECT 1 FROM imports WHERE name = ?', (name,)).fetchone():
+            return 0
+        for user_id, entries in (payload or {}).items():
+            for i, entry in enumerate(entries or []):
+                _insert(conn, user_id, entry.get('source') or 'unknown', entry.get('kpis'),
+                        entry.get('target'), entry.get('result_id'),
+                        entry.get('created_at') or base_ts + i * 1e-3,
+                        entry.get('total_comments'))
+                rows += 1
+        conn.execute('INSERT INTO imports (name, imported_at, rows) VALUES (?,?,?)', (name, time.time(), rows))
+    return rows
+
+# -----------------------------
+# Queries
+# -----------------------------
+def recent_analyses(user_id, limit=10, source=None):
+    """Last N analyses for a user, newest first (idx_analyses_user_time)."""
+    if source:
+        rows = _conn().execute(
+            'SELECT * FROM analyses WHERE user_id = ? AND source = ? ORDER BY created_at DESC LIMIT ?',
+            (user_id, source, int(limit)),
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            'SELECT * FROM analyses WHERE user_id = ? ORDER BY created_at DESC LIMIT ?',
+            (user_id, int(limit)),
+        ).fetchall()
+    return [_row_to_dict(r) for r in rows]
+
+def hate_trend(user_id, source, target, since=None, limit=200):
+    """
+    A user's hate-speech % over time for one channel/video (idx_analyses_user_target_time), oldest first:
+      [{'created_at': ts, 'hate_speech_pct': x, 'total_comments': n}, ...]
+    """
+    rows = _conn().execute(
+        'SELECT created_at, hate_speech_pct, total_comments FROM ('
+        '  SELECT created_at, hate_speech_pct, total_comments FROM analyses'
+        '  WHERE user_id = ? AND source = ? AND target = ? AND created_at >= ?'
+        '  ORDER BY created_at DESC LIMIT ?'
+        ') ORDER BY created_at',
+        (user_id, source, target, float(since or 0), int(limit)),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+if __name__ == '__main__':
+    # python -m helpers.history_store [path/to/user_analyses.json]
+    n = import_legacy_json(sys.argv[1] if len(sys.argv) > 1 else LEGACY_JSON)
+    print(f"[INFO] Imported {n} legacy analyses into {DB_PATH}")
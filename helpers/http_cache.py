@@ -0,0 +1,159 @@
+# helpers/http_cache.py — response compression, validators and static fingerprinting
+
+import os
+import gzip
+import hashlib
+from email.utils import formatdate
+
+from flask import request, g
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+# Responses smaller than this aren't worth the CPU (and may grow when compressed)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+COMPRESS_LEVEL_GZIP = 6
+COMPRESS_LEVEL_BROTLI = 5
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'application/manifest+json', 'image/svg+xml',
+}
+ONE_YEAR = 31536000
+# Bump when the analysis page markup changes so cached result pages revalidate
+RESULT_ETAG_VERSION = 1
+
+_fingerprints = {}        # static path -> (mtime, digest)
+_static_encoded = {}      # (endpoint, path, mtime, encoding) -> compressed bytes
+_STATIC_CACHE_MAX = 64
+
+# -----------------------------
+# Static fingerprints
+# -----------------------------
+def static_fingerprint(static_folder, filename):
+    """Content hash of a static file, cached until its mtime changes."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()[:10]
+    _fingerprints[path] = (mtime, digest)
+    return digest
+
+# -----------------------------
+# Result validators
+# -----------------------------
+def result_etag(result, *parts):
+    """Strong ETag for an immutable stored result, scoped to the viewer and request variant."""
+    user_id = (getattr(g, 'user', None) or {}).get('id', '')
+    key = '|'.join([result['id'], str(RESULT_ETAG_VERSION), user_id] + [str(p) for p in parts])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def not_modified(etag, last_modified):
+    """True when the client's cached copy (If-None-Match / If-Modified-Since) is still valid."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+def apply_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    response.headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    # Results are per-user: cacheable in the browser only, always revalidated
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# -----------------------------
+# Compression
+# -----------------------------
+def _pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_LEVEL_BROTLI)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL_GZIP, mtime=0)
+
+def _compress_response(response):
+    if (response.status_code != 200
+            or (response.is_streamed and not response.direct_passthrough)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _pick_encoding()
+    if encoding is None:
+        return response
+
+    static_key = None
+    if response.direct_passthrough:
+        # send_file responses: compress each static file once per encoding
+        if request.endpoint != 'static':
+            return response
+        static_key = (request.endpoint, request.path, response.last_modified, encoding)
+        cached = _static_encoded.get(static_key)
+        if cached is not None:
+            response.direct_passthrough = False
+            response.set_data(cached)
+            return _finish_encoding(response, encoding)
+        response.direct_passthrough = False
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    body = _compress(data, encoding)
+    if static_key is not None:
+        if len(_static_encoded) >= _STATIC_CACHE_MAX:
+            _static_encoded.pop(next(iter(_static_encoded)))
+        _static_encoded[static_key] = body
+    response.set_data(body)
+    return _finish_encoding(response, encoding)
+
+def _finish_encoding(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # A different byte representation needs its own strong validator
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+# -----------------------------
+# Flask wiring
+# -----------------------------
+def init_app(app):
+    @app.before_request
+    def _strip_encoding_from_validators():
+        # Clients echo the encoding-specific ETag; compare against the underlying entity
+        inm = request.environ.get('HTTP_IF_NONE_MATCH')
+        if inm and ('-gzip"' in inm or '-br"' in inm):
+            request.environ['HTTP_IF_NONE_MATCH'] = inm.replace('-gzip"', '"').replace('-br"', '"')
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            digest = static_fingerprint(app.static_folder, values['filename'])
+            if digest:
+                values['v'] = digest
+
+    @app.after_request
+    def _cache_and_compress(response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+            # URL changes whenever the file does, so the browser never needs to revalidate
+            response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        return _compress_response(response)
@@ -0,0 +1,212 @@
+# helpers/instagram_fetch.py — Instagram comments via the Apify comment scraper, read page by page while the run is going
+
+import os
+import time
+import threading
+from contextlib import closing
+from urllib.parse import urlsplit, quote
+
+import requests
+
+from config import APIFY_TOKEN as FALLBACK_TOKEN
+from helpers import api_cache
+
+DEFAULT_API_URL = 'https://api.apify.com'
+# Point at a local stand-in (tests) or a proxy
+APIFY_API_URL = os.getenv('APIFY_API_URL', DEFAULT_API_URL).rstrip('/')
+ACTOR_ID = os.getenv('APIFY_INSTAGRAM_ACTOR', 'apify/instagram-comment-scraper')
+# Dataset items read per request
+PAGE_SIZE = int(os.getenv('APIFY_DATASET_PAGE_SIZE', 100))
+# When no new items are there yet, long-poll the run this many seconds (the API allows up to 60)
+POLL_SECONDS = int(os.getenv('APIFY_POLL_SECONDS', 5))
+# A run still going after this long is aborted; what it produced so far is kept
+RUN_TIMEOUT = int(os.getenv('APIFY_RUN_TIMEOUT', 300))
+# Comments of a post are served from the shared cache for this long
+CACHE_TTL = int(os.getenv('INSTAGRAM_CACHE_TTL', 3600))
+MAX_RESULTS_PER_POST = 500
+
+_TERMINAL = {'SUCCEEDED', 'FAILED', 'ABORTED', 'TIMED-OUT'}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+class InstagramFetchError(Exception):
+    """Raised by iter_post_comment_pages when the actor can't be run or produced nothing."""
+
+def _token():
+    token = os.getenv('APIFY_TOKEN') or FALLBACK_TOKEN
+    if not token:
+        raise InstagramFetchError("Apify token is missing. Set APIFY_TOKEN in environment or .env")
+    return token
+
+def _http():
+    """Process-wide requests.Session (keeps the connection to the API open), rebuilt after a fork."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session, _session_pid = requests.Session(), os.getpid()
+    return _session
+
+def _api(method, path, stats, **kwargs):
+    """One Apify API v2 call; JSON body of the response."""
+    stats['api_calls'] += 1
+    try:
+        resp = _http().request(
+            method, f"{APIFY_API_URL}/v2{path}",
+            headers={'Authorization': f"Bearer {_token()}"}, timeout=POLL_SECONDS + 30, **kwargs
+        )
+    except requests.RequestException as e:
+        raise InstagramFetchError(f"Apify API unreachable: {e}")
+    if resp.status_code >= 400:
+        try:
+            message = resp.json()['error']['message']
+        except Exception:
+            message = resp.text[:200]
+        raise InstagramFetchError(f"Apify API error {resp.status_code}: {message}")
+    return resp.json()
+
+def new_fetch_stats():
+    """Per-analysis counters filled in by the fetcher (pass as `stats=`)."""
+    return {'api_calls': 0, 'posts': 0, 'cache_hits': 0, 'pages': 0, 'items': 0, 'run_status': None}
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def normalize_post_url(url):
+    """https://instagram.com/p/ID/?igsh=… → https://www.instagram.com/p/ID/ (the cache key)."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host in ('instagram.com', 'm.instagram.com'):
+        host = 'www.instagram.com'
+    path = parts.path.rstrip('/')
+    return f"https://{host}{path}/" if host else url.strip()
+
+def parse_post_urls(text):
+    """Post/reel URLs from a textarea (one per line or comma separated), normalized and deduped."""
+    urls = []
+    for raw in text.replace(',', '\n').splitlines():
+        raw = raw.strip()
+        if raw and 'instagram.com/' in raw:
+            url = normalize_post_url(raw)
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+def _comment_from_item(item):
+    return {
+        'id': item.get('id'),
+        'text': item.get('text') or '',
+        'username': item.get('ownerUsername') or (item.get('owner') or {}).get('username') or 'Unknown',
+        'date': item.get('timestamp') or '',
+        'likes': int(item.get('likesCount') or 0),
+        'reply_count': int(item.get('repliesCount') or 0),
+        'post_url': normalize_post_url(item['postUrl']) if item.get('postUrl') else None,
+    }
+
+def _cache_key(url):
+    return f"instagram:comments:{url}"
+
+def _cached_comments(url, limit):
+    """Cached comments of a post, if the cached fetch asked for at least `limit` of them."""
+    cached = api_cache.get(_cache_key(url))
+    if cached and cached['limit'] >= limit:
+        return cached['comments'][:limit]
+    return None
+
+# -----------------------------
+# Actor run
+# -----------------------------
+def _run_pages(urls, limit, stats):
+    """
+    Start the scraper for `urls` and yield dataset items as they appear, PAGE_SIZE
+    at a time, instead of waiting for the run to finish and downloading it all.
+    A run left behind (consumer stopped early, timeout) is aborted.
+    """
+    actor = quote(ACTOR_ID.replace('/', '~'), safe='~')
+    run = _api('POST', f"/acts/{actor}/runs", stats,
+               json={'directUrls': urls, 'resultsLimit': limit})['data']
+    run_id, dataset_id = run['id'], run['defaultDatasetId']
+    deadline = time.time() + RUN_TIMEOUT
+    offset = 0
+    try:
+        while True:
+            # Status first: a run that had finished before this read has nothing after it
+            finished = run['status'] in _TERMINAL
+            items = _api('GET', f"/datasets/{dataset_id}/items", stats,
+                         params={'offset': offset, 'limit': PAGE_SIZE, 'clean': 'true', 'format': 'json'})
+            if items:
+                offset += len(items)
+                yield items
+            if len(items) == PAGE_SIZE:
+                continue
+            if finished:
+                break
+            if time.time() > deadline:
+                print(f"[WARNING] Apify run {run_id} still {run['status']} after {RUN_TIMEOUT}s; aborting")
+                break
+            run = _api('GET', f"/actor-runs/{run_id}", stats, params={'waitForFinish': POLL_SECONDS})['data']
+    finally:
+        stats['run_status'] = run['status']
+        if run['status'] not in _TERMINAL:
+            try:
+                _api('POST', f"/actor-runs/{run_id}/abort", stats)
+            except InstagramFetchError as e:
+                print(f"[WARNING] Could not abort Apify run {run_id}: {e}")
+
+def iter_post_comment_pages(urls, limit=50, stats=None):
+    """
+    Lists of comments for Instagram post/reel `urls` (up to `limit` each): cached
+    posts first, then one actor run for the rest, read while it runs. Each post's
+    comments are cached for CACHE_TTL once its run succeeded.
+    Raises InstagramFetchError when nothing could be fetched.
+    """
+    stats = stats if stats is not None else new_fetch_stats()
+    limit = min(max(1, int(limit)), MAX_RESULTS_PER_POST)
+    urls = [normalize_post_url(u) for u in urls]
+    stats['posts'] = len(urls)
+
+    missing = []
+    for url in urls:
+        comments = _cached_comments(url, limit)
+        if comments is None:
+            missing.append(url)
+            continue
+        stats['cache_hits'] += 1
+        if comments:
+            stats['pages'] += 1
+            stats['items'] += len(comments)
+            yield comments
+    if not missing:
+        return
+
+    by_post = {url: [] for url in missing}
+    # closing(): if our consumer stops early, the run is aborted right away
+    with closing(_run_pages(missing, limit, stats)) as runs:
+        yield from _collect(runs, missing, by_post, stats)
+
+    if stats['run_status'] == 'SUCCEEDED':
+        for url, comments in by_post.items():
+            api_cache.put(_cache_key(url), {'limit': limit, 'comments': comments}, CACHE_TTL)
+    elif not stats['items']:
+        raise InstagramFetchError(f"Instagram scraper run ended {stats['run_status']} without comments")
+
+def _collect(runs, missing, by_post, stats):
+    """Dataset items → comment pages, remembering each post's comments for the cache."""
+    for items in runs:
+        page = []
+        for item in items:
+            if item.get('error') or not item.get('text'):
+                continue
+            comment = _comment_from_item(item)
+            # With a single post every item belongs to it; otherwise go by the item's postUrl
+            post = missing[0] if len(missing) == 1 else comment['post_url']
+            if post in by_post:
+                comment['post_url'] = post
+                by_post[post].append(comment)
+            page.append(comment)
+        if page:
+            stats['pages'] += 1
+            stats['items'] += len(page)
+            yield page
@@ -0,0 +1,88 @@
+# helpers/pipeline.py — run generator stages concurrently, linked by bounded queues
+
+import os
+import queue
+import threading
+
+# Batches (e.g. API pages) buffered between two stages
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 2))
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+def run_pipeline(source, *stages, maxsize=None):
+    """
+    Yield source items after passing each through `stages` in order, where the
+    source and every stage run in their own thread. A stage is a function taking
+    one batch and returning the processed batch.
+
+    Each hand-off is a queue.Queue(maxsize), so a fast producer blocks instead of
+    buffering: at most maxsize batches wait between two stages and memory tracks
+    the queue size, not the total volume. Exceptions in any stage are re-raised
+    in the consumer; closing the generator early stops the upstream threads.
+    """
+    maxsize = maxsize or PIPELINE_QUEUE_SIZE
+    stop = threading.Event()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(q):
+        while True:
+            try:
+                item = q.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+
+    def feed(items, q):
+        try:
+            for item in items:
+                if not put(q, item):
+                    return
+        except BaseException as e:
+            put(q, _Failure(e))
+        else:
+            put(q, _DONE)
+        finally:
+            # Run the producer's own cleanup (open connections, worker pools) in this thread
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    def apply(stage, batches):
+        for batch in batches:
+            yield stage(batch)
+
+    threads = []
+    q = queue.Queue(maxsize)
+    threads.append(threading.Thread(target=feed, args=(source, q), name='pipeline-source', daemon=True))
+    for i, stage in enumerate(stages):
+        out = queue.Queue(maxsize)
+        threads.append(threading.Thread(target=feed, args=(apply(stage, drain(q)), out),
+                                        name=f'pipeline-stage-{i}', daemon=True))
+        q = out
+    for t in threads:
+        t.start()
+    try:
+        yield from drain(q)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5)
@@ -0,0 +1,216 @@
+# helpers/records.py — compact, array-backed storage for analyzed comments
+#
+# A list of analyzed comment dicts costs roughly 1 KB per comment: eleven keys, a
+# str per field and a repeat of "Safe Content" on every row. CommentBatch keeps the
+# same comments as a struct of arrays instead — texts and ids as UTF-8 in one buffer,
+# usernames, dates and labels interned to int32 codes, likes as int32, confidences as
+# float32 — and moves the text buffer to an anonymous memory-mapped file once it
+# passes SPILL_BYTES, so a large batch is paged by the OS rather than held in RAM.
+
+import mmap
+import os
+import tempfile
+from array import array
+from itertools import accumulate, islice
+
+import numpy as np
+
+# Text kept in memory per batch before it is moved to a memory-mapped temp file
+SPILL_BYTES = int(os.getenv('RECORDS_SPILL_BYTES', 64 * 1024 * 1024))
+SPILL_DIR = os.getenv('RECORDS_SPILL_DIR') or None   # None: the system temp dir
+
+# Comments converted per step when extending from a generator
+EXTEND_CHUNK = 1024
+
+_NAN = float('nan')
+
+class Comment:
+    """One comment read back from a CommentBatch; attribute or dict-style access, like the dicts it replaces."""
+    __slots__ = ('id', 'text', 'username', 'date', 'likes', 'sentiment', 'hate_speech',
+                 'sentiment_proba', 'hate_proba', 'is_reply')
+
+    def __init__(self, id, text, username, date, likes, sentiment, hate_speech, sentiment_proba, hate_proba,
+                 is_reply):
+        self.id, self.text, self.username, self.date, self.likes = id, text, username, date, likes
+        self.sentiment, self.hate_speech, self.is_reply = sentiment, hate_speech, is_reply
+        self.sentiment_proba, self.hate_proba = sentiment_proba, hate_proba
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class _Interned:
+    """Values stored once; rows hold their int32 code (first appearance = code 0)."""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+        self.codes = array('i')
+
+    def extend(self, values):
+        index, known = self.index, len(self.values)
+        codes = list(map(index.get, values))
+        if None in codes:
+            codes = [index.setdefault(v, len(index)) for v in values]
+        self.codes.extend(codes)
+        if len(index) > known:
+            # New values, in code order: first appearances within this page
+            self.values.extend(v for v in dict.fromkeys(values) if index[v] >= known)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+class _Strings:
+    """Variable-length strings as UTF-8 in one buffer plus end offsets; the buffer can move to a mmap."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.ends = array('q')
+        self.size = 0
+        self.file = None
+        self._map = None
+
+    def extend(self, values):
+        encoded = [(v or '').encode('utf-8') for v in values]
+        data = b''.join(encoded)
+        if self.file is None:
+            self.buf += data
+        else:
+            self.file.write(data)
+            self._map = None
+        self.ends.extend(islice(accumulate(map(len, encoded), initial=self.size), 1, None))
+        self.size += len(data)
+
+    def spill(self):
+        self.file = tempfile.TemporaryFile(prefix='comments-', dir=SPILL_DIR)
+        self.file.write(self.buf)
+        self.buf = bytearray()
+
+    def _view(self):
+        if self.file is None:
+            return self.buf
+        if self._map is None:
+            self.file.flush()
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        return self._map
+
+    def __getitem__(self, i):
+        start = self.ends[i - 1] if i else 0
+        return self._view()[start:self.ends[i]].decode('utf-8')
+
+    def __iter__(self):
+        view, start = self._view(), 0
+        for end in self.ends:
+            yield view[start:end].decode('utf-8')
+            start = end
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        if self.file is not None:
+            self.file.close()
+        self._map = None
+
+class CommentBatch:
+    """
+    Analyzed comments (the dicts of analyze_comments_sentiment_hate, plus 'id') as
+    columns. Append dicts, iterate Comment objects back in the same order, or hand
+    columns() to analysis.update_aggregates_columns without rebuilding any dicts.
+    """
+
+    def __init__(self, spill_bytes=None):
+        self.spill_bytes = SPILL_BYTES if spill_bytes is None else spill_bytes
+        self.texts = _Strings()
+        self.ids = _Strings()
+        self.has_id = array('b')
+        self.usernames = _Interned()
+        self.dates = _Interned()
+        self.sentiments = _Interned()
+        self.hate = _Interned()
+        self.likes = array('i')
+        self.is_reply = array('b')
+        self.sentiment_proba = array('f')
+        self.hate_proba = array('f')
+
+    def __len__(self):
+        return len(self.likes)
+
+    @property
+    def spilled(self):
+        return self.texts.file is not None
+
+    def append(self, c):
+        self.extend([c])
+
+    def extend(self, comments):
+        """Add comment dicts column by column; other iterables are taken EXTEND_CHUNK at a time."""
+        if not isinstance(comments, list):
+            comments = iter(comments)
+            while chunk := list(islice(comments, EXTEND_CHUNK)):
+                self.extend(chunk)
+            return self
+        ids = [c.get('id') for c in comments]
+        self.has_id.extend([i is not None for i in ids])
+        self.ids.extend(ids)
+        self.texts.extend([c.get('text') for c in comments])
+        self.usernames.extend([c.get('username') for c in comments])
+        self.dates.extend([c.get('date') for c in comments])
+        self.sentiments.extend([c.get('sentiment') for c in comments])
+        self.hate.extend([c.get('hate_speech') for c in comments])
+        self.likes.extend([int(c.get('likes') or 0) for c in comments])
+        self.is_reply.extend([bool(c.get('is_reply')) for c in comments])
+        for column, key in ((self.sentiment_proba, 'sentiment_proba'), (self.hate_proba, 'hate_proba')):
+            column.extend([_NAN if (p := c.get(key)) is None else p for c in comments])
+        if not self.spilled and self.texts.size > self.spill_bytes:
+            self.texts.spill()
+            self.ids.spill()
+        return self
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        sp, hp = self.sentiment_proba[i], self.hate_proba[i]
+        return Comment(self.ids[i] if self.has_id[i] else None, self.texts[i], self.usernames[i], self.dates[i],
+                       self.likes[i], self.sentiments[i], self.hate[i],
+                       None if sp != sp else sp, None if hp != hp else hp, bool(self.is_reply[i]))
+
+    def __iter__(self):
+        rows = zip(self.has_id, self.ids, self.texts, self.usernames.codes, self.dates.codes,
+                   self.likes, self.sentiments.codes, self.hate.codes, self.sentiment_proba, self.hate_proba,
+                   self.is_reply)
+        users, dates, sents, hates = (self.usernames.values, self.dates.values, self.sentiments.values,
+                                      self.hate.values)
+        for has_id, cid, text, u, d, likes, s, h, sp, hp, reply in rows:
+            yield Comment(cid if has_id else None, text, users[u], dates[d], likes, sents[s], hates[h],
+                          None if sp != sp else sp, None if hp != hp else hp, bool(reply))
+
+    def columns(self):
+        """The batch in the layout update_aggregates_columns takes (copies: the batch can keep growing)."""
+        codes = lambda interned: (np.frombuffer(interned.codes, dtype=np.int32).astype(np.int64), interned.values)
+        return {
+            'sentiment': codes(self.sentiments),
+            'hate_speech': codes(self.hate),
+            'date': codes(self.dates),
+            'likes': np.frombuffer(self.likes, dtype=np.int32).copy(),
+            'is_reply': np.frombuffer(self.is_reply, dtype=np.int8).astype(bool),
+        }
+
+    def nbytes(self):
+        """Bytes held in memory (text spilled to disk not counted)."""
+        arrays = (self.has_id, self.likes, self.is_reply, self.sentiment_proba, self.hate_proba, self.texts.ends,
+                  self.ids.ends, self.usernames.codes, self.dates.codes, self.sentiments.codes, self.hate.codes)
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.texts.buf) + len(self.ids.buf)
+
+    def close(self):
+        """Release the spill files (also released when the batch is garbage collected)."""
+        self.texts.close()
+        self.ids.close()
@@ -0,0 +1,198 @@
+# helpers/result_store.py — finished analyses, stored server-side under an id
+
+import json
+import time
+import uuid
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('results.db')
+
+# Column order used by the exporters
+COMMENT_FIELDS = [
+    'text', 'username', 'date', 'likes',
+    'sentiment', 'hate_speech', 'sentiment_proba', 'hate_proba',
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    source TEXT,
+    created_at REAL NOT NULL,
+    total_comments INTEGER NOT NULL DEFAULT 0,
+    meta_json TEXT
+);
+CREATE TABLE IF NOT EXISTS result_comments (
+    result_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    text TEXT,
+    username TEXT,
+    date TEXT,
+    likes INTEGER,
+    sentiment TEXT,
+    hate_speech TEXT,
+    sentiment_proba REAL,
+    hate_proba REAL,
+    PRIMARY KEY (result_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rc_sentiment ON result_comments (result_id, sentiment, seq);
+CREATE INDEX IF NOT EXISTS idx_rc_hate ON result_comments (result_id, hate_speech, seq);
+CREATE INDEX IF NOT EXISTS idx_rc_date ON result_comments (result_id, date, seq);
+"""
+
+MAX_PAGE_SIZE = 100
+
+_ID_CHARS = set('0123456789abcdef')
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _valid_id(result_id):
+    return bool(result_id) and len(result_id) == 32 and set(result_id) <= _ID_CHARS
+
+def _row_values(result_id, seq, c):
+    return (
+        result_id, seq,
+        c.get('text', ''), c.get('username', 'Unknown'), c.get('date', ''),
+        int(c.get('likes') or 0),
+        c.get('sentiment'), c.get('hate_speech'),
+        c.get('sentiment_proba'), c.get('hate_proba'),
+    )
+
+# -----------------------------
+# Writes
+# -----------------------------
+# Comment rows written per transaction while a result streams in
+SAVE_BATCH = 500
+
+def _insert_rows(conn, batch):
+    with transaction(conn):
+        conn.executemany('INSERT INTO result_comments VALUES (?,?,?,?,?,?,?,?,?,?)', batch)
+
+def save_result(analyzed_comments, user_id=None, source=None, meta=None):
+    """
+    Persist analyzed comments (output of analyze_comments_sentiment_hate). Returns the result id.
+    `analyzed_comments` may be a generator; `meta` may be a callable, evaluated once the
+    comments are written (for summaries aggregated while streaming).
+
+    Rows are committed SAVE_BATCH at a time, so the write lock is never held while the
+    generator is fetching; the `results` row goes in last, and until then get_result
+    doesn't see the id. If the generator fails, the rows written so far are removed.
+    """
+    result_id = uuid.uuid4().hex
+    conn = _conn()
+    n = 0
+    batch = []
+    try:
+        for c in analyzed_comments or []:
+            batch.append(_row_values(result_id, n, c))
+            n += 1
+            if len(batch) >= SAVE_BATCH:
+                _insert_rows(conn, batch)
+                batch = []
+        if batch:
+            _insert_rows(conn, batch)
+    except BaseException:
+        with transaction(conn):
+            conn.execute('DELETE FROM result_comments WHERE result_id = ?', (result_id,))
+        raise
+    meta_json = json.dumps((meta() if callable(meta) else meta) or {}, default=str)
+    with transaction(conn):
+        conn.execute(
+            'INSERT INTO results (id, user_id, source, created_at, total_comments, meta_json) VALUES (?,?,?,?,?,?)',
+            (result_id, user_id, source, time.time(), n, meta_json),
+        )
+    return result_id
+
+# -----------------------------
+# Reads
+# -----------------------------
+def get_result(result_id):
+    """Result metadata dict, or None if the id is unknown."""
+    if not _valid_id(result_id):
+        return None
+    row = _conn().execute('SELECT * FROM results WHERE id = ?', (result_id,)).fetchone()
+    if row is None:
+        return None
+    out = dict(row)
+    out['meta'] = json.loads(out.pop('meta_json') or '{}')
+    return out
+
+def iter_result_comments(result_id, offset=0, batch_size=1000):
+    """Yields comment dicts in original order starting at `offset`, one batch in memory at a time."""
+    conn = _conn()
+    seq = max(0, int(offset or 0))
+    cols = ', '.join(COMMENT_FIELDS)
+    while True:
+        rows = conn.execute(
+            f'SELECT seq, {cols} FROM result_comments WHERE result_id = ? AND seq >= ? ORDER BY seq LIMIT ?',
+            (result_id, seq, batch_size),
+        ).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield {k: r[k] for k in COMMENT_FIELDS}
+        seq = rows[-1]['seq'] + 1
+
+def query_result_comments(result_id, sentiment=None, hate_speech=None,
+                          date_from=None, date_to=None, after=None, before=None, per_page=25):
+    """
+    One page of a stored result in original order, optionally filtered by
+    sentiment, hate label and an inclusive YYYY-MM-DD date range. Paging is
+    keyed on seq — pass a page's 'next' as `after` or its 'prev' as `before` —
+    so a deep page is an index seek, not an OFFSET scan. 'total' needs a pass
+    over every match, so it is only counted for the first page (None after).
+    Returns {'items', 'per_page', 'total', 'next', 'prev'}.
+    """
+    per_page = min(max(1, int(per_page or 25)), MAX_PAGE_SIZE)
+    where = ['result_id = ?']
+    params = [result_id]
+    if sentiment:
+        where.append('sentiment = ?')
+        params.append(sentiment)
+    if hate_speech:
+        where.append('hate_speech = ?')
+        params.append(hate_speech)
+    if date_from:
+        where.append('date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('date <= ?')
+        params.append(date_to)
+    clause = ' AND '.join(where)
+
+    conn = _conn()
+    cols = ', '.join(COMMENT_FIELDS)
+    backward = before is not None and after is None
+    if backward:
+        seek, order = ' AND seq < ?', 'DESC'
+        params_page = params + [int(before)]
+    else:
+        seek, order = (' AND seq > ?', 'ASC') if after is not None else ('', 'ASC')
+        params_page = params + ([int(after)] if after is not None else [])
+    # One extra row tells whether there is another page in this direction
+    rows = conn.execute(
+        f'SELECT seq, {cols} FROM result_comments WHERE {clause}{seek} ORDER BY seq {order} LIMIT ?',
+        params_page + [per_page + 1],
+    ).fetchall()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+    first, last = (rows[0]['seq'], rows[-1]['seq']) if rows else (None, None)
+    if backward:
+        prev_cursor, next_cursor = (first if more else None), (last if rows else None)
+    else:
+        prev_cursor, next_cursor = (first if after is not None and rows else None), (last if more else None)
+
+    total = None
+    if after is None and before is None:
+        total = conn.execute(f'SELECT COUNT(*) FROM result_comments WHERE {clause}', params).fetchone()[0]
+    return {
+        'items': [{k: r[k] for k in COMMENT_FIELDS} for r in rows],
+        'per_page': per_page,
+        'total': total,
+        'next': next_cursor,
+        'prev': prev_cursor,
+    }
@@ -0,0 +1,157 @@
+# helpers/scheduler.py — background refresh of watched YouTube channels/videos
+#
+# Every TICK_SECONDS the scheduler leases the watches that are due (watch_store.claim_due)
+# and refreshes them on a small thread pool. A refresh is incremental — comments already
+# labelled in comment_store are reused, only new ones are classified — and spends the
+# BACKGROUND share of the YouTube quota, so interactive analyses are never starved.
+# The summary it stores is what /dashboard reads.
+#
+# Runs inside the web process (start(), unless WATCH_SCHEDULER=0) or on its own:
+#     python -m helpers.scheduler
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers import watch_store, youtube_quota
+from helpers.analysis import new_aggregates, summarize_aggregates
+from helpers.history_store import record_analysis
+from helpers.sources import SourceError, YouTubeSource, analyze_source
+from helpers.youtube_quota import BACKGROUND
+
+ENABLED = os.getenv('WATCH_SCHEDULER', '1').lower() not in ('0', 'false', 'off', 'no')
+# Refreshes running at once — across every process polling the same watch.db
+WATCH_WORKERS = int(os.getenv('WATCH_WORKERS', 2))
+TICK_SECONDS = float(os.getenv('WATCH_TICK_SECONDS', 15))
+DEFAULT_INTERVAL = int(os.getenv('WATCH_DEFAULT_INTERVAL', 900))
+MIN_INTERVAL = 300
+# ±fraction of the interval added to each next run, so watches added together drift apart
+JITTER = float(os.getenv('WATCH_JITTER', 0.1))
+# A refresh still running after this long is assumed dead and may be claimed again
+LEASE_SECONDS = int(os.getenv('WATCH_LEASE_SECONDS', 600))
+MAX_BACKOFF_SECONDS = 6 * 3600
+# Background units to keep in hand before starting a refresh (a video page costs 1, a channel a few more)
+QUOTA_RESERVE = int(os.getenv('WATCH_QUOTA_RESERVE', 20))
+
+def next_run_at(interval, failures=0, now=None):
+    """When to run next: the interval (doubled per consecutive failure, capped), jittered."""
+    delay = min(interval * 2 ** min(failures, 10), max(interval, MAX_BACKOFF_SECONDS))
+    return (now or time.time()) + delay * (1 + random.uniform(-JITTER, JITTER))
+
+def _quota_reset_at():
+    # Just after the Pacific-midnight reset, spread so deferred watches don't all wake at once
+    return time.time() + youtube_quota.usage()['seconds_to_reset'] + random.uniform(60, 600)
+
+def refresh_watch(watch):
+    """
+    Refresh one leased watch and release it. Returns 'ok', 'deferred' (background
+    quota used up: retried after the daily reset) or 'error' (retried with backoff).
+    """
+    if youtube_quota.available(BACKGROUND) < QUOTA_RESERVE:
+        watch_store.record_failure(watch['id'], 'deferred', 'Background YouTube quota used up for today',
+                                   _quota_reset_at())
+        return 'deferred'
+
+    kind = {'video_id': watch['target']} if watch['kind'] == 'video' else {'channel_id': watch['target']}
+    source = YouTubeSource(past_days=watch['past_days'], incremental=True, priority=BACKGROUND, **kind)
+    aggregates = new_aggregates()
+    started = time.time()
+    try:
+        for _ in analyze_source(source, aggregates):
+            pass
+    except SourceError as e:
+        if youtube_quota.available(BACKGROUND) < QUOTA_RESERVE:
+            watch_store.record_failure(watch['id'], 'deferred', str(e), _quota_reset_at())
+            return 'deferred'
+        print(f"[WARNING] Watch {watch['id']} ({watch['target']}) refresh failed: {e}")
+        watch_store.record_failure(watch['id'], 'error', str(e),
+                                   next_run_at(watch['interval_seconds'], watch['failures'] + 1))
+        return 'error'
+
+    summary = summarize_aggregates(aggregates)
+    stats = dict(source.stats, refresh_ms=round((time.time() - started) * 1000))
+    watch_store.save_snapshot(watch['id'], summary, stats, next_run_at(watch['interval_seconds']))
+    # Scheduled refreshes only update the snapshot; one the user asked for also goes to their history
+    if watch['record_history'] and summary['total_comments']:
+        record_analysis(watch['user_id'], 'youtube', summary['kpis'], target=watch['target'])
+    print(f"[INFO] Watch {watch['id']} ({watch['target']}) refreshed: "
+          f"{summary['total_comments']} comments, {stats.get('comments_classified', 0)} classified")
+    return 'ok'
+
+def _refresh(watch):
+    try:
+        return refresh_watch(watch)
+    except Exception as e:
+        # Never leave a watch leased because of a bug: back off and let the next tick retry
+        print(f"[WARNING] Watch {watch['id']} refresh crashed: {e}")
+        watch_store.record_failure(watch['id'], 'error', str(e),
+                                   next_run_at(watch['interval_seconds'], watch['failures'] + 1))
+        return 'error'
+
+class Scheduler:
+    """Polls watch.db and runs due refreshes, at most `workers` at a time."""
+
+    def __init__(self, workers=WATCH_WORKERS, tick_seconds=TICK_SECONDS):
+        self.workers, self.tick_seconds = workers, tick_seconds
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watch')
+        self.inflight = set()
+        self.stats = {'ticks': 0, 'ok': 0, 'deferred': 0, 'error': 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _run(self, watch):
+        status = _refresh(watch)
+        with self._lock:
+            self.inflight.discard(watch['id'])
+            self.stats[status] += 1
+        return status
+
+    def tick(self):
+        """Claim what is due (up to the free worker slots) and submit it. Returns the futures."""
+        with self._lock:
+            self.stats['ticks'] += 1
+            free = self.workers - len(self.inflight)
+        futures = []
+        for watch in watch_store.claim_due(free, LEASE_SECONDS, max_running=self.workers):
+            with self._lock:
+                self.inflight.add(watch['id'])
+            futures.append(self.pool.submit(self._run, watch))
+        return futures
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[WARNING] Watch scheduler tick failed: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self.pool.shutdown(wait=wait)
+
+_scheduler = None
+_start_lock = threading.Lock()
+
+def start():
+    """Run the scheduler on a daemon thread (once per process). Returns it."""
+    global _scheduler
+    with _start_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+            threading.Thread(target=_scheduler.run, name='watch-scheduler', daemon=True).start()
+            print(f"[INFO] Watch scheduler started ({WATCH_WORKERS} workers, tick {TICK_SECONDS:g}s)")
+    return _scheduler
+
+def metrics():
+    return dict(_scheduler.stats, inflight=len(_scheduler.inflight)) if _scheduler else {'running': False}
+
+if __name__ == '__main__':
+    scheduler = Scheduler()
+    print(f"[INFO] Watch scheduler running ({WATCH_WORKERS} workers, tick {TICK_SECONDS:g}s)")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop(wait=False)
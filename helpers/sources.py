@@ -0,0 +1,240 @@
+# helpers/sources.py — every platform behind one interface, analyzed by one shared pipeline
+
+"""
+A Source yields pages of normalized comment records:
+
+    {'id', 'text', 'username', 'date', 'likes', 'is_reply', 'platform', 'target', ...}
+
+plus 'sentiment'/'hate_speech'/'sentiment_proba'/'hate_proba' when the record was
+labelled on an earlier run. analyze_source() takes any Source through
+dedupe → classify in batches → normalize/aggregate, so routes no longer carry
+their own copy of that loop.
+"""
+
+import os
+import time
+
+from model.predict import predict_batch
+from helpers.analysis import analyze_comments_sentiment_hate, update_aggregates
+from helpers.pipeline import run_pipeline
+from helpers import comment_store
+from helpers.youtube_fetch import (
+    iter_video_comment_pages,
+    iter_channel_comment_pages,
+    new_fetch_stats as new_youtube_stats,
+    YouTubeFetchError
+)
+from helpers.youtube_quota import INTERACTIVE
+from helpers.instagram_fetch import (
+    iter_post_comment_pages,
+    new_fetch_stats as new_instagram_stats,
+    InstagramFetchError
+)
+from twitter_utils import fetch_tweets_resilient
+
+# Texts per predict_batch call; larger pages are labelled in slices of this size
+CLASSIFY_BATCH = int(os.getenv('CLASSIFY_BATCH_SIZE', 128))
+
+SOURCES = {}
+
+class SourceError(Exception):
+    """A source couldn't be read; the message is meant for the user."""
+
+def register_source(cls):
+    """Class decorator: make a Source available by its platform name in SOURCES."""
+    SOURCES[cls.platform] = cls
+    return cls
+
+class Source:
+    """
+    Base class. Subclasses set `platform` and `errors` (their fetcher's exception
+    types, surfaced as SourceError) and implement fetch_pages() and normalize().
+    """
+    platform = None
+    errors = ()
+
+    def __init__(self, target):
+        self.target = target
+        self.stats = {}
+
+    def fetch_pages(self):
+        """Lists of raw items from the platform, fetched lazily."""
+        raise NotImplementedError
+
+    def normalize(self, item):
+        """One raw item → record dict (see the module docstring)."""
+        raise NotImplementedError
+
+    def save_labels(self, records):
+        """Persist labels the pipeline computed; sources that store comments override this."""
+
+    def record(self, item_id, text, username, date, likes=0, is_reply=False, **extra):
+        rec = {
+            'id': str(item_id) if item_id is not None else None,
+            'text': (text or '').strip(),
+            'username': username or 'Unknown',
+            'date': date or '',
+            'likes': likes or 0,
+            'is_reply': bool(is_reply),
+            'platform': self.platform,
+            'target': self.target,
+        }
+        rec.update(extra)
+        return rec
+
+    def pages(self):
+        """Pages of records with text; fetch errors are raised as SourceError."""
+        try:
+            for page in self.fetch_pages():
+                records = [r for r in map(self.normalize, page) if r['text']]
+                if records:
+                    yield records
+        except self.errors as e:
+            raise SourceError(str(e)) from e
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
+
+# -----------------------------
+# Platforms
+# -----------------------------
+_LABEL_FIELDS = ('sentiment', 'hate_speech', 'sentiment_proba', 'hate_proba')
+
+@register_source
+class YouTubeSource(Source):
+    """Comments of one video or a channel's recent uploads; labels are kept in comment_store."""
+    platform = 'youtube'
+    errors = (YouTubeFetchError,)
+
+    def __init__(self, video_id=None, channel_id=None, past_days=7, replies=False, incremental=True,
+                 priority=INTERACTIVE):
+        super().__init__(video_id or channel_id)
+        self.video_id, self.channel_id = video_id, channel_id
+        self.past_days, self.replies, self.incremental, self.priority = past_days, replies, incremental, priority
+        self.stats = new_youtube_stats()
+
+    def fetch_pages(self):
+        kwargs = dict(stats=self.stats, incremental=self.incremental, priority=self.priority, replies=self.replies)
+        if self.video_id:
+            return iter_video_comment_pages(self.video_id, self.past_days, **kwargs)
+        return iter_channel_comment_pages(self.channel_id, self.past_days, **kwargs)
+
+    def normalize(self, item):
+        labels = {k: item.get(k) for k in _LABEL_FIELDS} if item.get('sentiment') else {}
+        return self.record(item.get('id'), item.get('text'), item.get('username'), item.get('date'),
+                           int(item.get('likes', 0)), item.get('is_reply'), video_id=item.get('video_id'),
+                           **labels)
+
+    def save_labels(self, records):
+        comment_store.save_labels(records)
+
+@register_source
+class TwitterSource(Source):
+    """Recent tweets for a query: cached, stale-while-revalidate or live (see fetch_tweets_resilient)."""
+    platform = 'twitter'
+
+    def __init__(self, query, max_results=30, allow_mock=True):
+        super().__init__(query)
+        self.max_results, self.allow_mock = max_results, allow_mock
+        self.tweets = []
+        self.stats = {'source': None}
+
+    def fetch_pages(self):
+        self.tweets, self.stats['source'] = fetch_tweets_resilient(
+            self.target, max_results=self.max_results, allow_mock=self.allow_mock)
+        yield self.tweets
+
+    def normalize(self, item):
+        return self.record(item.get('id'), item.get('text'), item.get('username'), item.get('created_at'))
+
+@register_source
+class InstagramSource(Source):
+    """Comments of Instagram posts/reels, read from the Apify scraper's dataset as the run goes."""
+    platform = 'instagram'
+    errors = (InstagramFetchError,)
+
+    def __init__(self, urls, limit=50):
+        super().__init__(urls[0] if len(urls) == 1 else f"{len(urls)} posts")
+        self.urls, self.limit = urls, limit
+        self.stats = new_instagram_stats()
+
+    def fetch_pages(self):
+        return iter_post_comment_pages(self.urls, self.limit, stats=self.stats)
+
+    def normalize(self, item):
+        return self.record(item.get('id'), item.get('text'), item.get('username'), item.get('date'),
+                           int(item.get('likes', 0)), post_url=item.get('post_url'))
+
+# -----------------------------
+# Shared pipeline
+# -----------------------------
+def label_batch(items):
+    """Sentiment/hate labels (and model confidences) for dicts with 'text', set in place via predict_batch."""
+    texts = [item['text'].strip() for item in items]
+    try: sent_labels, sent_probas = predict_batch(texts, mode='sentiment', return_proba=True)
+    except: sent_labels, sent_probas = ['Neutral'] * len(texts), [None] * len(texts)
+    try: hate_labels, hate_probas = predict_batch(texts, mode='hate', return_proba=True)
+    except: hate_labels, hate_probas = ['Safe'] * len(texts), [None] * len(texts)
+    for i, item in enumerate(items):
+        item.update({
+            'sentiment': str(sent_labels[i]),
+            'hate_speech': str(hate_labels[i]),
+            'sentiment_proba': sent_probas[i],
+            'hate_proba': hate_probas[i]
+        })
+    return items
+
+def _dedupe_stage(stats):
+    seen = set()
+
+    def dedupe(records):
+        out = []
+        for r in records:
+            key = r['id'] or (r['username'], r['text'], r['date'])
+            if key not in seen:
+                seen.add(key)
+                out.append(r)
+        stats['duplicates'] += len(records) - len(out)
+        return out
+    return dedupe
+
+def _classify_stage(source):
+    stats = source.stats
+
+    def classify(records):
+        pending = [r for r in records if not r.get('sentiment')]
+        started = time.time()
+        for i in range(0, len(pending), CLASSIFY_BATCH):
+            label_batch(pending[i:i + CLASSIFY_BATCH])
+        stats['classify_ms'] += round((time.time() - started) * 1000)
+        stats['comments_classified'] += len(pending)
+        if pending:
+            source.save_labels(pending)
+        analyzed = analyze_comments_sentiment_hate(records)
+        for r, a in zip(records, analyzed):
+            a['id'] = r['id']
+        return analyzed
+    return classify
+
+def analyze_source(source, aggregates=None, dedupe=True):
+    """
+    Yield the analyzed comments of `source`. Fetching, dedupe and classification
+    run concurrently a page at a time (run_pipeline); each batch is folded into
+    `aggregates` (from new_aggregates) before its comments are yielded. Counts and
+    timings go to source.stats. Raises SourceError.
+    """
+    stats = source.stats
+    for name in ('comments_classified', 'duplicates', 'classify_ms'):
+        stats.setdefault(name, 0)
+    started = time.time()
+
+    def timed(pages):
+        yield from pages
+        stats['fetch_ms'] = round((time.time() - started) * 1000)
+
+    stages = ([_dedupe_stage(stats)] if dedupe else []) + [_classify_stage(source)]
+    for batch in run_pipeline(timed(source.pages()), *stages):
+        if aggregates is not None:
+            update_aggregates(aggregates, batch)
+        yield from batch
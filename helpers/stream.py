@@ -0,0 +1,438 @@
+# helpers/stream.py — continuous scoring of a comment stream with tumbling and sliding windows per channel
+#
+#   python -m helpers.stream --ndjson comments.ndjson --follow      # tail a file as it grows
+#   producer | python -m helpers.stream --stdin
+#   python -m helpers.stream --socket /tmp/hatesense.sock           # any number of writers, one JSON per line
+#
+# Each message is one JSON object per line: {"text": ..., "channel": ..., "ts": epoch or ISO 8601,
+# "id": ..., "username": ...}; only "text" is required. Windowed aggregates are served on
+# http://127.0.0.1:<--http-port>/windows (?channel=) and throughput on /metrics. With --rules,
+# alerts (helpers/alerts.py) are evaluated on every batch, posted to each --webhook and listed on /alerts.
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from helpers.alerts import MAX_SKEW_SECONDS, AlertEngine, WebhookNotifier, load_rules, event_second
+from helpers.analysis import analyze_comments_sentiment_hate
+from helpers.pipeline import run_pipeline
+from helpers.sources import label_batch
+
+# Messages per classification call, and how long a partial batch may wait for more
+MICRO_BATCH = int(os.getenv('STREAM_MICRO_BATCH', 64))
+MAX_WAIT_SECONDS = float(os.getenv('STREAM_MAX_WAIT', 0.25))
+# Window name → length in seconds; every window is kept both tumbling and sliding
+WINDOWS = {'1m': 60, '5m': 300, '1h': 3600}
+# Throughput line printed this often, and the span of the "recent" rate
+REPORT_SECONDS = float(os.getenv('STREAM_REPORT_SECONDS', 10))
+RECENT_SECONDS = 10
+TAIL_POLL_SECONDS = 0.2
+DEFAULT_CHANNEL = 'default'
+
+_DONE = object()
+
+# -----------------------------
+# Inputs: iterators of raw lines
+# -----------------------------
+def tail_lines(path, follow=True, from_end=False, poll=TAIL_POLL_SECONDS):
+    """
+    Lines of a file, then (follow=True) lines appended to it, like `tail -F`:
+    a partially written last line is held back until its newline arrives, and
+    a file that is rotated (new inode) or truncated is reopened from the start.
+    """
+    f = open(path, 'r', encoding='utf-8')
+    try:
+        if from_end:
+            f.seek(0, os.SEEK_END)
+        inode = os.fstat(f.fileno()).st_ino
+        partial = ''
+        while True:
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith('\n'):
+                    yield partial
+                    partial = ''
+                continue
+            if not follow:
+                if partial:
+                    yield partial
+                return
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+            if st is not None and (st.st_ino != inode or st.st_size < f.tell()):
+                f.close()
+                f = open(path, 'r', encoding='utf-8')
+                inode, partial = os.fstat(f.fileno()).st_ino, ''
+                continue
+            time.sleep(poll)
+    finally:
+        f.close()
+
+def socket_lines(path, backlog=16):
+    """Lines written by any number of clients of a Unix socket at `path`, in arrival order."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(backlog)
+    lines = queue.Queue(maxsize=MICRO_BATCH * 16)
+
+    def client(conn):
+        with conn, conn.makefile('r', encoding='utf-8') as f:
+            for line in f:
+                lines.put(line)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=client, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, name='stream-accept', daemon=True).start()
+    try:
+        while True:
+            yield lines.get()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+# -----------------------------
+# Parsing and micro-batching
+# -----------------------------
+def _parse_ts(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return default
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+def parse_messages(lines, stats):
+    """JSON lines → message dicts with text/channel/ts; blank, invalid and text-less lines are counted and skipped."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+            text = (msg.get('text') or '').strip()
+        except (ValueError, AttributeError):
+            stats['invalid'] += 1
+            continue
+        if not text:
+            stats['invalid'] += 1
+            continue
+        yield {
+            'id': msg.get('id'),
+            'text': text,
+            'username': msg.get('username') or 'Unknown',
+            'channel': str(msg.get('channel') or DEFAULT_CHANNEL),
+            'ts': _parse_ts(msg.get('ts'), time.time()),
+        }
+
+def micro_batches(messages, size=MICRO_BATCH, max_wait=MAX_WAIT_SECONDS):
+    """
+    Lists of up to `size` messages. A partial batch is flushed `max_wait` seconds
+    after its first message, so a trickle isn't held back waiting for a full batch.
+    """
+    q = queue.Queue(maxsize=size * 4)
+
+    def feed():
+        try:
+            for msg in messages:
+                q.put(msg)
+        except BaseException as e:
+            q.put(e)
+        q.put(_DONE)
+
+    threading.Thread(target=feed, name='stream-reader', daemon=True).start()
+    batch, deadline = [], None
+    while True:
+        try:
+            msg = q.get(timeout=max(0, deadline - time.monotonic()) if batch else None)
+        except queue.Empty:
+            yield batch
+            batch = []
+            continue
+        if msg is _DONE:
+            if batch:
+                yield batch
+            return
+        if isinstance(msg, BaseException):
+            raise msg
+        if not batch:
+            deadline = time.monotonic() + max_wait
+        batch.append(msg)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+def score_batch(batch):
+    """Pipeline stage: model labels for a micro-batch, normalized like every other analysis."""
+    label_batch(batch)
+    for msg, analyzed in zip(batch, analyze_comments_sentiment_hate(batch)):
+        msg['sentiment'], msg['hate_speech'] = analyzed['sentiment'], analyzed['hate_speech']
+    return batch
+
+# -----------------------------
+# Windows
+# -----------------------------
+# Per-second bucket layout
+_TOTAL, _POS, _NEU, _NEG, _HATE = range(5)
+_SENTIMENT_SLOT = {'Positive': _POS, 'Neutral': _NEU, 'Negative': _NEG}
+
+class WindowStore:
+    """
+    Sentiment/hate counts per channel in one-second buckets, from which every
+    window is summed on request. Windows run on event time: "now" is the newest
+    message timestamp seen (the watermark), so a replayed file gives the same
+    windows as the live stream did. Buckets older than two of the longest
+    window (enough for the previous tumbling window) are dropped, and so are
+    messages that arrive that late. Timestamps more than MAX_SKEW_SECONDS
+    ahead of the wall clock are counted at that limit (and in `future`).
+    """
+
+    def __init__(self, windows=None):
+        self.windows = dict(windows or WINDOWS)
+        self.horizon = 2 * max(self.windows.values())
+        self.watermark = None
+        self.late = 0
+        self.future = 0
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._pruned_at = None
+
+    def add(self, messages):
+        with self._lock:
+            limit = time.time() + MAX_SKEW_SECONDS
+            for msg in messages:
+                if msg['ts'] > limit:
+                    self.future += 1
+                second = event_second(msg['ts'], limit)
+                if self.watermark is not None and second < self.watermark - self.horizon:
+                    self.late += 1
+                    continue
+                if self.watermark is None or second > self.watermark:
+                    self.watermark = second
+                bucket = self._channels.setdefault(msg['channel'], {}).setdefault(second, [0, 0, 0, 0, 0])
+                bucket[_TOTAL] += 1
+                bucket[_SENTIMENT_SLOT.get(msg['sentiment'], _NEU)] += 1
+                if msg['hate_speech'] == 'Hate Speech':
+                    bucket[_HATE] += 1
+            if self.watermark is not None and self._pruned_at != self.watermark:
+                self._prune(self.watermark - self.horizon)
+                self._pruned_at = self.watermark
+
+    def _prune(self, cutoff):
+        for buckets in self._channels.values():
+            for second in [s for s in buckets if s < cutoff]:
+                del buckets[second]
+
+    @staticmethod
+    def _summary(buckets, start, end):
+        counts = [0, 0, 0, 0, 0]
+        for second, bucket in buckets.items():
+            if start <= second < end:
+                for i in range(5):
+                    counts[i] += bucket[i]
+        total = counts[_TOTAL]
+        pct = lambda n: round(100.0 * n / total, 1) if total else 0.0
+        return {
+            'start': start,
+            'end': end,
+            'count': total,
+            'hate_count': counts[_HATE],
+            'hate_pct': pct(counts[_HATE]),
+            'positive_pct': pct(counts[_POS]),
+            'neutral_pct': pct(counts[_NEU]),
+            'negative_pct': pct(counts[_NEG]),
+        }
+
+    def snapshot(self, channel=None):
+        """
+        {'watermark', 'late', 'future', 'channels': {channel: {window: {'sliding', 'tumbling',
+        'previous'}}}}: sliding = the `window` seconds up to the watermark, tumbling =
+        the epoch-aligned window holding it (still filling), previous = the one before.
+        """
+        with self._lock:
+            now = self.watermark
+            channels = {}
+            for name, buckets in self._channels.items():
+                if channel is not None and name != channel:
+                    continue
+                out = {}
+                for label, length in self.windows.items():
+                    if now is None:
+                        continue
+                    start = now - now % length
+                    out[label] = {
+                        'sliding': self._summary(buckets, now + 1 - length, now + 1),
+                        'tumbling': self._summary(buckets, start, start + length),
+                        'previous': self._summary(buckets, start - length, start),
+                    }
+                channels[name] = out
+            return {'watermark': now, 'late': self.late, 'future': self.future, 'channels': channels}
+
+class Throughput:
+    """Messages processed: overall rate since start and the rate over the last RECENT_SECONDS."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.messages = 0
+        self.batches = 0
+        self.classify_ms = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def add(self, n, classify_ms=0, now=None):
+        now = now or time.time()
+        with self._lock:
+            self.messages += n
+            self.batches += 1
+            self.classify_ms += classify_ms
+            self._recent.append((now, n))
+            while self._recent and self._recent[0][0] < now - RECENT_SECONDS:
+                self._recent.popleft()
+
+    def snapshot(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            elapsed = max(now - self.started, 1e-6)
+            recent = sum(n for t, n in self._recent if t >= now - RECENT_SECONDS)
+            return {
+                'messages': self.messages,
+                'batches': self.batches,
+                'elapsed_s': round(elapsed, 1),
+                'msgs_per_s': round(self.messages / elapsed, 1),
+                'recent_msgs_per_s': round(recent / min(elapsed, RECENT_SECONDS), 1),
+                'avg_batch': round(self.messages / self.batches, 1) if self.batches else 0.0,
+                'classify_ms_per_msg': round(self.classify_ms / self.messages, 2) if self.messages else 0.0,
+            }
+
+# -----------------------------
+# Consumer and HTTP endpoint
+# -----------------------------
+def consume(lines, store, meter, stats=None, size=MICRO_BATCH, max_wait=MAX_WAIT_SECONDS,
+            report_every=REPORT_SECONDS, alerts=None):
+    """
+    Read → micro-batch → classify → window (→ alert rules), with reading and classification
+    running concurrently (run_pipeline). Returns when `lines` ends; runs forever on a live input.
+    """
+    stats = stats if stats is not None else {'invalid': 0}
+    stats.setdefault('invalid', 0)
+
+    def timed(batch):
+        started = time.time()
+        score_batch(batch)
+        return batch, round((time.time() - started) * 1000)
+
+    reported = time.time()
+    batches = micro_batches(parse_messages(lines, stats), size, max_wait)
+    for batch, classify_ms in run_pipeline(batches, timed):
+        if not batch:
+            continue
+        store.add(batch)
+        if alerts is not None:
+            alerts.observe(batch)
+        meter.add(len(batch), classify_ms)
+        if report_every and time.time() - reported >= report_every:
+            reported = time.time()
+            t = meter.snapshot()
+            print(f"[INFO] stream: {t['messages']} msgs, {t['recent_msgs_per_s']} msg/s "
+                  f"(avg {t['msgs_per_s']}), {t['classify_ms_per_msg']} ms/msg classify, "
+                  f"{stats['invalid']} invalid, {store.late} late, {store.future} ahead of clock",
+                  file=sys.stderr)
+    return stats
+
+def serve(store, meter, stats, port, host='127.0.0.1', alerts=None, notifier=None):
+    """GET /windows[?channel=], /metrics and /alerts as JSON from a background thread. Returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/windows':
+                channel = parse_qs(url.query).get('channel', [None])[0]
+                body, code = store.snapshot(channel), 200
+            elif url.path == '/metrics':
+                body, code = dict(meter.snapshot(), invalid=stats.get('invalid', 0), late=store.late,
+                                  future=store.future), 200
+                if notifier is not None:
+                    body['webhooks'] = dict(notifier.stats)
+            elif url.path == '/alerts' and alerts is not None:
+                body, code = {'firing': alerts.firing(), 'events': alerts.events}, 200
+            else:
+                body, code = {'error': 'Not found. Try /windows, /metrics or /alerts.'}, 404
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='stream-http', daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m helpers.stream', description='Score a comment stream continuously.')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--ndjson', metavar='PATH', help='read an NDJSON file')
+    src.add_argument('--stdin', action='store_true', help='read NDJSON from standard input')
+    src.add_argument('--socket', metavar='PATH', help='listen on a Unix socket for NDJSON writers')
+    parser.add_argument('--follow', action='store_true', help='with --ndjson: keep reading as the file grows')
+    parser.add_argument('--from-end', action='store_true', help='with --ndjson --follow: skip existing lines')
+    parser.add_argument('--http-port', type=int, default=int(os.getenv('STREAM_HTTP_PORT', 8765)))
+    parser.add_argument('--http-host', default='127.0.0.1')
+    parser.add_argument('--batch', type=int, default=MICRO_BATCH, help='messages per classification call')
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT_SECONDS, help='seconds a partial batch may wait')
+    parser.add_argument('--rules', metavar='PATH', help='JSON list of alert rules (see helpers/alerts.py)')
+    parser.add_argument('--webhook', metavar='URL', action='append',
+                        default=[u for u in os.getenv('ALERT_WEBHOOKS', '').split(',') if u.strip()],
+                        help='POST alert events here (repeatable; default $ALERT_WEBHOOKS)')
+    args = parser.parse_args(argv)
+
+    if args.ndjson:
+        lines = tail_lines(args.ndjson, follow=args.follow, from_end=args.from_end)
+    elif args.socket:
+        lines = socket_lines(args.socket)
+    else:
+        lines = iter(sys.stdin.readline, '')
+
+    notifier = WebhookNotifier(args.webhook) if args.webhook else None
+    alerts = AlertEngine(load_rules(args.rules), notify=notifier) if args.rules else None
+    store, meter, stats = WindowStore(), Throughput(), {'invalid': 0}
+    server = serve(store, meter, stats, args.http_port, args.http_host, alerts, notifier)
+    print(f"[INFO] stream: windows on http://{args.http_host}:{server.server_address[1]}/windows", file=sys.stderr)
+    try:
+        consume(lines, store, meter, stats, args.batch, args.max_wait, alerts=alerts)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if notifier is not None:
+            notifier.flush(timeout=MAX_WAIT_SECONDS + 10)
+    print(f"[INFO] stream: done {json.dumps(meter.snapshot())}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Tests for admission control: rejections keep their bookkeeping
+
+import pytest
+
+from helpers import admission
+from helpers.admission import AdmissionRejected
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(admission, 'DB_PATH', str(tmp_path / 'admission.db'))
+    monkeypatch.setattr(admission, 'GLOBAL_MAX_CONCURRENT', 1)
+    monkeypatch.setattr(admission, 'PER_USER_MAX_CONCURRENT', 1)
+    monkeypatch.setattr(admission, 'BURST', 2.0)
+    monkeypatch.setattr(admission, 'RATE_PER_MINUTE', 0.6)
+
+def tokens(user_id):
+    return admission._conn().execute('SELECT tokens FROM buckets WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+def test_queue_full_rejection_is_counted_and_refunded(store, monkeypatch):
+    monkeypatch.setattr(admission, 'QUEUE_MAX', 0)
+    held = admission.acquire('a', 'r')
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('b', 'r')
+    assert exc.value.reason == 'queue_full'
+    m = admission.metrics()
+    assert m['rejected_queue_full'] == 1 and m['queued'] == 0 and m['running'] == 1
+    assert tokens('b') == pytest.approx(2.0, abs=0.01)   # the token taken for 'b' was given back
+    admission.release(held)
+
+def test_rate_limit_and_wait_timeout_rejections_are_counted(store, monkeypatch):
+    monkeypatch.setattr(admission, 'MAX_WAIT_SECONDS', 0.2)
+    held = admission.acquire('a', 'r')
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('b', 'r')
+    assert exc.value.reason == 'wait_timeout'
+    m = admission.metrics()
+    assert m['rejected_wait_timeout'] == 1 and m['queued'] == 0
+    assert tokens('b') == pytest.approx(2.0, abs=0.01)
+
+    admission.release(held)
+    admission.release(admission.acquire('a', 'r'))
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('a', 'r')
+    assert exc.value.reason == 'rate_limited'
+    assert admission.metrics()['rejected_rate_limited'] == 1
+
+def test_freed_slot_goes_to_the_queued_request_not_a_newcomer(store, monkeypatch):
+    monkeypatch.setattr(admission, 'MAX_WAIT_SECONDS', 0.2)
+    held = admission.acquire('a', 'r')
+    admission.release(held)
+    # 'b' queued (in another worker) before the slot freed up
+    admission._conn().execute('INSERT INTO waiters (token, user_id, expires_at) VALUES (?,?,?)',
+                              ('b-token', 'b', admission.time.time() + admission.MAX_WAIT_SECONDS + 5))
+    with pytest.raises(AdmissionRejected) as exc:
+        admission.acquire('c', 'r')
+    assert exc.value.reason == 'wait_timeout'
+    assert admission.metrics()['running'] == 0   # the free slot stayed free for 'b'
+
+    admission._conn().execute('DELETE FROM waiters')
+    admission.release(admission.acquire('c', 'r'))
+
+def test_slot_lease_is_renewed_while_the_request_runs(store, monkeypatch):
+    from flask import Flask
+    monkeypatch.setattr(admission, 'SLOT_TTL_SECONDS', 0.3)
+    seen = []
+
+    @admission.admission_controlled('slow')
+    def slow():
+        admission.time.sleep(1.0)   # over three TTLs
+        seen.append(admission._conn().execute('SELECT COUNT(*) FROM slots WHERE expires_at > ?',
+                                              (admission.time.time(),)).fetchone()[0])
+        return 'ok'
+
+    with Flask(__name__).test_request_context('/'):
+        assert slow() == 'ok'
+    assert seen == [1]
+    assert admission.metrics()['running'] == 0
@@ -0,0 +1,129 @@
+# Tests for the alert engine (rolling counters, hysteresis) and webhook delivery against a local receiver
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from helpers import alerts
+from helpers.alerts import AlertEngine, RollingCounter, WebhookNotifier, normalize_rule
+from helpers.stream import WindowStore
+
+T0 = 1_760_000_400
+
+def burst(second, n, hate, channel='c1'):
+    """n messages at `second`, the first `hate` of them hate speech."""
+    return [{'channel': channel, 'ts': second, 'sentiment': 'Neutral',
+             'hate_speech': 'Hate Speech' if i < hate else 'Safe Content'} for i in range(n)]
+
+def test_far_future_timestamp_does_not_push_the_watermark_ahead():
+    events = []
+    engine = AlertEngine([{'name': 'spike', 'window': '5m', 'threshold': 10, 'min_count': 50}],
+                         notify=events.append)
+    now = int(time.time())
+    engine.observe(burst(now + 10 ** 6, 1, 0))         # a sender with a broken clock
+    assert engine.watermark <= time.time() + alerts.MAX_SKEW_SECONDS
+    engine.observe(burst(now, 100, 30))                # still inside the window: counted, fires
+    assert [e['status'] for e in events] == ['firing']
+
+def test_rolling_counter_matches_a_full_rescan():
+    rng = random.Random(7)
+    counter, store = RollingCounter(300), WindowStore({'5m': 300})
+    watermark = None
+    for _ in range(40):
+        batch = [{'channel': 'c', 'ts': T0 + rng.randint(0, 2000), 'sentiment': rng.choice(['Positive', 'Negative']),
+                  'hate_speech': rng.choice(['Hate Speech', 'Safe Content'])} for _ in range(25)]
+        batch.sort(key=lambda m: m['ts'])
+        store.add(batch)
+        for m in batch:
+            watermark = max(watermark or 0, m['ts'])
+            if m['ts'] > watermark - 300:
+                counter.add(m['ts'], 1 if m['sentiment'] == 'Positive' else 3, m['hate_speech'] == 'Hate Speech')
+        counter.expire(watermark)
+        sliding = store.snapshot()['channels']['c']['5m']['sliding']
+        assert counter.totals[0] == sliding['count'] and counter.totals[4] == sliding['hate_count']
+
+def test_hysteresis_fires_once_and_resolves_once():
+    events = []
+    engine = AlertEngine([{'name': 'spike', 'window': '5m', 'threshold': 10, 'clear': 8, 'min_count': 50}],
+                         notify=events.append)
+    engine.observe(burst(T0, 40, 20))                 # 50% but only 40 comments
+    assert events == []
+    engine.observe(burst(T0 + 10, 60, 0))             # 100 comments, 20% → fires
+    engine.observe(burst(T0 + 20, 10, 5))             # still above: no duplicate
+    assert [e['status'] for e in events] == ['firing'] and events[0]['value'] == 20.0
+    engine.observe(burst(T0 + 30, 170, 0))            # 25/280 = 8.9%: between clear and threshold
+    assert len(events) == 1 and engine.firing()[0]['rule'] == 'spike'
+    engine.observe(burst(T0 + 40, 50, 0))             # 25/330 = 7.6% → resolves
+    assert [e['status'] for e in events] == ['firing', 'resolved']
+    assert events[0]['key'] == events[1]['key'] and engine.firing() == []
+    # The spike slides out of the window on another channel's traffic alone
+    engine.observe(burst(T0 + 50, 100, 30))
+    engine.observe(burst(T0 + 400, 60, 0, channel='c2'))
+    assert [e['status'] for e in events] == ['firing', 'resolved', 'firing', 'resolved']
+
+def test_rules_are_validated():
+    assert normalize_rule({'threshold': 10})['clear'] == 8.0
+    assert normalize_rule({'metric': 'positive_pct', 'op': '<', 'threshold': 20})['clear'] == 24.0
+    with pytest.raises(ValueError, match='metric'):
+        normalize_rule({'metric': 'rage_pct', 'threshold': 1})
+    with pytest.raises(ValueError, match='clear'):
+        normalize_rule({'threshold': 10, 'clear': 12})
+
+class Receiver:
+    """Local webhook receiver answering with the queued status codes, then 200."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                receiver.requests.append((self.headers['X-Alert-Id'], body))
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/hook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def receiver(monkeypatch):
+    monkeypatch.setattr(alerts, 'BACKOFF_SECONDS', 0.01)
+    made = []
+
+    def start(statuses=()):
+        made.append(Receiver(statuses))
+        return made[-1]
+
+    yield start
+    for r in made:
+        r.close()
+
+def test_webhook_retries_with_the_same_alert_id(receiver):
+    flaky, refusing = receiver([503, 429]), receiver([400])
+    notifier = WebhookNotifier([flaky.url, refusing.url])
+    engine = AlertEngine([{'name': 'spike', 'threshold': 10, 'min_count': 10}], notify=notifier)
+    engine.observe(burst(T0, 20, 10))
+    assert notifier.flush(5)
+    assert len(flaky.requests) == 3 and len({alert_id for alert_id, _ in flaky.requests}) == 1
+    assert flaky.requests[-1][1]['status'] == 'firing' and flaky.requests[-1][1]['channel'] == 'c1'
+    # 400 is final: no retry
+    assert len(refusing.requests) == 1
+    assert notifier.stats == {'delivered': 1, 'retries': 2, 'failed': 1, 'dropped': 0}
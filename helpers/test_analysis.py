@@ -0,0 +1,53 @@
+# Tests that the NumPy columnar aggregation matches the per-comment loop exactly
+
+import random
+
+from helpers import analysis
+from helpers.analysis import (
+    _update_aggregates_dicts, comment_columns, new_aggregates, summarize_aggregates, update_aggregates,
+    update_aggregates_columns,
+)
+from helpers.bench_analysis import run, synthetic_comments
+
+def messy_comments(n, seed):
+    """Labels and dates as they really arrive: odd spellings, missing values, ties."""
+    rng = random.Random(seed)
+    return [{
+        "date": rng.choice(["2026-10-01", "2026-10-02", "2026-09-30", None, ""]),
+        "likes": rng.choice([0, 3, 9, 10, 11, 250]),
+        "sentiment": rng.choice(["Positive", "Neutral", "Negative", "Mixed", None]),
+        "hate_speech": rng.choice(["Hate Speech", "Safe Content", "Safe", None]),
+        "is_reply": rng.random() < 0.4,
+    } for _ in range(n)]
+
+def test_columns_match_the_dict_loop_on_messy_batches():
+    for seed in range(20):
+        comments = messy_comments(random.Random(seed).randint(1, 400), seed)
+        expected = _update_aggregates_dicts(new_aggregates(), comments)
+        folded = update_aggregates_columns(new_aggregates(), comment_columns(comments))
+        assert summarize_aggregates(folded) == summarize_aggregates(expected)
+        assert list(folded["days"].items()) == list(expected["days"].items())
+        assert folded["sentiment"] == expected["sentiment"] and dict(folded["by_date"]) == dict(expected["by_date"])
+
+def test_most_active_day_ties_go_to_the_first_day_seen():
+    comments = [{"date": d, "sentiment": "Positive", "hate_speech": "Safe Content", "likes": 0}
+                for d in ["2026-10-03", "2026-10-01", "2026-10-01", "2026-10-03"]]
+    assert summarize_aggregates(update_aggregates_columns(new_aggregates(), comment_columns(comments)))[
+        "kpis"]["most_active_day"] == "2026-10-03"
+
+def test_streamed_batches_of_both_paths_fold_into_the_same_summary():
+    comments = messy_comments(3000, 99)
+    expected = summarize_aggregates(_update_aggregates_dicts(new_aggregates(), comments))
+    agg, start, rng = new_aggregates(), 0, random.Random(5)
+    while start < len(comments):
+        size = rng.choice([1, 7, analysis.COLUMNAR_MIN_BATCH, 300])
+        update_aggregates(agg, comments[start:start + size])
+        start += size
+    assert summarize_aggregates(agg) == expected
+    # Reply KPIs are present and identical
+    assert expected["kpis"]["reply_comments"] > 0
+    assert summarize_aggregates(update_aggregates(new_aggregates(), [])) == summarize_aggregates(new_aggregates())
+
+def test_benchmark_paths_agree():
+    assert len(synthetic_comments(10)) == 10
+    assert [r["comments"] for r in run([100, 1000], repeat=1)] == [100, 1000]
@@ -0,0 +1,56 @@
+# Tests for chunked CSV classification: sequential and process-pool paths, and result file cleanup
+
+import csv
+import io
+import os
+import time
+
+import pytest
+
+from helpers import csv_analysis
+from model.predict import predict_batch
+
+TEXTS = ['you are great', 'i hate you idiot', '', 'what a lovely day', 'shut up you stupid fool',
+         'ok', 'this is fine I guess', 'damn this is terrible', 'thanks a lot', 'nobody asked you']
+
+@pytest.fixture(autouse=True)
+def results_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_analysis, 'RESULTS_DIR', str(tmp_path / 'csv_results'))
+    return tmp_path / 'csv_results'
+
+def upload():
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(['id', 'comment_text'])
+    writer.writerows([i, t] for i, t in enumerate(TEXTS))
+    return io.BytesIO(buf.getvalue().encode('utf-8'))
+
+def rows(summary):
+    with open(csv_analysis.result_path(summary['job_id']), encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_chunked_output_matches_predict_batch(workers):
+    texts = [t for t in TEXTS if t]
+    expected = list(zip(texts, predict_batch(texts, mode='sentiment'), predict_batch(texts, mode='hate')))
+    summary = csv_analysis.analyze_csv_stream(upload(), chunk_rows=3, workers=workers)
+    assert summary['text_column'] == 'comment_text'
+    assert summary['total_rows'] == len(TEXTS) and summary['empty_rows'] == 1
+    got = [(r['text'], r['sentiment'], r['hate_speech']) for r in rows(summary) if r['text']]
+    assert got == expected
+    assert [int(r['row']) for r in rows(summary)] == list(range(1, len(TEXTS) + 1))
+
+def test_expired_result_files_are_removed_on_the_next_upload(results_dir):
+    first = csv_analysis.analyze_csv_stream(upload(), workers=1)
+    old = csv_analysis.result_path(first['job_id'])
+    stale = time.time() - csv_analysis.RESULT_TTL_SECONDS - 60
+    for path in (old, csv_analysis._owner_path(first['job_id'])):
+        os.utime(path, (stale, stale))
+    second = csv_analysis.analyze_csv_stream(upload(), workers=1)
+    assert not os.path.exists(old)
+    assert sorted(os.listdir(results_dir)) == [f"{second['job_id']}.csv", f"{second['job_id']}.owner.json"]
+
+def test_uploader_is_recorded_with_the_job():
+    summary = csv_analysis.analyze_csv_stream(upload(), workers=1, user_id='u1')
+    assert csv_analysis.result_owner(summary['job_id']) == 'u1'
+    assert csv_analysis.result_owner('0' * 32) is None and csv_analysis.result_owner('../x') is None
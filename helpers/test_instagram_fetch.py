@@ -0,0 +1,128 @@
+# Tests for the Instagram fetcher against a local stand-in for the Apify API:
+# the dataset grows while the run is going, as the real scraper's does
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from helpers import api_cache, instagram_fetch
+from helpers.instagram_fetch import InstagramFetchError, iter_post_comment_pages, new_fetch_stats
+
+POST_A = 'https://www.instagram.com/p/AAA/'
+POST_B = 'https://www.instagram.com/p/BBB/'
+
+class StubApify:
+    """A run of `total` items over the input's directUrls; each status poll adds `step` more."""
+
+    def __init__(self, total, step=100, final='SUCCEEDED'):
+        self.total, self.step, self.final = total, step, final
+        self.runs, self.aborted, self.calls = [], [], []
+        self.produced = 0
+        self.status = None
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, code=200):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with stub.lock:
+                    stub.calls.append(('POST', url.path))
+                    if url.path.endswith('/abort'):
+                        stub.aborted.append(url.path.split('/')[-2])
+                        stub.status = 'ABORTED'
+                        return self._send({'data': stub.run()})
+                    stub.runs.append(json.loads(body))
+                    stub.status, stub.produced = 'RUNNING', 0
+                    return self._send({'data': stub.run()}, 201)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub.lock:
+                    stub.calls.append(('GET', url.path))
+                    if url.path.startswith('/v2/actor-runs/'):
+                        if stub.status == 'RUNNING':
+                            stub.produced = min(stub.total, stub.produced + stub.step)
+                            if stub.produced == stub.total:
+                                stub.status = stub.final
+                        return self._send({'data': stub.run()})
+                    offset, limit = int(qs['offset']), int(qs['limit'])
+                    urls = stub.runs[-1]['directUrls']
+                    items = [{'id': str(i), 'postUrl': urls[i % len(urls)], 'text': f'comment {i}',
+                              'ownerUsername': f'user{i}', 'timestamp': '2026-10-01T10:00:00.000Z',
+                              'likesCount': i % 3}
+                             for i in range(offset, min(offset + limit, stub.produced))]
+                    return self._send(items)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def run(self):
+        return {'id': f'run{len(self.runs)}', 'status': self.status, 'defaultDatasetId': f'ds{len(self.runs)}'}
+
+@pytest.fixture
+def apify(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_cache, 'DB_PATH', str(tmp_path / 'api_cache.db'))
+    monkeypatch.setenv('APIFY_TOKEN', 'test-token')
+    monkeypatch.setattr(instagram_fetch, 'POLL_SECONDS', 0)
+    stubs = []
+
+    def start(total, **kwargs):
+        stub = StubApify(total, **kwargs)
+        stubs.append(stub)
+        monkeypatch.setattr(instagram_fetch, 'APIFY_API_URL', f'http://127.0.0.1:{stub.server.server_address[1]}')
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.server.shutdown()
+        stub.server.server_close()
+
+def test_pages_are_read_while_the_run_is_going(apify):
+    stub = apify(250)
+    pages = iter_post_comment_pages([POST_A + '?igsh=x'], limit=250)
+    first = next(pages)
+    assert stub.status == 'RUNNING' and len(first) == 100
+    assert first[0]['username'] == 'user0' and first[0]['post_url'] == POST_A
+    rest = [c for page in pages for c in page]
+    assert [c['id'] for c in first + rest] == [str(i) for i in range(250)]
+    assert stub.runs == [{'directUrls': [POST_A], 'resultsLimit': 250}]
+
+def test_cached_posts_skip_the_actor(apify):
+    stub = apify(40)
+    first = [c for page in iter_post_comment_pages([POST_A, POST_B], limit=20) for c in page]
+    stats = new_fetch_stats()
+    again = [c for page in iter_post_comment_pages([POST_B, POST_A], limit=10, stats=stats) for c in page]
+    assert len(stub.runs) == 1 and stats['cache_hits'] == 2 and stats['api_calls'] == 0
+    assert {c['id'] for c in again} <= {c['id'] for c in first}
+    assert all(c['post_url'] == POST_B for c in again[:10])
+    # Asking for more than was fetched runs the scraper again
+    list(iter_post_comment_pages([POST_A], limit=50))
+    assert len(stub.runs) == 2
+
+def test_stopping_early_aborts_the_run(apify):
+    stub = apify(1000)
+    pages = iter_post_comment_pages([POST_A], limit=500)
+    next(pages)
+    pages.close()
+    assert stub.aborted == ['run1']
+
+def test_failed_run_without_comments_raises(apify):
+    apify(0, final='FAILED')
+    with pytest.raises(InstagramFetchError, match='FAILED'):
+        list(iter_post_comment_pages([POST_A]))
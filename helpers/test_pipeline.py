@@ -0,0 +1,53 @@
+# Tests for the bounded-queue pipeline runner
+
+import time
+import threading
+
+import pytest
+
+from helpers.pipeline import run_pipeline
+
+def test_pipeline_preserves_order_and_applies_stages():
+    out = list(run_pipeline(iter(range(50)), lambda x: x * 2, lambda x: x + 1, maxsize=3))
+    assert out == [x * 2 + 1 for x in range(50)]
+
+def test_producer_is_bounded_by_queue_size():
+    produced = []
+
+    def source():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    stream = run_pipeline(source(), lambda x: x, maxsize=2)
+    assert next(stream) == 0
+    time.sleep(0.3)
+    # two queues of 2, one item in each thread's hands, one consumed
+    assert len(produced) <= 2 + 2 + 2 + 1
+    stream.close()
+
+def test_stage_errors_reach_the_consumer():
+    def boom(x):
+        if x == 3:
+            raise ValueError('bad batch')
+        return x
+
+    with pytest.raises(ValueError, match='bad batch'):
+        list(run_pipeline(iter(range(10)), boom))
+
+def test_closing_early_stops_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    stream = run_pipeline(source(), lambda x: x, maxsize=1)
+    assert [next(stream) for _ in range(3)] == [0, 1, 2]
+    stream.close()
+    assert closed.wait(2)
@@ -0,0 +1,47 @@
+# Tests for CommentBatch: round trips, aggregation from its columns, spilling to a memory-mapped file
+
+from helpers.analysis import _update_aggregates_dicts, new_aggregates, summarize_aggregates, update_aggregates_columns
+from helpers.bench_records import run, synthetic_pages
+from helpers.records import CommentBatch
+
+def comments(n):
+    return [c for page in synthetic_pages(n) for c in page]
+
+def test_round_trip_keeps_every_field():
+    rows = comments(250) + [{'id': None, 'text': 'héllo ✓', 'username': None, 'date': None, 'likes': None,
+                             'sentiment': None, 'hate_speech': 'Safe', 'is_reply': False}]
+    batch = CommentBatch().extend(iter(rows))
+    assert len(batch) == len(rows) and not batch.spilled
+    for original, back in zip(rows, batch):
+        expected = dict(original, likes=original['likes'] or 0,
+                        sentiment_proba=original.get('sentiment_proba'), hate_proba=original.get('hate_proba'))
+        got = back.to_dict()
+        for key in ('sentiment_proba', 'hate_proba'):
+            if expected[key] is not None:
+                assert abs(got.pop(key) - expected.pop(key)) < 1e-6
+        assert got == expected
+    assert batch[-1]['text'] == 'héllo ✓' and batch[3].username == rows[3]['username']
+    # Labels are stored once however many rows use them
+    assert len(batch.hate.values) == 3 and batch.nbytes() < 250 * 200
+
+def test_columns_aggregate_like_the_dicts():
+    rows = comments(3000)
+    batch = CommentBatch()
+    for start in range(0, len(rows), 128):
+        batch.extend(rows[start:start + 128])
+    expected = summarize_aggregates(_update_aggregates_dicts(new_aggregates(), rows))
+    assert summarize_aggregates(update_aggregates_columns(new_aggregates(), batch.columns())) == expected
+
+def test_text_spills_to_a_memory_mapped_file():
+    rows = comments(2000)
+    batch = CommentBatch(spill_bytes=10_000).extend(rows[:1000])
+    assert batch.spilled and len(batch.texts.buf) == 0
+    assert [c.text for c in batch] == [r['text'] for r in rows[:1000]]
+    batch.extend(rows[1000:])                     # appends after a read re-map the grown file
+    assert batch[1999].text == rows[1999]['text'] and batch[1999].id == rows[1999]['id']
+    assert [c.text for c in batch][990:1010] == [r['text'] for r in rows[990:1010]]
+    batch.close()
+
+def test_rss_benchmark_runs():
+    rows = {r['mode']: r for r in run(20_000, 1)}
+    assert rows['spill']['spilled'] and rows['dicts']['hate_speech_pct'] == rows['batch']['hate_speech_pct']
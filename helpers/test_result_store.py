@@ -0,0 +1,66 @@
+# Tests for stored results: saving and keyset-paged reads
+
+import sqlite3
+
+import pytest
+
+from helpers import result_store
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(result_store, 'DB_PATH', str(tmp_path / 'results.db'))
+
+def comments(n):
+    return [{'text': f'c{i}', 'username': 'u', 'date': f'2026-01-{1 + i % 28:02d}', 'likes': i,
+             'sentiment': 'Negative' if i % 3 == 0 else 'Positive',
+             'hate_speech': 'Safe Content'} for i in range(n)]
+
+def test_pages_follow_cursors_both_ways(store):
+    rid = result_store.save_result(comments(100), user_id='u1', source='youtube')
+    first = result_store.query_result_comments(rid, sentiment='Negative', per_page=10)
+    assert first['total'] == 34 and first['prev'] is None
+    assert [c['text'] for c in first['items']] == [f'c{i}' for i in range(0, 30, 3)]
+
+    seen, page = list(first['items']), first
+    while page['next'] is not None:
+        page = result_store.query_result_comments(rid, sentiment='Negative', after=page['next'], per_page=10)
+        assert page['total'] is None
+        seen += page['items']
+    assert [c['text'] for c in seen] == [f'c{i}' for i in range(0, 100, 3)] and len(page['items']) == 4
+
+    back = result_store.query_result_comments(rid, sentiment='Negative', before=page['prev'], per_page=10)
+    assert [c['text'] for c in back['items']] == [f'c{i}' for i in range(60, 90, 3)]
+    assert back['next'] is not None and back['prev'] is not None
+    back = result_store.query_result_comments(rid, sentiment='Negative', before=30, per_page=10)
+    assert back['items'] == first['items'] and back['prev'] is None
+
+def test_save_commits_per_batch_and_header_last(store, monkeypatch):
+    monkeypatch.setattr(result_store, 'SAVE_BATCH', 10)
+    seen = []
+
+    def stream():
+        for i, c in enumerate(comments(25)):
+            if i in (10, 20):
+                # Another connection sees each committed batch but not the result yet
+                other = sqlite3.connect(result_store.DB_PATH)
+                seen.append((result_store._conn().in_transaction,
+                             other.execute('SELECT COUNT(*) FROM result_comments').fetchone()[0],
+                             other.execute('SELECT COUNT(*) FROM results').fetchone()[0]))
+                other.close()
+            yield c
+
+    rid = result_store.save_result(stream(), user_id='u1', meta=lambda: {'n': 25})
+    assert seen == [(False, 10, 0), (False, 20, 0)]
+    assert result_store.get_result(rid)['total_comments'] == 25 and result_store.get_result(rid)['meta'] == {'n': 25}
+    assert len(list(result_store.iter_result_comments(rid))) == 25
+
+def test_failed_stream_leaves_nothing_behind(store):
+    def stream():
+        yield from comments(7)
+        raise RuntimeError('upstream failed')
+
+    with pytest.raises(RuntimeError):
+        result_store.save_result(stream(), user_id='u1')
+    conn = result_store._conn()
+    assert conn.execute('SELECT COUNT(*) FROM result_comments').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] == 0
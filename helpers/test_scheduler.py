@@ -0,0 +1,116 @@
+# Tests for watched targets: leasing in watch_store and background refreshes against a local YouTube stand-in
+
+import time
+
+import pytest
+
+from helpers import (api_cache, comment_store, history_store, scheduler, sources, watch_store, youtube_fetch,
+                     youtube_quota)
+from helpers.scheduler import Scheduler, next_run_at
+from helpers.test_youtube_fetch import StubYouTube
+
+@pytest.fixture
+def stores(monkeypatch, tmp_path):
+    for module, name in ((watch_store, 'watch.db'), (history_store, 'history.db'), (comment_store, 'comments.db'),
+                         (api_cache, 'api_cache.db'), (youtube_quota, 'youtube_quota.db')):
+        monkeypatch.setattr(module, 'DB_PATH', str(tmp_path / name))
+    monkeypatch.setattr(youtube_fetch, 'CACHE_TTL', 0)
+    monkeypatch.setattr(youtube_fetch, 'SEARCH_CACHE_TTL', 0)
+    monkeypatch.setenv('YOUTUBE_API_KEY', 'test-key')
+    calls = []
+
+    def predict_batch(texts, mode, return_proba=False):
+        calls.append(len(texts))
+        return ['Hate Speech' if mode == 'hate' else 'Negative'] * len(texts), [0.9] * len(texts)
+
+    monkeypatch.setattr(sources, 'predict_batch', predict_batch)
+    return calls
+
+@pytest.fixture
+def youtube(stores, monkeypatch):
+    made = []
+
+    def start(videos, fail=()):
+        stub = StubYouTube(videos, fail)
+        stub.thread.start()
+        monkeypatch.setattr(youtube_fetch, 'YOUTUBE_API_BASE', stub.base)
+        made.append(stub)
+        return stub
+
+    yield start
+    for stub in made:
+        stub.server.shutdown()
+        stub.server.server_close()
+
+def run_tick(s):
+    for future in s.tick():
+        future.result(timeout=30)
+
+def test_due_watches_are_leased_once_and_capped(stores):
+    ids = [watch_store.add_watch('u1', 'video', f'vid{i:02d}') for i in range(3)]
+    assert [w['id'] for w in watch_store.claim_due(5, 60, max_running=2)] == ids[:2]
+    assert watch_store.claim_due(5, 60, max_running=2) == []
+    watch_store.save_snapshot(ids[0], {'total_comments': 0}, {}, time.time() + 900)
+    assert [w['id'] for w in watch_store.claim_due(5, 60, max_running=2)] == [ids[2]]
+    # Expired leases are handed out again
+    assert [w['id'] for w in watch_store.claim_due(5, 60, now=time.time() + 61)] == [ids[1], ids[2]]
+    # Re-adding updates the settings of the same watch
+    assert watch_store.add_watch('u1', 'video', 'vid00', past_days=3) == ids[0]
+    assert watch_store.get_watch(ids[0])['past_days'] == 3 and watch_store.get_watch(ids[0])['summary'] is not None
+
+def test_next_run_is_jittered_and_backs_off():
+    now = 1_000_000
+    runs = [next_run_at(900, now=now) - now for _ in range(200)]
+    assert all(810 <= r <= 990 for r in runs) and len(set(runs)) > 1
+    assert 1620 <= next_run_at(900, failures=1, now=now) - now <= 1980
+    assert next_run_at(900, failures=30, now=now) - now <= scheduler.MAX_BACKOFF_SECONDS * 1.1
+
+def test_refresh_stores_summary_and_reuses_labels(youtube, stores):
+    stub = youtube({'vid00': 130})
+    watch_id = watch_store.add_watch('u1', 'video', 'vid00')
+    s = Scheduler(workers=2)
+    try:
+        run_tick(s)
+        watch = watch_store.list_watches('u1')[0]
+        assert watch['last_status'] == 'ok' and watch['next_run_at'] > time.time() + 600
+        assert watch['summary']['total_comments'] == 130 and watch['summary']['kpis']['hate_speech_pct'] == 100.0
+        assert watch['summary']['timeline_line']['labels'] and sum(stores) == 2 * 130
+        assert s.tick() == []                       # not due again yet
+        assert history_store.hate_trend('u1', 'youtube', 'vid00') == []   # scheduled: snapshot only
+
+        stub.videos['vid00'] = 140
+        watch_store.request_refresh('u1', watch_id)
+        run_tick(s)
+        watch = watch_store.get_watch(watch_id)
+        assert watch['summary']['total_comments'] == 140
+        assert watch['fetch_stats']['comments_classified'] == 10 and sum(stores) == 2 * 140
+        assert len(history_store.hate_trend('u1', 'youtube', 'vid00')) == 1   # asked for: recorded once
+        assert history_store.hate_trend('u2', 'youtube', 'vid00') == []     # only the owner's history
+        assert watch_store.get_watch(watch_id)['record_history'] == 0
+        assert youtube_quota.usage()['by_priority']['background']['units'] >= 2
+    finally:
+        s.stop()
+
+def test_refresh_defers_without_background_quota_and_backs_off_on_errors(youtube, monkeypatch):
+    stub = youtube({'vid00': 10, 'vid01': 10}, fail=['vid01'])
+    watch_store.add_watch('u1', 'video', 'vid00')
+    failing = watch_store.add_watch('u1', 'video', 'vid01')
+    monkeypatch.setattr(youtube_quota, 'DAILY_QUOTA', 2 * scheduler.QUOTA_RESERVE - 2)
+    s = Scheduler(workers=2)
+    try:
+        run_tick(s)
+        assert stub.comment_calls() == []
+        watches = watch_store.list_watches('u1')
+        assert {w['last_status'] for w in watches} == {'deferred'} and all(w['summary'] is None for w in watches)
+        assert all(w['next_run_at'] >= time.time() + youtube_quota.usage()['seconds_to_reset'] for w in watches)
+
+        monkeypatch.setattr(youtube_quota, 'DAILY_QUOTA', 10000)
+        for w in watches:
+            watch_store.request_refresh('u1', w['id'])
+        run_tick(s)
+        bad = watch_store.get_watch(failing)
+        assert bad['last_status'] == 'error' and bad['failures'] == 1 and bad['summary'] is None
+        assert bad['next_run_at'] - bad['last_run_at'] >= 2 * 900 * (1 - scheduler.JITTER) - 1
+        assert s.stats == {'ticks': 2, 'ok': 1, 'deferred': 2, 'error': 1}
+    finally:
+        s.stop()
@@ -0,0 +1,72 @@
+# Tests for the Source interface and the shared dedupe → classify → aggregate pipeline
+
+import pytest
+
+from helpers import sources
+from helpers.analysis import new_aggregates
+from helpers.sources import Source, SourceError, analyze_source
+
+class ListSource(Source):
+    """Pages given up front; remembers what the pipeline asked it to store."""
+    platform = 'test'
+    errors = (KeyError,)
+
+    def __init__(self, pages):
+        super().__init__('list')
+        self.raw_pages = pages
+        self.saved = []
+
+    def fetch_pages(self):
+        for page in self.raw_pages:
+            if page == 'fail':
+                raise KeyError('upstream down')
+            yield page
+
+    def normalize(self, item):
+        return self.record(item.get('id'), item.get('text'), item.get('user'), '2026-10-01',
+                           sentiment=item.get('sentiment'), hate_speech=item.get('hate_speech'))
+
+    def save_labels(self, records):
+        self.saved.extend(r['id'] for r in records)
+
+@pytest.fixture
+def model(monkeypatch):
+    calls = []
+
+    def predict_batch(texts, mode, return_proba=False):
+        calls.append((mode, len(texts)))
+        label = 'Negative' if mode == 'sentiment' else 'Hate Speech'
+        return [label] * len(texts), [0.9] * len(texts)
+
+    monkeypatch.setattr(sources, 'predict_batch', predict_batch)
+    return calls
+
+def test_pipeline_dedupes_classifies_and_aggregates(model, monkeypatch):
+    monkeypatch.setattr(sources, 'CLASSIFY_BATCH', 2)
+    source = ListSource([
+        [{'id': 1, 'text': ' a '}, {'id': 2, 'text': 'b'}, {'id': 3, 'text': ''}],
+        [{'id': 2, 'text': 'b'}, {'id': 4, 'text': 'c', 'sentiment': 'Positive', 'hate_speech': 'Safe'},
+         {'id': 5, 'text': 'd'}, {'id': 6, 'text': 'e'}, {'id': 7, 'text': 'f'}],
+    ])
+    aggregates = new_aggregates()
+    analyzed = list(analyze_source(source, aggregates))
+
+    assert [a['id'] for a in analyzed] == ['1', '2', '4', '5', '6', '7']
+    assert analyzed[0]['text'] == 'a'
+    assert source.stats['duplicates'] == 1
+    # Record 4 was labelled before; the rest went through the model in slices of 2
+    assert source.stats['comments_classified'] == 5
+    assert source.saved == ['1', '2', '5', '6', '7']
+    assert [n for mode, n in model if mode == 'hate'] == [2, 2, 1]
+    assert aggregates['total'] == 6 and aggregates['sentiment']['Positive'] == 1
+    assert aggregates['hate']['Hate Speech'] == 5
+
+def test_fetch_errors_surface_as_source_error(model):
+    source = ListSource([[{'id': 1, 'text': 'a'}], 'fail'])
+    stream = analyze_source(source)
+    with pytest.raises(SourceError, match='upstream down'):
+        list(stream)
+
+def test_sources_are_registered_by_platform():
+    assert {'youtube', 'twitter', 'instagram'} <= set(sources.SOURCES)
+    assert sources.SOURCES['instagram'] is sources.InstagramSource
@@ -0,0 +1,101 @@
+# Tests for stream mode: inputs, micro-batching, windows and the HTTP endpoint
+
+import json
+import time
+import threading
+import urllib.request
+
+from helpers import sources
+from helpers.alerts import MAX_SKEW_SECONDS
+from helpers.stream import Throughput, WindowStore, consume, micro_batches, serve, tail_lines
+
+T0 = 1_760_000_400  # a multiple of 3600: tumbling windows start here
+
+def msg(ts, channel='a', sentiment='Neutral', hate='Safe Content'):
+    return {'ts': ts, 'channel': channel, 'sentiment': sentiment, 'hate_speech': hate}
+
+def test_sliding_and_tumbling_windows():
+    store = WindowStore({'1m': 60, '5m': 300})
+    store.add([msg(T0 + 10), msg(T0 + 50, hate='Hate Speech'), msg(T0 + 70, sentiment='Positive'),
+               msg(T0 + 100, channel='b')])
+    snap = store.snapshot()
+    assert snap['watermark'] == T0 + 100
+    one = snap['channels']['a']['1m']
+    # Sliding: (T0+40, T0+100]; tumbling: [T0+60, T0+120); previous: [T0, T0+60)
+    assert one['sliding']['count'] == 2 and one['sliding']['hate_pct'] == 50.0
+    assert one['tumbling']['count'] == 1 and one['tumbling']['positive_pct'] == 100.0
+    assert one['previous']['count'] == 2 and one['previous']['hate_count'] == 1
+    assert snap['channels']['a']['5m']['tumbling']['count'] == 3
+    assert list(store.snapshot('b')['channels']) == ['b']
+    # Older than two of the longest window behind the watermark: dropped
+    store.add([msg(T0 + 100 + 600), msg(T0 + 10)])
+    assert store.late == 1
+
+def test_far_future_timestamps_are_clamped_to_the_clock():
+    store = WindowStore({'1m': 60})
+    now = int(time.time())
+    store.add([msg(now - 30)])
+    store.add([msg(now + 10 ** 6, hate='Hate Speech')])   # a sender with a broken clock
+    assert store.future == 1 and store.watermark <= time.time() + MAX_SKEW_SECONDS
+    store.add([msg(now - 20), msg(now - 10)])
+    snap = store.snapshot()
+    assert store.late == 0 and snap['channels']['a']['1m']['sliding']['count'] == 4
+
+def test_micro_batches_flush_on_size_and_after_max_wait():
+    assert [len(b) for b in micro_batches(iter(range(10)), size=4, max_wait=5)] == [4, 4, 2]
+
+    def trickle():
+        yield 1
+        time.sleep(0.5)
+        yield 2
+
+    started = time.monotonic()
+    batches = micro_batches(trickle(), size=4, max_wait=0.05)
+    assert next(batches) == [1]
+    assert time.monotonic() - started < 0.4
+    assert list(batches) == [[2]]
+
+def test_tail_holds_partial_lines_and_follows_truncation(tmp_path):
+    path = tmp_path / 'in.ndjson'
+    path.write_text('{"text": "a"}\n{"text": "b', encoding='utf-8')
+    lines = tail_lines(str(path), follow=True, poll=0.01)
+    assert next(lines) == '{"text": "a"}\n'
+    got = []
+    reader = threading.Thread(target=lambda: got.extend([next(lines), next(lines)]))
+    reader.start()
+    time.sleep(0.1)
+    assert got == []
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('"}\n')
+    time.sleep(0.1)
+    path.write_text('{"text": "c"}\n', encoding='utf-8')
+    reader.join(2)
+    assert got == ['{"text": "b"}\n', '{"text": "c"}\n']
+    lines.close()
+
+def test_consume_serves_windows_and_throughput(monkeypatch):
+    def predict_batch(texts, mode, return_proba=False):
+        if mode == 'hate':
+            labels = ['Hate Speech' if 'bad' in t else 'Safe' for t in texts]
+        else:
+            labels = ['Negative' if 'bad' in t else 'Positive' for t in texts]
+        return labels, [0.9] * len(texts)
+
+    monkeypatch.setattr(sources, 'predict_batch', predict_batch)
+    lines = [json.dumps({'text': 'bad' if i % 4 == 0 else 'good', 'channel': f'c{i % 2}', 'ts': T0 + i})
+             for i in range(200)] + ['not json', '{"text": ""}']
+    store, meter, stats = WindowStore(), Throughput(), {}
+    consume(iter(lines), store, meter, stats, size=32, max_wait=0.05, report_every=0)
+    server = serve(store, meter, stats, 0)
+    try:
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        windows = json.load(urllib.request.urlopen(f'{base}/windows?channel=c0'))
+        metrics = json.load(urllib.request.urlopen(f'{base}/metrics'))
+    finally:
+        server.shutdown()
+        server.server_close()
+    minute = windows['channels']['c0']['1m']['sliding']
+    # c0 gets the even messages; every other one of them is "bad"
+    assert minute['count'] == 30 and minute['hate_pct'] == 50.0 and minute['negative_pct'] == 50.0
+    assert windows['channels']['c0']['1h']['tumbling']['count'] == 100
+    assert metrics['messages'] == 200 and metrics['invalid'] == 2 and metrics['msgs_per_s'] > 0
@@ -0,0 +1,73 @@
+# Tests for the SQLite tweet cache that replaced cache/twitter_*.json
+
+import json
+import threading
+
+import pytest
+
+from helpers import tweet_store
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(tweet_store, 'DB_PATH', str(tmp_path / 'tweets.db'))
+
+def tweets(ids, text='t'):
+    return [{'id': str(i), 'text': f'{text} {i}', 'created_at': None} for i in ids]
+
+def test_queries_share_tweets_and_keep_their_order():
+    tweet_store.save_query('a', tweets([3, 2, 1]))
+    tweet_store.save_query('b', tweets([2, 9]))
+    assert [t['id'] for t in tweet_store.load_query('a')['tweets']] == ['3', '2', '1']
+    assert [t['id'] for t in tweet_store.load_query('b')['tweets']] == ['2', '9']
+    assert tweet_store.load_query('b')['newest_id'] == '9'
+    assert tweet_store.stats()['tweets'] == 4
+
+def test_max_age_and_ttl(monkeypatch):
+    tweet_store.save_query('old', tweets([1]), fetched_at=1000.0)
+    assert tweet_store.load_query('old') is None
+    tweet_store.save_query('new', tweets([2]))
+    assert tweet_store.load_query('new', max_age=60) is not None
+    # saving 'new' evicted the expired query and its tweets
+    assert tweet_store.stats()['queries'] == 1 and tweet_store.stats()['tweets'] == 1
+
+def test_size_cap_evicts_least_recently_read(monkeypatch):
+    tweet_store.save_query('a', tweets(range(0, 50), 'x' * 100))
+    monkeypatch.setattr(tweet_store, 'MAX_BYTES', int(tweet_store.stats()['bytes'] * 2.5))
+    tweet_store.save_query('b', tweets(range(100, 150), 'x' * 100))
+    monkeypatch.setattr(tweet_store, '_TOUCH_SECONDS', 0)
+    tweet_store.load_query('a')
+    tweet_store.save_query('c', tweets(range(200, 250), 'x' * 100))
+    assert tweet_store.load_query('b') is None
+    assert tweet_store.load_query('a') and tweet_store.load_query('c')
+
+def test_reads_touch_last_access_at_most_once_per_interval(monkeypatch):
+    tweet_store.save_query('a', tweets([1]))
+    conn = tweet_store._conn()
+    stamp = lambda: conn.execute("SELECT last_access FROM queries WHERE query = 'a'").fetchone()[0]
+    saved = stamp()
+    assert tweet_store.load_query('a') and stamp() == saved
+    monkeypatch.setattr(tweet_store, '_TOUCH_SECONDS', 0)
+    assert tweet_store.load_query('a') and stamp() > saved
+
+def test_concurrent_writers_never_mix_results():
+    def writer(k):
+        for _ in range(20):
+            tweet_store.save_query('q', tweets(range(k * 100, k * 100 + 30)))
+
+    threads = [threading.Thread(target=writer, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ids = [int(t['id']) for t in tweet_store.load_query('q')['tweets']]
+    assert len(ids) == 30 and len({i // 100 for i in ids}) == 1
+
+def test_legacy_json_import_runs_once(tmp_path):
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    payload = {'query': '@x', 'fetched_at': '2099-01-01T00:00:00', 'tweets': tweets([5, 4])}
+    (cache / 'twitter_abc.json').write_text(json.dumps(payload), encoding='utf-8')
+    (cache / 'twitter_bad.json').write_text('{torn', encoding='utf-8')
+    assert tweet_store.import_json_cache(str(cache)) == 2
+    assert tweet_store.import_json_cache(str(cache)) == 0
+    assert [t['id'] for t in tweet_store.load_query('@x')['tweets']] == ['5', '4']
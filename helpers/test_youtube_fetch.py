@@ -0,0 +1,384 @@
+# Tests for concurrent channel fetching against a local stand-in for the YouTube Data API
+
+import json
+import sqlite3
+import time
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from helpers import youtube_fetch, comment_store, api_cache, youtube_quota
+
+PAGE_SIZE = 100
+LATENCY = 0.05
+
+class StubYouTube:
+    """Serves /search, /playlistItems, /commentThreads and /comments from in-memory data, recording every call."""
+
+    def __init__(self, videos, fail=(), hours_apart=0):
+        self.videos = videos          # {video_id: number of comments}
+        self.fail = set(fail)
+        self.fail_reason = 'commentsDisabled'
+        self.replies = {}             # {thread id: number of replies}
+        self.hours_apart = hours_apart  # age step between consecutive comments, newest first
+        # Comment k (0 = oldest) keeps its id and timestamp when newer ones arrive
+        self.initial = dict(videos)
+        self.anchor = datetime.utcnow() - timedelta(minutes=1)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub.lock:
+                    stub.calls.append((url.path, q.get('videoId') or q.get('parentId'), q.get('pageToken')))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(LATENCY)
+                    status, body = stub.respond(url.path, q)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def respond(self, path, q):
+        if path.endswith('/search'):
+            return 200, {'items': [{'id': {'videoId': v}} for v in self.videos]}
+        if path.endswith('/playlistItems'):
+            # Uploads one day apart, newest first
+            return 200, {'items': [{'contentDetails': {
+                'videoId': v,
+                'videoPublishedAt': (self.anchor - timedelta(days=i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }} for i, v in enumerate(self.videos)]}
+        if path.endswith('/comments'):
+            return 200, self.reply_page(q['parentId'], int(q.get('pageToken') or 0))
+        vid = q['videoId']
+        if vid in self.fail:
+            return 403, {'error': {'errors': [{'reason': self.fail_reason}]}}
+        start = int(q.get('pageToken') or 0)
+        end = min(start + PAGE_SIZE, self.videos[vid])
+        total = self.videos[vid]
+        items = [{'id': f'{vid}-c{total - 1 - i}', 'snippet': {'topLevelComment': {'snippet': {
+            'textDisplay': f'{vid}-{i}', 'authorDisplayName': 'u',
+            'publishedAt': self.published_at(vid, total - 1 - i), 'likeCount': i,
+        }}}} for i in range(start, end)]
+        if 'replies' in q.get('part', ''):
+            for item in items:
+                n = self.replies.get(item['id'], 0)
+                item['snippet']['totalReplyCount'] = n
+                if n:
+                    item['replies'] = {'comments': self.reply_page(item['id'], 0, size=5)['items']}
+        body = {'items': items}
+        if end < self.videos[vid]:
+            body['nextPageToken'] = str(end)
+        return 200, body
+
+    def reply_page(self, thread_id, start, size=PAGE_SIZE):
+        total = self.replies.get(thread_id, 0)
+        end = min(start + size, total)
+        body = {'items': [{'id': f'{thread_id}-r{j}', 'snippet': {
+            'textDisplay': f'{thread_id}-r{j}', 'authorDisplayName': 'u',
+            'publishedAt': self.anchor.strftime('%Y-%m-%dT%H:%M:%SZ'), 'likeCount': 0,
+        }} for j in range(start, end)]}
+        if end < total and size == PAGE_SIZE:
+            body['nextPageToken'] = str(end)
+        return body
+
+    def published_at(self, vid, k):
+        offset = timedelta(hours=self.hours_apart * (k - (self.initial[vid] - 1)))
+        return (self.anchor + offset).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def comment_calls(self, vid=None):
+        return [c for c in self.calls if c[0].endswith('/commentThreads') and (vid is None or c[1] == vid)]
+
+@pytest.fixture
+def stub_api(monkeypatch, tmp_path):
+    servers = []
+
+    def start(videos, fail=(), hours_apart=0):
+        stub = StubYouTube(videos, fail, hours_apart)
+        stub.thread.start()
+        servers.append(stub)
+        monkeypatch.setattr(youtube_fetch, 'YOUTUBE_API_BASE', stub.base)
+        return stub
+
+    monkeypatch.setenv('YOUTUBE_API_KEY', 'test-key')
+    monkeypatch.setattr(comment_store, 'DB_PATH', str(tmp_path / 'comments.db'))
+    # Response caching is off unless a test turns it on
+    monkeypatch.setattr(api_cache, 'DB_PATH', str(tmp_path / 'api_cache.db'))
+    monkeypatch.setattr(youtube_fetch, 'CACHE_TTL', 0)
+    monkeypatch.setattr(youtube_fetch, 'SEARCH_CACHE_TTL', 0)
+    monkeypatch.setattr(youtube_quota, 'DB_PATH', str(tmp_path / 'youtube_quota.db'))
+    yield start
+    for stub in servers:
+        stub.server.shutdown()
+        stub.server.server_close()
+
+def test_channel_order_matches_sequential(stub_api):
+    videos = {f'vid{i:02d}': n for i, n in enumerate([250, 30, 0, 120, 75])}
+    stub_api(videos)
+    comments = youtube_fetch.get_comments_by_channel('UCx', max_items=10000)
+    expected = [f'{vid}-{i}' for vid, n in videos.items() for i in range(n)]
+    assert [c['text'] for c in comments] == expected
+
+def test_channel_fetch_is_concurrent_and_bounded(stub_api, monkeypatch):
+    monkeypatch.setattr(youtube_fetch, 'FETCH_WORKERS', 8)
+    monkeypatch.setattr(youtube_fetch, 'MAX_CONNECTIONS_PER_HOST', 3)
+    monkeypatch.setattr(youtube_fetch, '_session', None)
+    stub = stub_api({f'vid{i:02d}': 150 for i in range(12)})
+    comments = youtube_fetch.get_comments_by_channel('UCx', max_items=10000)
+    assert len(comments) == 12 * 150
+    assert 1 < stub.max_in_flight <= 3
+
+def test_channel_stops_once_max_items_reached(stub_api):
+    stub = stub_api({f'vid{i:02d}': 300 for i in range(20)})
+    comments = youtube_fetch.get_comments_by_channel('UCx', max_items=450)
+    assert [c['text'] for c in comments] == (
+        [f'vid00-{i}' for i in range(300)] + [f'vid01-{i}' for i in range(150)]
+    )
+    # Only the videos in flight when the budget filled were touched, and none paged to the end
+    assert len(stub.comment_calls()) < 20
+    assert len(stub.comment_calls('vid19')) == 0
+
+def test_channel_error_after_budget_is_ignored(stub_api):
+    stub_api({'vid00': 200, 'vid01': 50, 'vid02': 100}, fail={'vid02'})
+    comments = youtube_fetch.get_comments_by_channel('UCx', max_items=200)
+    assert len(comments) == 200 and comments[-1]['text'] == 'vid00-199'
+
+def test_clients_are_reused_per_process(monkeypatch):
+    monkeypatch.setenv('YOUTUBE_API_KEY', 'test-key')
+    assert youtube_fetch._http() is youtube_fetch._http()
+    service, _ = youtube_fetch._get_service()
+    assert service is not None and youtube_fetch._get_service()[0] is service
+    # A forked worker must not inherit the parent's sockets
+    monkeypatch.setattr(youtube_fetch, '_session_pid', -1)
+    monkeypatch.setattr(youtube_fetch._local, 'pid', -1)
+    assert youtube_fetch._get_service()[0] is not service
+
+def test_channel_error_before_budget_is_returned(stub_api):
+    stub_api({'vid00': 50, 'vid01': 50, 'vid02': 100}, fail={'vid01'})
+    result = youtube_fetch.get_comments_by_channel('UCx', max_items=500)
+    assert isinstance(result, dict) and '403' in result['error']
+
+def test_video_paging_stops_at_window(stub_api):
+    # One comment per hour: a 2-day window holds 48 of them, all on the first page
+    stub = stub_api({'vid00': 1000}, hours_apart=1)
+    stats = youtube_fetch.new_fetch_stats()
+    comments = youtube_fetch.get_comments_by_video('vid00', past_days=2, stats=stats)
+    assert [c['text'] for c in comments] == [f'vid00-{i}' for i in range(48)]
+    assert len(stub.comment_calls()) == 1
+    assert stats['api_calls'] == 1 and stats['quota_units'] == 1
+    assert stats['comments_out_of_window'] == 52 and stats['pages_stopped_at_window'] == 1
+    assert stats['bytes_received'] > 0
+
+def test_channel_stats_count_search_quota(stub_api):
+    stub_api({'vid00': 150, 'vid01': 50})
+    stats = youtube_fetch.new_fetch_stats()
+    youtube_fetch.get_comments_by_channel('UCx', stats=stats)
+    assert stats['api_calls'] == 4          # search + 2 pages + 1 page
+    assert stats['quota_units'] == 100 + 3
+    assert stats['comments_kept'] == 200
+
+def test_incremental_fetch_only_pages_new_comments(stub_api):
+    # One comment per hour; a 7-day window holds the newest 168
+    stub = stub_api({'vid00': 300}, hours_apart=1)
+    first = youtube_fetch.get_comments_by_video('vid00', past_days=7, incremental=True)
+    assert len(first) == 168 and len(stub.comment_calls()) == 2
+    assert not any(c.get('sentiment') for c in first)
+    for c in first:
+        c.update(sentiment='Neutral', hate_speech='Safe')
+    comment_store.save_labels(first)
+
+    stub.videos['vid00'] = 305
+    stub.calls.clear()
+    stats = youtube_fetch.new_fetch_stats()
+    second = youtube_fetch.get_comments_by_video('vid00', past_days=7, stats=stats, incremental=True)
+    assert len(stub.comment_calls()) == 1
+    assert [c['id'] for c in second[:5]] == [f'vid00-c{k}' for k in range(304, 299, -1)]
+    assert len(second) == 173 and len({c['id'] for c in second}) == 173
+    # Everything but the new comments comes back labelled from the store
+    assert sum(1 for c in second if c.get('sentiment')) == 168
+    assert stats['comments_from_store'] >= 167
+
+def test_incremental_refetches_when_window_grows(stub_api):
+    stub = stub_api({'vid00': 300}, hours_apart=1)
+    youtube_fetch.get_comments_by_video('vid00', past_days=7, incremental=True)
+    stub.calls.clear()
+    wider = youtube_fetch.get_comments_by_video('vid00', past_days=14, incremental=True)
+    assert len(wider) == 300 and len(stub.comment_calls()) == 3
+
+def test_repeat_fetch_is_served_from_cache(stub_api, monkeypatch):
+    monkeypatch.setattr(youtube_fetch, 'CACHE_TTL', 60)
+    monkeypatch.setattr(youtube_fetch, 'SEARCH_CACHE_TTL', 60)
+    stub = stub_api({'vid00': 150, 'vid01': 50})
+    first = youtube_fetch.get_comments_by_channel('UCx')
+    assert len(stub.calls) == 4
+    stats = youtube_fetch.new_fetch_stats()
+    again = youtube_fetch.get_comments_by_channel('UCx', stats=stats)
+    assert again == first and len(stub.calls) == 4
+    assert stats['cache_hits'] == 4 and stats['api_calls'] == 0 and stats['quota_units'] == 0
+    m = api_cache.metrics()
+    assert m['hits'] == 4 and m['misses'] == 4 and m['entries'] == 4
+
+def test_cache_expires_and_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_cache, 'DB_PATH', str(tmp_path / 'api_cache.db'))
+    api_cache.put('old', {'x': 1}, ttl=-1)
+    assert api_cache.get('old') is None
+    api_cache.put('gone', {'x': 1}, ttl=0.01)
+    time.sleep(0.02)
+    assert api_cache.get('gone') is None
+
+    blob = {'x': ' '.join(str(i * 7919 % 10007) for i in range(1000))}
+    assert api_cache.metrics()['entries'] == 1
+    api_cache.put('a', blob, ttl=60)         # the next put deletes 'gone', under MAX_BYTES too
+    m = api_cache.metrics()
+    assert m['entries'] == 1 and m['expired'] == 1 and m.get('evictions', 0) == 0
+    size = m['bytes']
+    assert size == api_cache._conn().execute("SELECT size FROM entries WHERE key = 'a'").fetchone()[0]
+    monkeypatch.setattr(api_cache, 'MAX_BYTES', int(size * 2.5))
+    api_cache.put('b', blob, ttl=60)
+    monkeypatch.setattr(api_cache, '_TOUCH_SECONDS', 0)
+    assert api_cache.get('a') == blob        # 'a' is now the most recently used
+    api_cache.put('c', blob, ttl=60)
+    assert api_cache.get('b') is None and api_cache.get('a') == blob and api_cache.get('c') == blob
+    assert api_cache.metrics()['evictions'] == 1
+
+def test_cache_lookups_take_no_write_lock_and_size_is_tracked(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_cache, 'DB_PATH', str(tmp_path / 'api_cache.db'))
+    api_cache.put('a', {'x': 'y' * 500}, ttl=60)
+    api_cache.put('b', {'x': 1}, ttl=60)
+    api_cache.put('a', {'x': 'z'}, ttl=60)     # replacing an entry adjusts the tracked size
+    writer = sqlite3.connect(api_cache.DB_PATH, timeout=0)
+    writer.execute('BEGIN IMMEDIATE')          # another worker holds the write lock
+    try:
+        started = time.time()
+        assert api_cache.get('a') == {'x': 'z'} and api_cache.get('missing') is None
+        assert time.time() - started < 1
+    finally:
+        writer.rollback()
+        writer.close()
+    m = api_cache.metrics()
+    conn = api_cache._conn()
+    assert m['bytes'] == conn.execute('SELECT SUM(size) FROM entries').fetchone()[0]
+    assert m['hits'] == 1 and m['misses'] == 1 and m['puts'] == 3
+
+def test_tight_quota_lists_uploads_from_playlist(stub_api, monkeypatch):
+    monkeypatch.setattr(youtube_quota, 'DAILY_QUOTA', 1000)
+    monkeypatch.setattr(youtube_quota, 'SEARCH_FLOOR', 950)
+    stub = stub_api({f'vid{i:02d}': 20 for i in range(10)})
+    stats = youtube_fetch.new_fetch_stats()
+    comments = youtube_fetch.get_comments_by_channel('UCx', past_days=3, stats=stats)
+    # Uploads are a day apart: the 3-day window holds the newest three
+    assert [c['text'] for c in comments] == [f'vid{i:02d}-{k}' for i in range(3) for k in range(20)]
+    assert not [c for c in stub.calls if c[0].endswith('/search')]
+    assert stats['quota_units'] == 1 + 3
+    assert youtube_quota.usage()['by_priority']['interactive'] == {'units': 4, 'calls': 4}
+
+def test_background_stops_short_of_the_interactive_reserve(stub_api, monkeypatch):
+    monkeypatch.setattr(youtube_quota, 'DAILY_QUOTA', 10)
+    monkeypatch.setattr(youtube_quota, 'BACKGROUND_SHARE', 0.5)
+    stub = stub_api({'vid00': 1000})
+    result = youtube_fetch.get_comments_by_video('vid00', max_items=1000, priority='background')
+    assert 'quota' in result['error'] and len(stub.comment_calls()) == 5
+    # The reserve is still there for someone waiting on the page
+    assert len(youtube_fetch.get_comments_by_video('vid00', max_items=500)) == 500
+    assert youtube_quota.remaining() == 0
+
+def test_quota_exceeded_response_blocks_further_calls(stub_api):
+    stub = stub_api({'vid00': 50, 'vid01': 50}, fail={'vid00'})
+    stub.fail_reason = 'quotaExceeded'
+    assert '403' in youtube_fetch.get_comments_by_video('vid00')['error']
+    result = youtube_fetch.get_comments_by_video('vid01')
+    assert 'quota' in result['error'] and len(stub.comment_calls()) == 1
+
+def test_replies_follow_their_thread_and_only_incomplete_threads_are_fetched(stub_api):
+    stub = stub_api({'vid00': 30})
+    stub.replies = {'vid00-c29': 3, 'vid00-c20': 150, 'vid00-c10': 7}
+    stats = youtube_fetch.new_fetch_stats()
+    comments = youtube_fetch.get_comments_by_video('vid00', stats=stats, replies=True)
+    assert len([c for c in comments if not c.get('is_reply')]) == 30
+    ids = [c['id'] for c in comments]
+    for thread, n in stub.replies.items():
+        at = ids.index(thread)
+        assert ids[at + 1:at + 1 + n] == [f'{thread}-r{j}' for j in range(n)]
+        assert all(c['parent_id'] == thread for c in comments[at + 1:at + 1 + n])
+    # c29's three replies came inline; c20 needed two comments.list pages, c10 one
+    reply_calls = [c for c in stub.calls if c[0].endswith('/comments')]
+    assert sorted(c[1] for c in reply_calls) == ['vid00-c10', 'vid00-c20', 'vid00-c20']
+    assert stats['replies_kept'] == 160 and stats['reply_threads_fetched'] == 2
+    assert stats['quota_units'] == 1 + 3
+
+def test_incremental_runs_with_and_without_replies_keep_apart(stub_api):
+    stub = stub_api({'vid00': 30}, hours_apart=1)
+    stub.replies = {'vid00-c29': 3, 'vid00-c20': 7}
+    first = youtube_fetch.get_comments_by_video('vid00', incremental=True, max_items=20, replies=True)
+    assert len(first) == 20 + 10
+
+    # Stored replies neither show up in nor use up a run without them
+    stub.videos['vid00'] = 32
+    stub.calls.clear()
+    plain = youtube_fetch.get_comments_by_video('vid00', incremental=True, max_items=20)
+    assert not any(c.get('is_reply') for c in plain) and len(plain) == 20
+    assert len(stub.comment_calls()) == 1
+
+    # That run stored no replies, so the next run with them still pages back to its own mark
+    stub.replies['vid00-c30'] = 2
+    again = youtube_fetch.get_comments_by_video('vid00', incremental=True, max_items=20, replies=True)
+    assert len([c for c in again if not c.get('is_reply')]) == 20
+    assert {c['id'] for c in again if c.get('is_reply')} == {f'{t}-r{j}' for t, n in stub.replies.items()
+                                                             for j in range(n)}
+
+def test_replies_of_every_page_share_one_pool(stub_api, monkeypatch):
+    stub = stub_api({'vid00': 250})
+    stub.replies = {'vid00-c249': 8, 'vid00-c120': 9, 'vid00-c10': 7}
+    pools = []
+    real_pool = youtube_fetch._reply_pool
+    monkeypatch.setattr(youtube_fetch, '_reply_pool', lambda: pools.append(real_pool()) or pools[-1])
+    comments = youtube_fetch.get_comments_by_video('vid00', max_items=250, replies=True)
+    assert len(comments) == 250 + 24 and len(pools) == 1
+    assert pools[0]._shutdown
+
+def test_channel_replies_count_threads_and_stay_with_them(stub_api):
+    stub = stub_api({'vid00': 6, 'vid01': 30})
+    stub.replies = {'vid00-c5': 8, 'vid01-c29': 3, 'vid01-c25': 4}
+    comments = youtube_fetch.get_comments_by_channel('UCx', max_items=10, replies=True)
+    threads = [c for c in comments if not c.get('is_reply')]
+    assert [c['id'] for c in threads] == [f'vid00-c{k}' for k in range(5, -1, -1)] + \
+        [f'vid01-c{k}' for k in range(29, 25, -1)]
+    assert len(comments) == 10 + 8 + 3
+    ids = [c['id'] for c in comments]
+    at = ids.index('vid00-c5')
+    assert ids[at + 1:at + 9] == [f'vid00-c5-r{j}' for j in range(8)]
+    # c25 is the eleventh thread: cut together with its replies
+    assert 'vid01-c25' not in ids and not any(i.startswith('vid01-c25-') for i in ids)
+
+def test_replies_keep_inline_ones_when_quota_runs_out(stub_api, monkeypatch):
+    monkeypatch.setattr(youtube_quota, 'DAILY_QUOTA', 1)
+    stub = stub_api({'vid00': 10})
+    stub.replies = {'vid00-c9': 8}
+    stats = youtube_fetch.new_fetch_stats()
+    comments = youtube_fetch.get_comments_by_video('vid00', stats=stats, replies=True)
+    assert len(comments) == 10 + 5 and stats['reply_threads_skipped'] == 1
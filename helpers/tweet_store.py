@@ -0,0 +1,218 @@
+# helpers/tweet_store.py — cached Twitter search results (SQLite, WAL), replacing cache/twitter_*.json
+
+import os
+import glob
+import json
+import time
+from datetime import datetime, timezone
+
+from helpers.db import BASE_DIR, db_path, get_connection, transaction
+
+DB_PATH = db_path('tweets.db')
+# Where twitter_utils used to write one JSON file per query
+LEGACY_CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Queries not refreshed for this long are dropped
+TTL_SECONDS = float(os.getenv('TWEET_STORE_TTL', 7 * 24 * 3600))
+# Total size of stored tweet JSON; least recently read queries go first
+MAX_BYTES = int(os.getenv('TWEET_STORE_MAX_BYTES', 32 * 1024 * 1024))
+# Reads refresh a query's last_access at most this often (saves a write per read)
+_TOUCH_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    id TEXT PRIMARY KEY,
+    created_at TEXT,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    newest_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_queries_access ON queries (last_access);
+CREATE INDEX IF NOT EXISTS idx_queries_fetched ON queries (fetched_at);
+CREATE TABLE IF NOT EXISTS query_tweets (
+    query TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    tweet_id TEXT NOT NULL,
+    PRIMARY KEY (query, pos)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_query_tweets_tweet ON query_tweets (tweet_id);
+CREATE TABLE IF NOT EXISTS refreshes (
+    query TEXT PRIMARY KEY,
+    until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    name TEXT PRIMARY KEY,
+    imported_at REAL NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _newest_id(tweets):
+    # Tweet ids are increasing integers (snowflakes); mock/other ids don't count
+    ids = [int(t['id']) for t in tweets if str(t.get('id', '')).isdigit()]
+    return str(max(ids)) if ids else None
+
+def _save(conn, query, tweets, fetched_at):
+    now = time.time()
+    rows = []
+    for t in tweets:
+        if not t.get('id'):
+            continue
+        data = json.dumps(t, ensure_ascii=False, separators=(',', ':'))
+        rows.append((str(t['id']), t.get('created_at'), data, len(data.encode('utf-8')), now))
+    conn.executemany(
+        'INSERT INTO tweets (id, created_at, data, size, stored_at) VALUES (?,?,?,?,?)'
+        ' ON CONFLICT(id) DO UPDATE SET data = excluded.data, size = excluded.size, stored_at = excluded.stored_at',
+        rows,
+    )
+    conn.execute('DELETE FROM query_tweets WHERE query = ?', (query,))
+    conn.executemany(
+        'INSERT INTO query_tweets (query, pos, tweet_id) VALUES (?,?,?)',
+        [(query, i, r[0]) for i, r in enumerate(rows)],
+    )
+    conn.execute(
+        'INSERT INTO queries (query, fetched_at, last_access, newest_id) VALUES (?,?,?,?)'
+        ' ON CONFLICT(query) DO UPDATE SET fetched_at = excluded.fetched_at,'
+        '  last_access = excluded.last_access, newest_id = excluded.newest_id',
+        (query, fetched_at, now, _newest_id(tweets)),
+    )
+    return len(rows)
+
+# -----------------------------
+# Writes
+# -----------------------------
+def save_query(query, tweets, fetched_at=None):
+    """
+    Store the result of one search: tweets are deduped by id across queries and
+    the query's list is replaced in one transaction, so readers see the old
+    list or the new one, never a mix. Evicts expired/oversized entries after.
+    """
+    conn = _conn()
+    with transaction(conn):
+        _save(conn, query, tweets or [], fetched_at or time.time())
+        _evict(conn)
+
+def _evict(conn):
+    now = time.time()
+    conn.execute(
+        'DELETE FROM query_tweets WHERE query IN (SELECT query FROM queries WHERE fetched_at < ?)',
+        (now - TTL_SECONDS,),
+    )
+    conn.execute('DELETE FROM queries WHERE fetched_at < ?', (now - TTL_SECONDS,))
+    conn.execute('DELETE FROM tweets WHERE id NOT IN (SELECT tweet_id FROM query_tweets)')
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM tweets').fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+    for row in conn.execute('SELECT query FROM queries ORDER BY last_access').fetchall():
+        conn.execute('DELETE FROM query_tweets WHERE query = ?', (row['query'],))
+        conn.execute('DELETE FROM queries WHERE query = ?', (row['query'],))
+        conn.execute('DELETE FROM tweets WHERE id NOT IN (SELECT tweet_id FROM query_tweets)')
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM tweets').fetchone()[0]
+        if total <= MAX_BYTES:
+            return
+
+# -----------------------------
+# Reads
+# -----------------------------
+def load_query(query, max_age=None):
+    """
+    {'tweets': [...], 'fetched_at': epoch seconds, 'newest_id': str|None} for a
+    stored query, or None when it isn't stored or is older than `max_age` seconds.
+    """
+    conn = _conn()
+    q = conn.execute('SELECT fetched_at, last_access, newest_id FROM queries WHERE query = ?', (query,)).fetchone()
+    age = time.time() - q['fetched_at'] if q else None
+    if q is None or age > TTL_SECONDS or (max_age is not None and age > max_age):
+        return None
+    rows = conn.execute(
+        'SELECT t.data FROM query_tweets qt JOIN tweets t ON t.id = qt.tweet_id'
+        ' WHERE qt.query = ? ORDER BY qt.pos',
+        (query,),
+    ).fetchall()
+    now = time.time()
+    if now - q['last_access'] > _TOUCH_SECONDS:
+        # Autocommit: a single short write, and only for entries not read lately
+        conn.execute('UPDATE queries SET last_access = ? WHERE query = ?', (now, query))
+    return {
+        'tweets': [json.loads(r['data']) for r in rows],
+        'fetched_at': q['fetched_at'],
+        'newest_id': q['newest_id'],
+    }
+
+def claim_refresh(query, lease_seconds=60):
+    """
+    Take the right to refresh `query` for lease_seconds. Only one worker gets it,
+    so a stale entry is revalidated once however many workers serve it.
+    """
+    now = time.time()
+    conn = _conn()
+    with transaction(conn):
+        cur = conn.execute(
+            'INSERT INTO refreshes (query, until) VALUES (?, ?)'
+            ' ON CONFLICT(query) DO UPDATE SET until = excluded.until WHERE refreshes.until < ?',
+            (query, now + lease_seconds, now),
+        )
+        return cur.rowcount == 1
+
+def release_refresh(query):
+    conn = _conn()
+    with transaction(conn):
+        conn.execute('DELETE FROM refreshes WHERE query = ?', (query,))
+
+def stats():
+    conn = _conn()
+    return {
+        'queries': conn.execute('SELECT COUNT(*) FROM queries').fetchone()[0],
+        'tweets': conn.execute('SELECT COUNT(*) FROM tweets').fetchone()[0],
+        'bytes': conn.execute('SELECT COALESCE(SUM(size), 0) FROM tweets').fetchone()[0],
+        'max_bytes': MAX_BYTES,
+    }
+
+# -----------------------------
+# Migration
+# -----------------------------
+def import_json_cache(cache_dir=LEGACY_CACHE_DIR):
+    """
+    One-time import of cache/twitter_*.json ({query, fetched_at, tweets}). Each
+    file is recorded in the imports table, so repeated calls (every worker at
+    boot) are no-ops; a query already stored with a newer fetch is left alone.
+    Returns the number of tweets imported by this call.
+    """
+    total = 0
+    conn = _conn()
+    for path in sorted(glob.glob(os.path.join(cache_dir, 'twitter_*.json'))):
+        name = os.path.basename(path)
+        if conn.execute('SELECT 1 FROM imports WHERE name = ?', (name,)).fetchone():
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            query = payload['query']
+            fetched_at = os.path.getmtime(path)
+            if payload.get('fetched_at'):
+                # Written with datetime.utcnow().isoformat(): naive UTC
+                dt = datetime.fromisoformat(payload['fetched_at'])
+                fetched_at = (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+        except Exception as e:
+            print(f"[WARNING] Could not read {path}: {e}")
+            continue
+        with transaction(conn):
+            # Re-check under the write lock: another worker may have imported meanwhile
+            if conn.execute('SELECT 1 FROM imports WHERE name = ?', (name,)).fetchone():
+                continue
+            stored = conn.execute('SELECT fetched_at FROM queries WHERE query = ?', (query,)).fetchone()
+            rows = 0
+            if stored is None or stored['fetched_at'] < fetched_at:
+                rows = _save(conn, query, payload.get('tweets') or [], fetched_at)
+            conn.execute('INSERT INTO imports (name, imported_at, rows) VALUES (?,?,?)', (name, time.time(), rows))
+        total += rows
+    return total
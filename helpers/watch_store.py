@@ -0,0 +1,156 @@
+# helpers/watch_store.py — watched YouTube channels/videos and their precomputed summaries (SQLite, WAL)
+
+import json
+import time
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('watch.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    target TEXT NOT NULL,
+    label TEXT,
+    past_days INTEGER NOT NULL,
+    interval_seconds REAL NOT NULL,
+    created_at REAL NOT NULL,
+    next_run_at REAL NOT NULL,
+    leased_until REAL NOT NULL DEFAULT 0,
+    last_run_at REAL,
+    last_status TEXT,
+    last_error TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    record_history INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (user_id, source, target)
+);
+CREATE INDEX IF NOT EXISTS idx_watches_due ON watches (next_run_at);
+CREATE TABLE IF NOT EXISTS snapshots (
+    watch_id INTEGER PRIMARY KEY,
+    computed_at REAL NOT NULL,
+    total_comments INTEGER NOT NULL,
+    summary_json TEXT NOT NULL,
+    stats_json TEXT
+);
+"""
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _watch(row):
+    out = dict(row)
+    summary = out.pop('summary_json', None)
+    stats = out.pop('stats_json', None)
+    out['summary'] = json.loads(summary) if summary else None
+    out['fetch_stats'] = json.loads(stats) if stats else None
+    return out
+
+_SELECT = (
+    'SELECT w.*, s.computed_at, s.summary_json, s.stats_json'
+    ' FROM watches w LEFT JOIN snapshots s ON s.watch_id = w.id'
+)
+
+# -----------------------------
+# Watches
+# -----------------------------
+def add_watch(user_id, kind, target, past_days=7, interval_seconds=900, label=None, source='youtube'):
+    """Watch a channel or video for a user (due at once). Re-adding updates its settings. Returns the id."""
+    now = time.time()
+    conn = _conn()
+    with transaction(conn):
+        conn.execute(
+            'INSERT INTO watches (user_id, source, kind, target, label, past_days, interval_seconds,'
+            ' created_at, next_run_at) VALUES (?,?,?,?,?,?,?,?,?)'
+            ' ON CONFLICT(user_id, source, target) DO UPDATE SET kind = excluded.kind,'
+            '  label = excluded.label, past_days = excluded.past_days,'
+            '  interval_seconds = excluded.interval_seconds, next_run_at = excluded.next_run_at',
+            (user_id, source, kind, target, label, int(past_days), float(interval_seconds), now, now),
+        )
+        return conn.execute(
+            'SELECT id FROM watches WHERE user_id = ? AND source = ? AND target = ?', (user_id, source, target)
+        ).fetchone()['id']
+
+def remove_watch(user_id, watch_id):
+    conn = _conn()
+    with transaction(conn):
+        cur = conn.execute('DELETE FROM watches WHERE id = ? AND user_id = ?', (watch_id, user_id))
+        conn.execute('DELETE FROM snapshots WHERE watch_id = ? AND watch_id NOT IN (SELECT id FROM watches)',
+                     (watch_id,))
+        return cur.rowcount == 1
+
+def request_refresh(user_id, watch_id):
+    """
+    Make a watch due now (the scheduler picks it up on its next tick unless it is
+    running). Unlike scheduled refreshes, this one is added to the user's history.
+    """
+    conn = _conn()
+    with transaction(conn):
+        cur = conn.execute('UPDATE watches SET next_run_at = ?, record_history = 1 WHERE id = ? AND user_id = ?',
+                           (time.time(), watch_id, user_id))
+        return cur.rowcount == 1
+
+def list_watches(user_id):
+    """A user's watches with their latest summary, oldest first: one indexed read, no fetching."""
+    rows = _conn().execute(_SELECT + ' WHERE w.user_id = ? ORDER BY w.created_at', (user_id,)).fetchall()
+    return [_watch(r) for r in rows]
+
+def get_watch(watch_id):
+    row = _conn().execute(_SELECT + ' WHERE w.id = ?', (watch_id,)).fetchone()
+    return _watch(row) if row else None
+
+# -----------------------------
+# Scheduler side
+# -----------------------------
+def claim_due(limit, lease_seconds, max_running=None, now=None):
+    """
+    Lease up to `limit` due watches, most overdue first. A leased watch isn't handed
+    out again until the lease ends, so every worker process can poll safely; with
+    `max_running`, leases across all processes are capped at that many.
+    """
+    now = now or time.time()
+    conn = _conn()
+    with transaction(conn):
+        if max_running is not None:
+            running = conn.execute('SELECT COUNT(*) FROM watches WHERE leased_until > ?', (now,)).fetchone()[0]
+            limit = min(limit, max_running - running)
+        if limit <= 0:
+            return []
+        rows = conn.execute(
+            'SELECT * FROM watches WHERE next_run_at <= ? AND leased_until <= ? ORDER BY next_run_at LIMIT ?',
+            (now, now, int(limit)),
+        ).fetchall()
+        conn.executemany('UPDATE watches SET leased_until = ? WHERE id = ?',
+                         [(now + lease_seconds, r['id']) for r in rows])
+    return [dict(r) for r in rows]
+
+def save_snapshot(watch_id, summary, fetch_stats, next_run_at):
+    """Store a refresh's summary (replacing the previous one) and release the lease."""
+    now = time.time()
+    conn = _conn()
+    with transaction(conn):
+        if not conn.execute('SELECT 1 FROM watches WHERE id = ?', (watch_id,)).fetchone():
+            return
+        conn.execute(
+            'INSERT OR REPLACE INTO snapshots (watch_id, computed_at, total_comments, summary_json, stats_json)'
+            ' VALUES (?,?,?,?,?)',
+            (watch_id, now, summary.get('total_comments', 0), json.dumps(summary, default=str),
+             json.dumps(fetch_stats, default=str)),
+        )
+        conn.execute(
+            "UPDATE watches SET last_run_at = ?, last_status = 'ok', last_error = NULL, failures = 0,"
+            ' next_run_at = ?, leased_until = 0, record_history = 0 WHERE id = ?',
+            (now, next_run_at, watch_id),
+        )
+
+def record_failure(watch_id, status, error, next_run_at):
+    """Release the lease after a failed or deferred refresh; the last snapshot stays as it was."""
+    conn = _conn()
+    with transaction(conn):
+        conn.execute(
+            'UPDATE watches SET last_run_at = ?, last_status = ?, last_error = ?, next_run_at = ?, leased_until = 0,'
+            " failures = failures + (CASE WHEN ? = 'error' THEN 1 ELSE 0 END) WHERE id = ?",
+            (time.time(), status, error, next_run_at, status, watch_id),
+        )
@@ -2,48 +2,334 @@
 
 import os
 import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime, timedelta
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
+from googleapiclient import discovery_cache
 from config import YOUTUBE_API_KEY as FALLBACK_KEY
+from helpers import comment_store, api_cache, youtube_quota
+from helpers.youtube_quota import INTERACTIVE
 import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_BASE = 'https://www.googleapis.com/youtube/v3'
+# Point at a stand-in server (tests, proxies); a non-default base always uses plain REST
+YOUTUBE_API_BASE = os.getenv('YOUTUBE_API_BASE', DEFAULT_API_BASE).rstrip('/')
+# Videos fetched at once for a channel, and open connections per API host
+FETCH_WORKERS = int(os.getenv('YOUTUBE_FETCH_WORKERS', 6))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('YOUTUBE_MAX_CONNECTIONS_PER_HOST', 6))
+# Reply threads expanded at once per fetch, and replies kept per thread
+REPLY_WORKERS = int(os.getenv('YOUTUBE_REPLY_WORKERS', 4))
+MAX_REPLIES_PER_THREAD = int(os.getenv('YOUTUBE_MAX_REPLIES_PER_THREAD', 200))
+
+# Partial responses: only the parts _comment_from_item reads
+COMMENT_FIELDS = (
+    'nextPageToken,'
+    'items(id,snippet/topLevelComment/snippet(textDisplay,authorDisplayName,publishedAt,likeCount))'
+)
+# With replies: the thread's reply count and its first (up to 5) replies come inline at no extra quota
+THREAD_FIELDS = (
+    'nextPageToken,'
+    'items(id,snippet(totalReplyCount,topLevelComment/snippet(textDisplay,authorDisplayName,publishedAt,likeCount)),'
+    'replies/comments(id,snippet(textDisplay,authorDisplayName,publishedAt,likeCount)))'
+)
+REPLY_FIELDS = 'nextPageToken,items(id,snippet(textDisplay,authorDisplayName,publishedAt,likeCount))'
+SEARCH_FIELDS = 'nextPageToken,items(id/videoId)'
+PLAYLIST_FIELDS = 'nextPageToken,items(contentDetails(videoId,videoPublishedAt))'
+# Data API quota units per list call (booked against the daily budget by helpers.youtube_quota)
+QUOTA_COST = youtube_quota.COSTS
+# Seconds API responses are served from helpers.api_cache (0 disables): comment
+# pages change as comments arrive, a channel's upload list much more slowly
+CACHE_TTL = int(os.getenv('YOUTUBE_CACHE_TTL', 300))
+SEARCH_CACHE_TTL = int(os.getenv('YOUTUBE_SEARCH_CACHE_TTL', 1800))
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest'
+# Used when the installed client doesn't bundle the YouTube discovery document
+DISCOVERY_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'youtube_v3_discovery.json'
+)
+
+# Clients are reused for the life of the process. The googleapiclient service wraps a
+# non-thread-safe httplib2.Http, so it is per thread; the requests.Session is shared.
+# Both are rebuilt after a fork (gunicorn workers) so sockets are never shared.
+_local = threading.local()
+_session_lock = threading.Lock()
+_session = None
+_session_pid = None
+_stats_lock = threading.Lock()
 
 # -----------------------------
 # Helper functions
 # -----------------------------
+def _discovery_doc():
+    """
+    The YouTube v3 discovery document, parsed once per process: the copy bundled
+    with google-api-python-client, else a local copy fetched once from Google.
+    """
+    doc = getattr(_discovery_doc, 'doc', None)
+    if doc is not None:
+        return doc
+    doc = discovery_cache.get_static_doc('youtube', 'v3')
+    if doc is None:
+        try:
+            with open(DISCOVERY_CACHE_PATH, 'r', encoding='utf-8') as f:
+                doc = f.read()
+        except OSError:
+            resp = _http().get(DISCOVERY_URL, timeout=15)
+            resp.raise_for_status()
+            doc = resp.text
+            os.makedirs(os.path.dirname(DISCOVERY_CACHE_PATH), exist_ok=True)
+            tmp = f'{DISCOVERY_CACHE_PATH}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(doc)
+            os.replace(tmp, DISCOVERY_CACHE_PATH)
+    _discovery_doc.doc = doc = json.loads(doc)
+    return doc
+
 def _get_service():
-    """Build a YouTube Data API client with resilient discovery fallback.
+    """Return the YouTube Data API client for this thread, building it on first use.
 
-    Tries default (may target youtube.googleapis.com), then falls back to
-    discovery over www.googleapis.com which is more widely resolvable.
-    Returns (service, api_key). If both attempts fail, returns (None, api_key)
+    The client is built from the cached discovery document and kept per thread and
+    process, so its keep-alive connection carries over between pages and videos.
+    Returns (service, api_key). If the client can't be built, returns (None, api_key)
     so callers can use plain REST fallback.
     """
     api_key = os.getenv('YOUTUBE_API_KEY') or FALLBACK_KEY
     if not api_key or api_key.strip().lower().startswith('your'):
         raise RuntimeError("YouTube API key is missing. Set YOUTUBE_API_KEY in environment or config.py")
+    if YOUTUBE_API_BASE != DEFAULT_API_BASE:
+        return None, api_key
+
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid or getattr(_local, 'api_key', None) != api_key:
+        _local.pid = pid
+        _local.api_key = api_key
+        try:
+            _local.service = build_from_document(_discovery_doc(), developerKey=api_key)
+        except Exception as e:
+            print(f"[WARNING] Could not build YouTube client, using REST: {e}")
+            _local.service = None
+    return _local.service, api_key
+
+def _http():
+    """Process-wide requests.Session (keep-alive); its pool caps and blocks at
+    MAX_CONNECTIONS_PER_HOST connections per host."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+                                      pool_block=True)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+def new_fetch_stats():
+    """Per-analysis counters filled in by the fetchers (pass as `stats=`)."""
+    return {
+        'api_calls': 0,
+        'quota_units': 0,
+        'bytes_received': 0,
+        'comments_kept': 0,
+        'comments_out_of_window': 0,
+        'pages_stopped_at_window': 0,
+        'comments_from_store': 0,
+        'cache_hits': 0,
+        'replies_kept': 0,
+        'reply_threads_fetched': 0,
+        'reply_threads_skipped': 0,
+    }
+
+def _count(stats, **amounts):
+    if stats is None:
+        return
+    with _stats_lock:
+        for k, v in amounts.items():
+            stats[k] = stats.get(k, 0) + v
 
-    # Attempt default discovery first
+def _count_call(stats, endpoint, nbytes):
+    _count(stats, api_calls=1, quota_units=QUOTA_COST.get(endpoint, 1), bytes_received=nbytes)
+
+def _cached(key, ttl, fetch, stats):
+    """
+    The API response for `key` from the shared cache, else `fetch()` (which
+    does the call and its accounting) stored for `ttl` seconds. Errors raise
+    out of fetch() and are never cached.
+    """
+    if ttl > 0:
+        data = api_cache.get(key)
+        if data is not None:
+            _count(stats, cache_hits=1)
+            return data
+    data = fetch()
+    api_cache.put(key, data, ttl)
+    return data
+
+def _comments_key(video_id, page_token, replies=False):
+    # commentThreads takes no window parameter (it is applied client-side), so pages are shared by all windows
+    return f'yt:commentThreads{"+replies" if replies else ""}:{video_id}:{page_token or ""}'
+
+def _replies_key(parent_id, page_token):
+    return f'yt:comments:{parent_id}:{page_token or ""}'
+
+def _search_key(channel_id, published_after, page_token):
+    # The window start moves every second; the hour it falls in is close enough for an upload list
+    return f'yt:search:{channel_id}:{published_after[:13]}:{page_token or ""}'
+
+def _playlist_key(playlist_id, page_token):
+    return f'yt:playlistItems:{playlist_id}:{page_token or ""}'
+
+def _charge(endpoint, priority):
+    # Book the call against the shared daily budget before making it
     try:
-        svc = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
-        return svc, api_key
-    except Exception:
-        pass
+        youtube_quota.charge(endpoint, priority)
+    except youtube_quota.QuotaExhausted as e:
+        raise YouTubeFetchError(str(e)) from e
+
+def _rest_get(http, url, params, endpoint, stats, priority=INTERACTIVE):
+    _charge(endpoint, priority)
+    resp = http.get(url, params=params, timeout=15)
+    _count_call(stats, endpoint, len(resp.content))
+    if resp.status_code != 200:
+        if resp.status_code == 403 and 'quotaExceeded' in resp.text:
+            youtube_quota.mark_exhausted()
+        raise YouTubeFetchError(f"YouTube REST error: {resp.status_code} {resp.text[:200]}")
+    return resp.json()
 
-    # Fallback: use discovery from www.googleapis.com explicitly
+def _client_execute(req, endpoint, stats, priority=INTERACTIVE):
+    _charge(endpoint, priority)
     try:
-        svc = build(
-            'youtube', 'v3', developerKey=api_key, cache_discovery=False,
-            discoveryServiceUrl='https://www.googleapis.com/discovery/v1/apis/{api}/{apiVersion}/rest'
-        )
-        return svc, api_key
-    except Exception:
-        # Last resort: caller should use REST
-        return None, api_key
+        res = req.execute()
+    except HttpError as e:
+        if e.resp.status == 403 and b'quotaExceeded' in (e.content or b''):
+            youtube_quota.mark_exhausted()
+        raise
+    _count_call(stats, endpoint, _response_size(res))
+    return res
+
+def _comment_from_item(item, video_id=None):
+    sn = item['snippet']['topLevelComment']['snippet']
+    comment = {
+        'id': item.get('id'),
+        'video_id': video_id,
+        'text': sn.get('textDisplay', ''),
+        'username': sn.get('authorDisplayName', 'Unknown'),
+        'date': sn.get('publishedAt', '')[:10],
+        'published_at': sn.get('publishedAt', ''),
+        'likes': sn.get('likeCount', 0)
+    }
+    if 'totalReplyCount' in item['snippet']:
+        comment['reply_count'] = item['snippet']['totalReplyCount']
+    return comment
+
+def _reply_from_item(item, video_id, parent_id):
+    sn = item['snippet']
+    return {
+        'id': item.get('id'),
+        'video_id': video_id,
+        'parent_id': parent_id,
+        'is_reply': True,
+        'text': sn.get('textDisplay', ''),
+        'username': sn.get('authorDisplayName', 'Unknown'),
+        'date': sn.get('publishedAt', '')[:10],
+        'published_at': sn.get('publishedAt', ''),
+        'likes': sn.get('likeCount', 0)
+    }
+
+def _take_page(items, out, published_after, stats, video_id=None, since=None):
+    """
+    Append one order=time page (newest first) to `out`, dropping comments older
+    than `published_after` or than `since` (the newest comment already stored).
+    Returns True once the page reached past that boundary, i.e. no later page
+    can contain a comment we still need.
+    """
+    crossed = False
+    kept = 0
+    outside = 0
+    for item in items:
+        published = item['snippet']['topLevelComment']['snippet'].get('publishedAt', '')
+        if published_after and published and published < published_after:
+            crossed = True
+            outside += 1
+            continue
+        if since and published and published < since:
+            crossed = True
+            continue
+        comment = _comment_from_item(item, video_id)
+        if 'replies' in item:
+            # Inline replies, held on the thread until _expand_replies places them
+            comment['replies'] = [_reply_from_item(r, video_id, comment['id'])
+                                  for r in item['replies'].get('comments', [])]
+        out.append(comment)
+        kept += 1
+    _count(stats, comments_kept=kept, comments_out_of_window=outside)
+    return crossed
+
+class YouTubeFetchError(Exception):
+    """Raised by the page iterators; the list-returning functions turn it into {'error': ...}."""
+
+def _trim(page, count, max_items):
+    """Cut a page to the remaining budget; returns (page, trimmed)."""
+    room = max_items - count
+    if len(page) > room:
+        return page[:room], True
+    return page, False
+
+def _rest_pages(http, api_key, video_id, max_items, published_after=None, since=None,
+                stats=None, should_stop=None, priority=INTERACTIVE, replies=False):
+    """
+    Page commentThreads over plain REST, newest first, yielding one list per page
+    until max_items or the time window (or `since`) is exhausted. `should_stop()`
+    is checked before each page (cooperative cancellation). The generator returns
+    `complete`: False when paging was cut short by max_items or should_stop
+    rather than by reaching the boundary. With replies=True threads carry
+    reply_count and their inline replies (see _with_replies).
+    """
+    url = f'{YOUTUBE_API_BASE}/commentThreads'
+    params = {
+        'part': 'snippet,replies' if replies else 'snippet',
+        'videoId': video_id,
+        'maxResults': 100,
+        'order': 'time',
+        'textFormat': 'plainText',
+        'fields': THREAD_FIELDS if replies else COMMENT_FIELDS,
+        'key': api_key
+    }
+    count = 0
+    page_token = None
+    while count < max_items:
+        if should_stop is not None and should_stop():
+            return False
+        if page_token:
+            params['pageToken'] = page_token
+        data = _cached(_comments_key(video_id, page_token, replies), CACHE_TTL,
+                       lambda: _rest_get(http, url, params, 'commentThreads', stats, priority), stats)
+        page = []
+        crossed = _take_page(data.get('items', []), page, published_after, stats, video_id, since)
+        page, trimmed = _trim(page, count, max_items)
+        count += len(page)
+        if page:
+            yield page
+        if trimmed:
+            return False
+        page_token = data.get('nextPageToken')
+        if crossed and page_token:
+            _count(stats, pages_stopped_at_window=1)
+        if crossed or not page_token:
+            return True
+    return False
 
 def _iso_days_ago(days):
+    # Same shape as the API's publishedAt, so the two compare as strings
     dt = datetime.utcnow() - timedelta(days=int(days or 7))
-    return dt.isoformat("T") + "Z"
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
 
 # -----------------------------
 # Extraction functions
@@ -67,140 +353,450 @@ def extract_channel_id(url):
 # -----------------------------
 # Comment fetching functions
 # -----------------------------
-def get_comments_by_video(video_id, past_days=7, max_items=500):
+def _response_size(res):
+    # The client hands back parsed JSON; its compact re-encoding approximates the wire size
+    return len(json.dumps(res, separators=(',', ':')).encode('utf-8'))
+
+def _client_pages(service, video_id, max_items, published_after=None, since=None, stats=None,
+                  priority=INTERACTIVE, replies=False):
+    """Same as _rest_pages, through the API client."""
+    count = 0
+    page_token = None
+    req = service.commentThreads().list(
+        part="snippet,replies" if replies else "snippet",
+        videoId=video_id,
+        maxResults=100,
+        order="time",
+        textFormat="plainText",
+        fields=THREAD_FIELDS if replies else COMMENT_FIELDS
+    )
+    while req and count < max_items:
+        res = _cached(_comments_key(video_id, page_token, replies), CACHE_TTL,
+                      partial(_client_execute, req, 'commentThreads', stats, priority), stats)
+        page = []
+        crossed = _take_page(res.get('items', []), page, published_after, stats, video_id, since)
+        page, trimmed = _trim(page, count, max_items)
+        count += len(page)
+        if page:
+            yield page
+        if trimmed:
+            return False
+        if crossed:
+            if res.get('nextPageToken'):
+                _count(stats, pages_stopped_at_window=1)
+            return True
+        page_token = res.get('nextPageToken')
+        req = service.commentThreads().list_next(req, res)
+    return req is None
+
+def _thread_replies(thread, api_key, stats, priority=INTERACTIVE):
+    """
+    Replies of one thread via comments.list (parentId), up to MAX_REPLIES_PER_THREAD.
+    Always plain REST on the shared session: it is thread-safe and its pool blocks at
+    MAX_CONNECTIONS_PER_HOST, where the API client would be rebuilt in every worker
+    thread. No window check: a reply is never older than its thread.
+    """
+    params = {
+        'part': 'snippet',
+        'parentId': thread['id'],
+        'maxResults': 100,
+        'textFormat': 'plainText',
+        'fields': REPLY_FIELDS,
+        'key': api_key,
+    }
+    replies = []
+    page_token = None
+    while len(replies) < MAX_REPLIES_PER_THREAD:
+        page_params = dict(params, pageToken=page_token) if page_token else dict(params)
+        fetch = partial(_rest_get, _http(), f'{YOUTUBE_API_BASE}/comments', page_params, 'comments', stats,
+                        priority)
+        data = _cached(_replies_key(thread['id'], page_token), CACHE_TTL, fetch, stats)
+        replies.extend(_reply_from_item(it, thread['video_id'], thread['id']) for it in data.get('items', []))
+        page_token = data.get('nextPageToken')
+        if not page_token:
+            break
+    return replies[:MAX_REPLIES_PER_THREAD]
+
+def _reply_pool():
+    """Workers that expand reply threads, one pool for a whole fetch (shut it down when done)."""
+    return ThreadPoolExecutor(max_workers=REPLY_WORKERS, thread_name_prefix='yt-replies')
+
+def _expand_replies(page, pool, api_key, stats, priority=INTERACTIVE):
     """
-    Returns list of comment dicts with: text, username, date(YYYY-MM-DD), likes
+    Place each thread's replies right after it. Threads whose inline replies
+    are already all of them (reply_count) need no call; the rest are fetched
+    on `pool` (see _reply_pool). A thread whose fetch fails (quota running out
+    included) keeps just its inline replies.
+    """
+    needed = [c for c in page if c.get('reply_count', 0) > len(c.get('replies') or [])]
+    futures = [(c['id'], pool.submit(_thread_replies, c, api_key, stats, priority)) for c in needed]
+    fetched = {}
+    for thread_id, future in futures:
+        try:
+            fetched[thread_id] = future.result()
+        except YouTubeFetchError as e:
+            print(f"[WARNING] Replies of {thread_id} not fetched: {e}")
+            _count(stats, reply_threads_skipped=1)
+    out = []
+    kept = 0
+    for c in page:
+        inline = c.pop('replies', None) or []
+        replies = fetched.get(c['id'], inline)
+        out.append(c)
+        out.extend(replies)
+        kept += len(replies)
+    _count(stats, replies_kept=kept, reply_threads_fetched=len(fetched))
+    return out
+
+def _with_replies(pages, pool, api_key, stats, priority=INTERACTIVE):
+    """Wrap a page generator (see _rest_pages) so every page has its replies expanded; keeps its return value."""
+    while True:
+        try:
+            page = next(pages)
+        except StopIteration as stop:
+            return stop.value
+        yield _expand_replies(page, pool, api_key, stats, priority)
+
+def _incremental_pages(video_id, published_after, max_items, stats, pages_for, replies=False):
+    """
+    Fetch only what's newer than the video's watermark, then continue with the
+    stored comments. `pages_for(since)` is a page generator (see _rest_pages).
+    Fresh pages are saved and yielded as they arrive, newest first; stored
+    comments (with their labels) follow in batches.
+
+    The stored set is only trusted back to its covered_from mark. It is reused when
+    it covers the whole window, or already holds max_items comments (results are
+    newest first, so older ones wouldn't make the cut). Otherwise, or when a fetch
+    couldn't page all the way down to the watermark (leaving a gap), coverage
+    starts over from what was just fetched. Runs with replies keep their own
+    watermark, since a run without them leaves the stored replies incomplete.
+    """
+    wm = comment_store.watermark(video_id, replies)
+    since = None
+    if wm and (wm['covered_from'] <= published_after
+               or comment_store.count_since(video_id, wm['covered_from']) >= max_items):
+        since = wm['newest_published_at']
+
+    pages = pages_for(since)
+    fresh = 0
+    newest = oldest = None
+    boundary = set()   # fresh comments stamped exactly at the watermark may already be stored
+    while True:
+        try:
+            page = next(pages)
+        except StopIteration as stop:
+            complete = stop.value
+            break
+        if since:
+            # Keep the stored copy (and its labels) of comments seen on the last run
+            at_mark = [c['id'] for c in page if c['published_at'] == since]
+            boundary.update(at_mark)
+            known = comment_store.get_comments(video_id, at_mark)
+            page = [dict(known[c['id']], likes=c['likes']) if c['id'] in known else c for c in page]
+        comment_store.save_comments(video_id, page)
+        # Threads set the marks and the max_items count; replies ride along with them
+        stamps = [c['published_at'] for c in page if not c.get('is_reply')]
+        if stamps:
+            newest = max(stamps + ([newest] if newest else []))
+            oldest = min(stamps + ([oldest] if oldest else []))
+        fresh += len(stamps)
+        yield page
+
+    if complete:
+        covered = wm['covered_from'] if since else published_after
+    elif fresh:
+        covered = oldest
+    else:
+        return
+    comment_store.move_watermark(video_id, newest, covered, replies)
+    if not (since and complete):
+        return
+    from_store = 0
+    for batch in comment_store.iter_comments(video_id, max(published_after, covered), since,
+                                             max_items - fresh, exclude=boundary, replies=replies):
+        from_store += len(batch)
+        yield batch
+    _count(stats, comments_from_store=from_store)
+
+def iter_video_comment_pages(video_id, past_days=7, max_items=500, stats=None, incremental=False,
+                             priority=INTERACTIVE, replies=False):
+    """
+    Generator form of get_comments_by_video: yields one list of comments per API
+    page (then stored batches when incremental), so callers can start working on
+    page N while page N+1 downloads. Raises YouTubeFetchError, also when the
+    daily quota left for `priority` (see helpers.youtube_quota) runs out.
     """
     service, api_key = _get_service()
     published_after = _iso_days_ago(past_days)
-    out = []
+    reply_pool = _reply_pool() if replies else None
 
-    try:
+    def pages_for(since):
         if service is not None:
-            req = service.commentThreads().list(
-                part="snippet",
-                videoId=video_id,
-                maxResults=100,
-                order="time",
-                textFormat="plainText"
-            )
-            while req and len(out) < max_items:
-                res = req.execute()
-                for item in res.get('items', []):
-                    sn = item['snippet']['topLevelComment']['snippet']
-                    out.append({
-                        'text': sn.get('textDisplay', ''),
-                        'username': sn.get('authorDisplayName', 'Unknown'),
-                        'date': sn.get('publishedAt', '')[:10],
-                        'likes': sn.get('likeCount', 0)
-                    })
-                req = service.commentThreads().list_next(req, res)
+            pages = _client_pages(service, video_id, max_items, published_after, since, stats, priority, replies)
         else:
             # Plain REST fallback via www.googleapis.com
-            url = 'https://www.googleapis.com/youtube/v3/commentThreads'
-            params = {
-                'part': 'snippet',
-                'videoId': video_id,
-                'maxResults': 100,
-                'order': 'time',
-                'textFormat': 'plainText',
-                'key': api_key
-            }
-            page_token = None
-            while len(out) < max_items:
-                if page_token:
-                    params['pageToken'] = page_token
-                resp = requests.get(url, params=params, timeout=15)
-                if resp.status_code != 200:
-                    return {'error': f"YouTube REST error: {resp.status_code} {resp.text[:200]}"}
-                data = resp.json()
-                for item in data.get('items', []):
-                    sn = item['snippet']['topLevelComment']['snippet']
-                    out.append({
-                        'text': sn.get('textDisplay', ''),
-                        'username': sn.get('authorDisplayName', 'Unknown'),
-                        'date': sn.get('publishedAt', '')[:10],
-                        'likes': sn.get('likeCount', 0)
-                    })
-                page_token = data.get('nextPageToken')
-                if not page_token:
-                    break
-                if len(out) >= max_items:
-                    break
+            pages = _rest_pages(_http(), api_key, video_id, max_items, published_after=published_after,
+                                since=since, stats=stats, priority=priority, replies=replies)
+        return _with_replies(pages, reply_pool, api_key, stats, priority) if replies else pages
+
+    try:
+        if incremental:
+            yield from _incremental_pages(video_id, published_after, max_items, stats, pages_for, replies)
+        else:
+            yield from pages_for(None)
+    except YouTubeFetchError:
+        raise
     except HttpError as e:
-        return {'error': f"YouTube API error: {e}"}
+        raise YouTubeFetchError(f"YouTube API error: {e}") from e
     except Exception as e:
-        return {'error': f"Failed to fetch video comments: {e}"}
-    return out
+        raise YouTubeFetchError(f"Failed to fetch video comments: {e}") from e
+    finally:
+        if reply_pool is not None:
+            reply_pool.shutdown(wait=True)
 
-def get_comments_by_channel(channel_id, past_days=7, max_items=800):
+def get_comments_by_video(video_id, past_days=7, max_items=500, stats=None, incremental=False,
+                          priority=INTERACTIVE, replies=False):
     """
-    Fetch recent videos in window, then aggregate their comments.
+    Returns list of comment dicts with: id, text, username, date(YYYY-MM-DD), likes
+    Only comments from the last `past_days` days are kept; paging stops at the
+    first page that reaches past the window. `stats` (see new_fetch_stats) is
+    updated with API calls, quota units and bytes received.
+
+    With incremental=True only comments newer than the video's stored watermark
+    are fetched; the result is merged with helpers.comment_store, and stored
+    comments come back with their sentiment/hate labels already set.
+
+    `priority` is 'interactive' (someone is waiting) or 'background'; background
+    fetches stop earlier so the rest of the day's quota stays available.
+
+    With replies=True each thread is followed by its replies (is_reply=True,
+    parent_id set); max_items still counts threads only.
     """
-    service, api_key = _get_service()
-    published_after = _iso_days_ago(past_days)
-    comments = []
+    try:
+        return [c for page in iter_video_comment_pages(video_id, past_days, max_items, stats, incremental,
+                                                       priority, replies)
+                for c in page]
+    except YouTubeFetchError as e:
+        return {'error': str(e)}
+
+def _threads(comments):
+    """Top-level comments in a list (replies ride along with their thread and aren't counted)."""
+    return sum(1 for c in comments if not c.get('is_reply'))
+
+def _first_threads(comments, n):
+    """The first `n` threads of a list, each with all of the replies that follow it."""
+    kept = 0
+    for i, c in enumerate(comments):
+        if not c.get('is_reply'):
+            if kept == n:
+                return comments[:i]
+            kept += 1
+    return comments
 
+def _iter_videos_concurrently(http, api_key, videos, max_items, published_after=None,
+                              stats=None, incremental=False, workers=None, priority=INTERACTIVE,
+                              replies=False, reply_pool=None):
+    """
+    Fetch comments for several videos at once, yielding one list per video with
+    the same comments a sequential walk would: videos in the given order,
+    truncated to max_items. At most `workers` videos are in flight or waiting
+    to be consumed, which bounds memory when the consumer is slower.
+
+    A video stops paging once the comments already held for it and every earlier
+    video reach max_items (those counts only grow, so nothing it would contribute
+    is lost), and a video is skipped entirely when its predecessors already cover
+    the budget. An error only matters if the earlier videos didn't fill the budget,
+    so it cancels the videos after it and the others finish normally. With
+    replies, every video expands its threads on the one `reply_pool`, and
+    max_items counts threads: a thread is kept or cut with all its replies.
+    """
+    n = len(videos)
+    collected = [0] * n
+    lock = threading.Lock()
+    first_error = [n]   # lowest index that failed; later videos aren't needed
+    cancelled = threading.Event()
+
+    def run(i):
+        def prefix_full():
+            with lock:
+                return cancelled.is_set() or i > first_error[0] or sum(collected[:i + 1]) >= max_items
+
+        def pages_for(since):
+            pages = _rest_pages(http, api_key, videos[i], max_items, published_after=published_after,
+                                since=since, stats=stats, should_stop=prefix_full, priority=priority,
+                                replies=replies)
+            return _with_replies(pages, reply_pool, api_key, stats, priority) if replies else pages
+
+        if prefix_full():
+            return []
+        pages = _incremental_pages(videos[i], published_after, max_items, stats, pages_for, replies) \
+            if incremental else pages_for(None)
+        out = []
+        try:
+            for page in pages:
+                out.extend(page)
+                with lock:
+                    collected[i] = _threads(out)
+        except YouTubeFetchError:
+            with lock:
+                first_error[0] = min(first_error[0], i)
+            raise
+        return out
+
+    workers = max(1, min(workers or FETCH_WORKERS, n or 1))
+    yielded = 0
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='yt-fetch')
     try:
-        videos = []
+        futures = {}
+        submitted = 0
+        for i in range(n):
+            if yielded >= max_items:
+                break
+            while submitted < n and submitted < i + workers:
+                futures[submitted] = pool.submit(run, submitted)
+                submitted += 1
+            chunk = _first_threads(futures.pop(i).result(), max_items - yielded)
+            yielded += _threads(chunk)
+            if chunk:
+                yield chunk
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=True)
+
+def _channel_videos(service, api_key, http, channel_id, published_after, stats, priority=INTERACTIVE):
+    """
+    Up to 50 uploads in the window, newest first. search.list costs 100 units, so
+    once the day's budget runs low (or for background work) the channel's uploads
+    playlist is read instead, at 1 unit per page of 50.
+    """
+    if channel_id.startswith('UC') and not youtube_quota.prefer_search(priority):
+        return _playlist_videos(service, api_key, http, channel_id, published_after, stats, priority)
+    videos = []
+    if service is not None:
+        # 1) recent uploads via client
+        vreq = service.search().list(
+            part="snippet",
+            channelId=channel_id,
+            order="date",
+            publishedAfter=published_after,
+            type="video",
+            maxResults=50,
+            fields=SEARCH_FIELDS
+        )
+        page_token = None
+        while vreq and len(videos) < 50:
+            vres = _cached(_search_key(channel_id, published_after, page_token), SEARCH_CACHE_TTL,
+                           partial(_client_execute, vreq, 'search', stats, priority), stats)
+            for it in vres.get('items', []):
+                videos.append(it['id']['videoId'])
+            page_token = vres.get('nextPageToken')
+            vreq = service.search().list_next(vreq, vres)
+    else:
+        # 1) recent uploads via REST fallback
+        url = f'{YOUTUBE_API_BASE}/search'
+        params = {
+            'part': 'snippet',
+            'channelId': channel_id,
+            'order': 'date',
+            'publishedAfter': published_after,
+            'type': 'video',
+            'maxResults': 50,
+            'fields': SEARCH_FIELDS,
+            'key': api_key
+        }
+        page_token = None
+        while len(videos) < 50:
+            if page_token:
+                params['pageToken'] = page_token
+            data = _cached(_search_key(channel_id, published_after, page_token), SEARCH_CACHE_TTL,
+                           lambda: _rest_get(http, url, params, 'search', stats, priority), stats)
+            for it in data.get('items', []):
+                vid = ((it.get('id') or {}).get('videoId'))
+                if vid:
+                    videos.append(vid)
+            page_token = data.get('nextPageToken')
+            if not page_token:
+                break
+    return videos
+
+def _playlist_videos(service, api_key, http, channel_id, published_after, stats, priority=INTERACTIVE):
+    """Same as the search branch of _channel_videos, from the uploads playlist (UC… → UU…)."""
+    playlist_id = 'UU' + channel_id[2:]
+    params = {
+        'part': 'contentDetails',
+        'playlistId': playlist_id,
+        'maxResults': 50,
+        'fields': PLAYLIST_FIELDS,
+    }
+    if service is not None:
+        req = service.playlistItems().list(**params)
+    else:
+        url = f'{YOUTUBE_API_BASE}/playlistItems'
+        params['key'] = api_key
+    videos = []
+    page_token = None
+    while len(videos) < 50:
         if service is not None:
-            # 1) recent uploads via client
-            vreq = service.search().list(
-                part="snippet",
-                channelId=channel_id,
-                order="date",
-                publishedAfter=published_after,
-                type="video",
-                maxResults=50
-            )
-            while vreq and len(videos) < 50:
-                vres = vreq.execute()
-                for it in vres.get('items', []):
-                    videos.append(it['id']['videoId'])
-                vreq = service.search().list_next(vreq, vres)
+            fetch = partial(_client_execute, req, 'playlistItems', stats, priority)
         else:
-            # 1) recent uploads via REST fallback
-            url = 'https://www.googleapis.com/youtube/v3/search'
-            params = {
-                'part': 'snippet',
-                'channelId': channel_id,
-                'order': 'date',
-                'publishedAfter': published_after,
-                'type': 'video',
-                'maxResults': 50,
-                'key': api_key
-            }
-            page_token = None
-            while len(videos) < 50:
-                if page_token:
-                    params['pageToken'] = page_token
-                resp = requests.get(url, params=params, timeout=15)
-                if resp.status_code != 200:
-                    return {'error': f"YouTube REST error: {resp.status_code} {resp.text[:200]}"}
-                data = resp.json()
-                for it in data.get('items', []):
-                    vid = ((it.get('id') or {}).get('videoId'))
-                    if vid:
-                        videos.append(vid)
-                page_token = data.get('nextPageToken')
-                if not page_token:
-                    break
-
-        # 2) comments per video
-        for vid in videos:
-            chunk = get_comments_by_video(
-                vid, past_days=past_days, max_items=max(0, max_items - len(comments))
-            )
-            if isinstance(chunk, dict) and 'error' in chunk:
-                return chunk
-            comments.extend(chunk)
-            if len(comments) >= max_items:
+            if page_token:
+                params['pageToken'] = page_token
+            fetch = partial(_rest_get, http, url, dict(params), 'playlistItems', stats, priority)
+        data = _cached(_playlist_key(playlist_id, page_token), SEARCH_CACHE_TTL, fetch, stats)
+        # Newest uploads first; private/deleted entries carry no videoPublishedAt
+        crossed = False
+        for it in data.get('items', []):
+            details = it.get('contentDetails') or {}
+            published = details.get('videoPublishedAt')
+            if not published or not details.get('videoId'):
+                continue
+            if published_after and published < published_after:
+                crossed = True
                 break
+            videos.append(details['videoId'])
+        page_token = data.get('nextPageToken')
+        if crossed or not page_token:
+            break
+        if service is not None:
+            req = service.playlistItems().list_next(req, data)
+    return videos[:50]
 
+def iter_channel_comment_pages(channel_id, past_days=7, max_items=800, stats=None, incremental=False,
+                               priority=INTERACTIVE, replies=False):
+    """Generator form of get_comments_by_channel: yields one list per video. Raises YouTubeFetchError."""
+    service, api_key = _get_service()
+    published_after = _iso_days_ago(past_days)
+    http = _http()
+    reply_pool = _reply_pool() if replies else None
+    try:
+        videos = _channel_videos(service, api_key, http, channel_id, published_after, stats, priority)
+        # 2) comments per video, several videos in flight at once
+        yield from _iter_videos_concurrently(http, api_key, videos, max_items,
+                                             published_after=published_after, stats=stats,
+                                             incremental=incremental, priority=priority, replies=replies,
+                                             reply_pool=reply_pool)
+    except YouTubeFetchError:
+        raise
     except HttpError as e:
-        return {'error': f"YouTube API error: {e}"}
+        raise YouTubeFetchError(f"YouTube API error: {e}") from e
     except Exception as e:
-        return {'error': f"Failed to fetch channel comments: {e}"}
+        raise YouTubeFetchError(f"Failed to fetch channel comments: {e}") from e
+    finally:
+        if reply_pool is not None:
+            reply_pool.shutdown(wait=True)
 
-    return comments
- 
\ No newline at end of file
+def get_comments_by_channel(channel_id, past_days=7, max_items=800, stats=None, incremental=False,
+                            priority=INTERACTIVE, replies=False):
+    """
+    Fetch recent videos in window, then aggregate their in-window comments.
+    Videos are fetched concurrently (FETCH_WORKERS, MAX_CONNECTIONS_PER_HOST);
+    the result order is the upload order returned by search, as before.
+    incremental=True works per video, as in get_comments_by_video; `priority`
+    and `replies` as there too.
+    """
+    try:
+        return [c for page in iter_channel_comment_pages(channel_id, past_days, max_items, stats, incremental,
+                                                         priority, replies)
+                for c in page]
+    except YouTubeFetchError as e:
+        return {'error': str(e)}
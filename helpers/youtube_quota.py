@@ -0,0 +1,124 @@
+# helpers/youtube_quota.py — daily YouTube Data API quota accounting, shared across workers
+
+import os
+import math
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from helpers.db import db_path, get_connection, transaction
+
+DB_PATH = db_path('youtube_quota.db')
+
+# Units per day for the API key (Google's default allocation is 10,000)
+DAILY_QUOTA = int(os.getenv('YOUTUBE_DAILY_QUOTA', 10000))
+# Background work (scheduled refreshes) stops at this share of the day's quota,
+# so the rest is kept for people waiting on a page
+BACKGROUND_SHARE = float(os.getenv('YOUTUBE_QUOTA_BACKGROUND_SHARE', 0.5))
+# Below this many remaining units, channel uploads are listed via playlistItems (1 unit)
+# instead of search (100 units)
+SEARCH_FLOOR = int(os.getenv('YOUTUBE_QUOTA_SEARCH_FLOOR', 2000))
+
+# Data API units per list call
+COSTS = {'commentThreads': 1, 'comments': 1, 'playlistItems': 1, 'channels': 1, 'videos': 1, 'search': 100}
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# The quota resets at midnight Pacific time
+_RESET_TZ = ZoneInfo('America/Los_Angeles')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (day, priority)
+);
+CREATE TABLE IF NOT EXISTS exhausted (
+    day TEXT PRIMARY KEY,
+    reason TEXT
+);
+"""
+
+class QuotaExhausted(Exception):
+    """Raised before a call that the remaining budget for its priority can't cover."""
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+def _conn():
+    return get_connection(DB_PATH, _SCHEMA)
+
+def _today():
+    return datetime.now(_RESET_TZ).strftime('%Y-%m-%d')
+
+def _seconds_to_reset():
+    now = datetime.now(_RESET_TZ)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+def _limit(priority):
+    return DAILY_QUOTA if priority == INTERACTIVE else int(DAILY_QUOTA * BACKGROUND_SHARE)
+
+def _used(conn, day):
+    if conn.execute('SELECT 1 FROM exhausted WHERE day = ?', (day,)).fetchone():
+        return DAILY_QUOTA
+    return conn.execute('SELECT COALESCE(SUM(units), 0) FROM usage WHERE day = ?', (day,)).fetchone()[0]
+
+def remaining():
+    """Units left today across all workers (0 once the API reported the quota exceeded)."""
+    return max(0, DAILY_QUOTA - _used(_conn(), _today()))
+
+def charge(endpoint, priority=INTERACTIVE):
+    """
+    Book the cost of one `endpoint` call before it is made. Raises QuotaExhausted,
+    without booking anything, when it would take the day's usage past the
+    limit for `priority` (background work is held to BACKGROUND_SHARE).
+    """
+    units = COSTS.get(endpoint, 1)
+    day = _today()
+    conn = _conn()
+    with transaction(conn):
+        used = _used(conn, day)
+        if used + units > _limit(priority):
+            raise QuotaExhausted(
+                f"YouTube API quota for {priority} requests is used up for today "
+                f"({used}/{DAILY_QUOTA} units); it resets at midnight Pacific time",
+                _seconds_to_reset(),
+            )
+        conn.execute(
+            'INSERT INTO usage (day, priority, units, calls) VALUES (?, ?, ?, 1)'
+            ' ON CONFLICT(day, priority) DO UPDATE SET units = units + excluded.units, calls = calls + 1',
+            (day, priority, units),
+        )
+
+def mark_exhausted(reason='quotaExceeded'):
+    """The API refused a call for quota: treat today's budget as spent everywhere."""
+    conn = _conn()
+    with transaction(conn):
+        conn.execute('INSERT OR REPLACE INTO exhausted (day, reason) VALUES (?, ?)', (_today(), reason))
+
+def available(priority=INTERACTIVE):
+    """Units `priority` may still spend today (background work stops at its BACKGROUND_SHARE)."""
+    return max(0, _limit(priority) - _used(_conn(), _today()))
+
+def prefer_search(priority=INTERACTIVE):
+    """Whether listing uploads may use search.list (100 units) rather than playlistItems."""
+    return priority == INTERACTIVE and remaining() - COSTS['search'] >= SEARCH_FLOOR
+
+def usage():
+    """Today's consumption per priority, for the metrics endpoint."""
+    day = _today()
+    conn = _conn()
+    rows = conn.execute('SELECT priority, units, calls FROM usage WHERE day = ?', (day,)).fetchall()
+    return {
+        'day': day,
+        'daily_quota': DAILY_QUOTA,
+        'remaining': max(0, DAILY_QUOTA - _used(conn, day)),
+        'exhausted': bool(conn.execute('SELECT 1 FROM exhausted WHERE day = ?', (day,)).fetchone()),
+        'by_priority': {r['priority']: {'units': r['units'], 'calls': r['calls']} for r in rows},
+        'limits': {INTERACTIVE: _limit(INTERACTIVE), BACKGROUND: _limit(BACKGROUND)},
+        'seconds_to_reset': int(_seconds_to_reset()),
+    }
@@ -236,3 +236,87 @@ def predict(text, mode='sentiment'):
             return "Hate Speech" if contains_offensive_word(text) else "Safe Content"
     else:
         raise ValueError("Invalid mode for predict(): use 'sentiment' or 'hate'")
+
+# -----------------------
+# Batch predict() — one vectorizer/model call per batch instead of per text
+# -----------------------
+def predict_batch(texts, mode='sentiment', return_proba=False):
+    """
+    Classify a list of texts; returns labels in the same order as predict().
+    With return_proba=True returns (labels, probas) where probas[i] is the model's
+    top-class probability, or None when a keyword/lexicon rule decided the label.
+    """
+    labels, probas = _predict_batch_with_proba(texts, mode)
+    return (labels, probas) if return_proba else labels
+
+def _predict_batch_with_proba(texts, mode):
+    texts = [t if t is not None else "" for t in (texts or [])]
+    if not texts:
+        return [], []
+    cleaned = [clean_text(t) for t in texts]
+    none = [None] * len(texts)
+
+    if mode == 'sentiment':
+        if sentiment_model is None or sentiment_vectorizer is None:
+            return [_infer_sentiment_lexicon(t) for t in texts], none
+        try:
+            X = sentiment_vectorizer.transform(cleaned)
+            raws = list(sentiment_model.predict(X))
+            probas = list(none)
+            if hasattr(sentiment_model, "predict_proba"):
+                try:
+                    P = sentiment_model.predict_proba(X)
+                    idxs = P.argmax(axis=1)
+                    if hasattr(sentiment_model, "classes_"):
+                        raws = [sentiment_model.classes_[int(i)] for i in idxs]
+                    probas = [float(P[r, int(i)]) for r, i in enumerate(idxs)]
+                except Exception:
+                    probas = list(none)
+            labels = []
+            for k, (text, raw, proba) in enumerate(zip(texts, raws, probas)):
+                label = _map_sentiment_label(raw)
+                if proba is not None and proba < 0.55 and label == "Neutral":
+                    label = _infer_sentiment_lexicon(text)
+                    probas[k] = None
+                labels.append(label)
+            return labels, probas
+        except Exception as e:
+            logging.warning(f"Sentiment model error: {e}")
+            return [_infer_sentiment_lexicon(t) for t in texts], none
+
+    elif mode == 'hate':
+        flagged = [contains_offensive_word(t) for t in texts]
+        labels = ["Hate Speech" if f else None for f in flagged]
+        probas = list(none)
+        pending = [i for i, f in enumerate(flagged) if not f]
+        if not pending:
+            return labels, probas
+        if hate_model is None or hate_vectorizer is None:
+            for i in pending:
+                labels[i] = "Safe Content"
+            return labels, probas
+        try:
+            Xh = hate_vectorizer.transform([cleaned[i] for i in pending])
+            raws = list(hate_model.predict(Xh))
+            pvals = [None] * len(pending)
+            if hasattr(hate_model, "predict_proba"):
+                try:
+                    P = hate_model.predict_proba(Xh)
+                    idxs = P.argmax(axis=1)
+                    if hasattr(hate_model, "classes_"):
+                        raws = [hate_model.classes_[int(i)] for i in idxs]
+                    pvals = [float(P[r, int(i)]) for r, i in enumerate(idxs)]
+                except Exception:
+                    pvals = [None] * len(pending)
+            classes = getattr(hate_model, "classes_", None)
+            for i, raw, proba in zip(pending, raws, pvals):
+                labels[i] = _map_hate_label_from_classes(raw, classes=classes, proba=proba)
+                probas[i] = proba
+            return labels, probas
+        except Exception as e:
+            logging.warning(f"Hate model error: {e}")
+            for i in pending:
+                labels[i] = "Safe Content"
+            return labels, list(none)
+    else:
+        raise ValueError("Invalid mode for predict_batch(): use 'sentiment' or 'hate'")
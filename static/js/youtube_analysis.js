@@ -114,7 +114,7 @@ function initializeCharts(data) {
     // Build distributions from known keys or compute from analyzed_comments.
     let sentimentDist = {};
     let hateDist = {};
-    let timelineObj = {};
+    let timelineObj = (data && data.timeline_data && typeof data.timeline_data === 'object') ? data.timeline_data : {};
 
     // 1) Try direct distributions
     if (data && data.sentiment_distribution && typeof data.sentiment_distribution === 'object') {
@@ -561,3 +561,98 @@ function createTimelineChart(timeline) {
 
 // Export to template
 window.initializeCharts = initializeCharts;
+
+// ====== Paged comments (server-side store) ======
+function initCommentPager(section) {
+  const resultId = section.dataset.resultId;
+  if (!resultId) return;
+  const container = document.getElementById('comments-container');
+  const prevBtn = document.getElementById('comments-prev');
+  const nextBtn = document.getElementById('comments-next');
+  const info = document.getElementById('comments-page-info');
+  const totalEl = document.getElementById('comments-total');
+  const filters = {
+    sentiment: document.getElementById('filter-sentiment'),
+    hate_speech: document.getElementById('filter-hate'),
+    date_from: document.getElementById('filter-date-from'),
+    date_to: document.getElementById('filter-date-to')
+  };
+  // Keyset paging: the API hands back seq cursors; page numbers are only kept here for display
+  const state = { page: 1, pages: 1, perPage: 10, next: null, prev: null };
+
+  function renderComment(c) {
+    // Build with textContent — comment text is untrusted
+    const card = document.createElement('div');
+    card.className = 'comment-card' + (c.hate_speech === 'Hate Speech' ? ' hate-comment' : '');
+    const header = document.createElement('div');
+    header.className = 'comment-header';
+    const user = document.createElement('div');
+    user.className = 'comment-user';
+    user.innerHTML = '<i class="fas fa-user-circle"></i>';
+    const name = document.createElement('span');
+    name.className = 'username';
+    name.textContent = c.username || 'Anonymous';
+    user.appendChild(name);
+    const meta = document.createElement('div');
+    meta.className = 'comment-meta';
+    const date = document.createElement('span');
+    date.className = 'comment-date';
+    date.textContent = (c.date || 'No date').slice(0, 10);
+    meta.appendChild(date);
+    if (Number(c.likes) > 0) {
+      const likes = document.createElement('span');
+      likes.className = 'comment-likes';
+      likes.innerHTML = '<i class="fas fa-thumbs-up"></i> ';
+      likes.appendChild(document.createTextNode(String(c.likes)));
+      meta.appendChild(likes);
+    }
+    header.appendChild(user);
+    header.appendChild(meta);
+    const text = document.createElement('div');
+    text.className = 'comment-text';
+    text.textContent = c.text || 'No text available.';
+    card.appendChild(header);
+    card.appendChild(text);
+    return card;
+  }
+
+  async function load(page, cursor) {
+    const params = new URLSearchParams({ per_page: String(state.perPage) });
+    if (cursor) params.set(cursor[0], String(cursor[1]));
+    Object.entries(filters).forEach(([key, el]) => { if (el && el.value) params.set(key, el.value); });
+    try {
+      const resp = await fetch(`/api/results/${encodeURIComponent(resultId)}/comments?${params}`, { credentials: 'same-origin' });
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const data = await resp.json();
+      state.page = page;
+      state.next = data.next;
+      state.prev = data.prev;
+      // The total is only counted for the first page
+      if (data.total !== null) {
+        state.pages = Math.max(1, Math.ceil(data.total / data.per_page));
+        if (totalEl) totalEl.textContent = data.total;
+      }
+      container.innerHTML = '';
+      if (!data.items.length) {
+        container.innerHTML = '<p class="header-description">No comments match these filters.</p>';
+      }
+      data.items.forEach(c => container.appendChild(renderComment(c)));
+      info.textContent = `Page ${state.page} of ${state.pages}`;
+      prevBtn.disabled = state.prev === null;
+      nextBtn.disabled = state.next === null;
+    } catch (e) {
+      console.error('Failed to load comments', e);
+      container.innerHTML = '<p class="header-description">Could not load comments.</p>';
+    }
+  }
+
+  prevBtn.addEventListener('click', () => load(state.page - 1, ['before', state.prev]));
+  nextBtn.addEventListener('click', () => load(state.page + 1, ['after', state.next]));
+  Object.values(filters).forEach(el => el && el.addEventListener('change', () => load(1)));
+  load(1);
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  const section = document.getElementById('comments-section');
+  if (section) initCommentPager(section);
+});
@@ -0,0 +1,170 @@
+# Tests for tweet fetching: paging and since_id against a local stand-in for the
+# Twitter API, and the cache-first layer (stale-while-revalidate, single-flight)
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import twitter_utils
+from helpers import tweet_store
+
+class FakeAPI:
+    """Stands in for fetch_tweets: slow, counts calls, returns a new batch each time."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def __call__(self, query, max_results=30, since_id=None, until_id=None):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('rate limited')
+        return [{'id': str(n * 100 + 99 - i), 'text': f'{query} {n}', 'created_at': None}
+                for i in range(max_results)]
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(tweet_store, 'DB_PATH', str(tmp_path / 'tweets.db'))
+    fake = FakeAPI()
+    monkeypatch.setattr(twitter_utils, 'fetch_tweets', fake)
+    yield fake
+    # Let background refreshes finish before the next test swaps the store
+    deadline = time.time() + 2
+    while twitter_utils._flights and time.time() < deadline:
+        time.sleep(0.02)
+
+def test_concurrent_identical_queries_share_one_call(api):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(twitter_utils.fetch_tweets_resilient('#x', 5)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert api.calls == 1
+    assert {source for _, source in results} == {'live'}
+    assert len({tuple(t['id'] for t in tweets) for tweets, _ in results}) == 1
+
+def test_fresh_cache_is_served_without_a_call(api):
+    twitter_utils.fetch_tweets_resilient('#x', 5)
+    tweets, source = twitter_utils.fetch_tweets_resilient('#x', 5)
+    assert source == 'cache' and api.calls == 1
+
+def test_stale_result_is_served_at_once_and_refreshed_once(api, monkeypatch):
+    first, _ = twitter_utils.fetch_tweets_resilient('#x', 5)
+    monkeypatch.setattr(twitter_utils, 'FRESH_SECONDS', 0)
+    started = time.time()
+    for _ in range(5):
+        tweets, source = twitter_utils.fetch_tweets_resilient('#x', 5)
+        assert source == 'stale' and tweets == first
+    assert time.time() - started < api.delay
+    deadline = time.time() + 2
+    while tweet_store.load_query('#x')['tweets'] == first and time.time() < deadline:
+        time.sleep(0.02)
+    assert api.calls == 2
+    assert tweet_store.load_query('#x')['tweets'] != first
+
+def test_expired_cache_goes_live_and_falls_back_on_failure(api, monkeypatch):
+    first, _ = twitter_utils.fetch_tweets_resilient('#x', 5)
+    monkeypatch.setattr(twitter_utils, 'FRESH_SECONDS', 0)
+    monkeypatch.setattr(twitter_utils, 'STALE_SECONDS', 0)
+    api.fail = True
+    tweets, source = twitter_utils.fetch_tweets_resilient('#x', 5)
+    assert source == 'cache' and tweets == first and api.calls == 2
+
+class StubTwitter:
+    """Serves /2/tweets/search/recent from `total` tweets with ids 1..total, newest first."""
+
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                stub.calls.append(q)
+                payload = json.dumps(stub.respond(q)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, q):
+        assert 10 <= int(q['max_results']) <= 100
+        ids = [i for i in range(self.total, 0, -1)
+               if i > int(q.get('since_id', 0)) and i < int(q.get('until_id', self.total + 1))]
+        start = int(q.get('next_token', 0))
+        page = ids[start:start + int(q['max_results'])]
+        body = {
+            'data': [{'id': str(i), 'text': f'tweet {i}', 'author_id': str(i % 3)} for i in page],
+            'includes': {'users': [{'id': str(k), 'username': f'user{k}'} for k in range(3)]},
+            'meta': {'result_count': len(page)},
+        }
+        if start + len(page) < len(ids):
+            body['meta']['next_token'] = str(start + len(page))
+        return body
+
+@pytest.fixture
+def stub_twitter(tmp_path, monkeypatch):
+    monkeypatch.setattr(tweet_store, 'DB_PATH', str(tmp_path / 'tweets.db'))
+    monkeypatch.setenv('TWITTER_BEARER_TOKEN', 'test-token')
+    stubs = []
+
+    def start(total):
+        stub = StubTwitter(total)
+        stubs.append(stub)
+        monkeypatch.setattr(twitter_utils, 'TWITTER_API_BASE', f'http://127.0.0.1:{stub.server.server_address[1]}')
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.server.shutdown()
+        stub.server.server_close()
+
+def test_pages_are_fetched_lazily_up_to_the_count(stub_twitter):
+    stub = stub_twitter(1000)
+    tweets = twitter_utils.fetch_tweets('#x', max_results=250)
+    assert [t['id'] for t in tweets] == [str(i) for i in range(1000, 750, -1)]
+    assert tweets[0]['username'] == 'user1'
+    assert [int(c['max_results']) for c in stub.calls] == [100, 100, 50]
+    pages = twitter_utils.iter_tweet_pages('#x', max_results=250)
+    next(pages)
+    assert len(stub.calls) == 4
+
+def test_repeat_analysis_fetches_only_new_tweets(stub_twitter, monkeypatch):
+    stub = stub_twitter(120)
+    tweets, source = twitter_utils.fetch_tweets_resilient('#x', 100, allow_mock=False)
+    assert source == 'live' and len(tweets) == 100
+    stub.total = 125
+    stub.calls.clear()
+    monkeypatch.setattr(twitter_utils, 'FRESH_SECONDS', 0)
+    monkeypatch.setattr(twitter_utils, 'STALE_SECONDS', 0)
+    tweets, source = twitter_utils.fetch_tweets_resilient('#x', 100, allow_mock=False)
+    assert source == 'live'
+    assert [c.get('since_id') for c in stub.calls] == ['120']
+    assert [t['id'] for t in tweets] == [str(i) for i in range(125, 25, -1)]
+
+def test_client_is_reused(monkeypatch):
+    monkeypatch.setenv('TWITTER_BEARER_TOKEN', 'test-token')
+    client = twitter_utils._client()
+    assert twitter_utils._client() is client
+    # A forked worker must not inherit the parent's session
+    monkeypatch.setattr(twitter_utils, '_client_key', (-1, 'test-token'))
+    assert twitter_utils._client() is not client
@@ -1,75 +1,170 @@
 import os
+import time
+import threading
+import requests
 import tweepy
-import json
-import hashlib
-from datetime import datetime, timedelta
+from datetime import datetime
 
-def fetch_tweets(query, max_results=30):
-    """
-    Fetch recent tweets for a query using Twitter API v2 via Tweepy.
-    Requires TWITTER_BEARER_TOKEN env var.
-    Returns list of dicts: {"id": ..., "text": ..., "created_at": ...}
-    """
+from helpers import tweet_store
+
+DEFAULT_API_BASE = 'https://api.twitter.com'
+# Point at a stand-in server (tests, proxies); a non-default base uses plain REST instead of tweepy
+TWITTER_API_BASE = os.getenv('TWITTER_API_BASE', DEFAULT_API_BASE).rstrip('/')
+# Upper bound for one analysis (100 per API page)
+MAX_TWEETS = int(os.getenv('TWITTER_MAX_TWEETS', 500))
+TWEET_FIELDS = ['created_at', 'lang', 'author_id']
+
+# Cached results younger than FRESH are served as is; up to STALE they are served
+# while a background refresh runs; older ones are fetched live
+FRESH_SECONDS = float(os.getenv('TWEET_FRESH_SECONDS', 300))
+STALE_SECONDS = float(os.getenv('TWEET_STALE_SECONDS', 3600))
+# A background refresh holds its claim this long (covers a worker dying mid-refresh)
+REFRESH_LEASE_SECONDS = float(os.getenv('TWEET_REFRESH_LEASE_SECONDS', 60))
+
+# In-flight live fetches per (query, max_results), for single-flight
+_flights = {}
+_flights_lock = threading.Lock()
+
+# Clients are reused for the life of the process (rebuilt after a fork)
+_client_lock = threading.Lock()
+_client_obj = None
+_client_key = None
+_session = None
+_session_pid = None
+
+def _bearer():
     bearer = os.environ.get("TWITTER_BEARER_TOKEN")
     if not bearer:
         raise RuntimeError("TWITTER_BEARER_TOKEN environment variable is not set.")
+    return bearer
+
+
+def _client():
+    """Process-wide tweepy.Client (its requests.Session keeps connections alive), rebuilt after a fork."""
+    global _client_obj, _client_key
+    key = (os.getpid(), _bearer())
+    if _client_obj is None or _client_key != key:
+        with _client_lock:
+            if _client_obj is None or _client_key != key:
+                # Don't sleep-block on rate limits here; instead let the caller receive a clear error
+                _client_obj = tweepy.Client(bearer_token=key[1], wait_on_rate_limit=False, return_type=dict)
+                _client_key = key
+    return _client_obj
+
+
+def _http():
+    """Process-wide requests.Session for a non-default TWITTER_API_BASE (stand-ins, proxies)."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _client_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session, _session_pid = requests.Session(), os.getpid()
+    return _session
 
-    # Don't sleep-block on rate limits here; instead let the caller receive a clear error
-    client = tweepy.Client(bearer_token=bearer, wait_on_rate_limit=False)
+
+def _search_page(query, max_results, since_id=None, until_id=None, next_token=None):
+    """One page of GET /2/tweets/search/recent as the raw JSON dict."""
+    params = {
+        'query': query,
+        'max_results': max_results,
+        'tweet.fields': ','.join(TWEET_FIELDS),
+        'expansions': 'author_id',
+        'user.fields': 'username',
+    }
+    for name, value in (('since_id', since_id), ('until_id', until_id), ('next_token', next_token)):
+        if value:
+            params[name] = value
+    if TWITTER_API_BASE == DEFAULT_API_BASE:
+        return _client().search_recent_tweets(
+            query=query, max_results=max_results, since_id=since_id, until_id=until_id,
+            next_token=next_token, tweet_fields=TWEET_FIELDS, expansions=['author_id'],
+            user_fields=['username'],
+        )
+    resp = _http().get(f'{TWITTER_API_BASE}/2/tweets/search/recent', params=params,
+                       headers={'Authorization': f'Bearer {_bearer()}'}, timeout=15)
+    if resp.status_code != 200:
+        raise RuntimeError(f"{resp.status_code} {resp.text[:200]}")
+    return resp.json()
+
+
+def iter_tweet_pages(query, max_results=30, since_id=None, until_id=None):
+    """
+    Yield recent tweets for a query one API page at a time (newest first), stopping
+    at max_results or the last page; the next page is requested only when the
+    caller asks for it. since_id/until_id bound the ids returned (exclusive).
+    Tweets are dicts: {"id", "text", "created_at", "username"}.
+    """
     # Exclude retweets and fetch English tweets by default
     q = f"{query} -is:retweet lang:en"
-    # clamp results to Twitter API limits
-    max_results = max(5, min(int(max_results or 30), 100))
-    try:
-        resp = client.search_recent_tweets(query=q, tweet_fields=["created_at", "lang"], max_results=max_results)
-    except Exception as e:
-        # Tweepy may raise a TooManyRequests or other exceptions when rate-limited or when the API fails.
-        # Raise a RuntimeError so the caller can handle the error and fall back to cache/mock.
-        raise RuntimeError(f"Error fetching tweets from Twitter API: {e}")
-
-    tweets = []
-    if resp and getattr(resp, 'data', None):
-        for t in resp.data:
-            created = getattr(t, "created_at", None)
-            tweets.append({
-                "id": str(t.id),
-                "text": t.text,
-                "created_at": created.isoformat() if created else None,
-            })
-    return tweets
+    fetched = 0
+    next_token = None
+    while fetched < max_results:
+        # The endpoint takes 10..100 per page
+        page_size = max(10, min(100, max_results - fetched))
+        try:
+            resp = _search_page(q, page_size, since_id, until_id, next_token)
+        except Exception as e:
+            # Tweepy may raise a TooManyRequests or other exceptions when rate-limited or when the API fails.
+            # Raise a RuntimeError so the caller can handle the error and fall back to cache/mock.
+            raise RuntimeError(f"Error fetching tweets from Twitter API: {e}")
+        users = {u.get('id'): u.get('username') for u in (resp.get('includes') or {}).get('users', [])}
+        page = [{
+            "id": str(t['id']),
+            "text": t.get('text', ''),
+            "created_at": t.get('created_at'),
+            "username": users.get(t.get('author_id')),
+        } for t in (resp.get('data') or [])][:max_results - fetched]
+        fetched += len(page)
+        if page:
+            yield page
+        next_token = (resp.get('meta') or {}).get('next_token')
+        if not next_token:
+            return
+
+
+def fetch_tweets(query, max_results=30, since_id=None, until_id=None):
+    """
+    Fetch recent tweets for a query using Twitter API v2, paging until max_results
+    (capped at TWITTER_MAX_TWEETS). Requires TWITTER_BEARER_TOKEN env var.
+    Returns list of dicts: {"id": ..., "text": ..., "created_at": ..., "username": ...}
+    """
+    max_results = max(1, min(int(max_results or 30), MAX_TWEETS))
+    return [t for page in iter_tweet_pages(query, max_results, since_id, until_id) for t in page]
 
 
-def _cache_path_for_query(query):
-    safe = hashlib.sha1(query.encode('utf-8')).hexdigest()
-    base = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'cache')
-    os.makedirs(base, exist_ok=True)
-    return os.path.join(base, f"twitter_{safe}.json")
+def fetch_tweets_incremental(query, max_results=30):
+    """
+    Like fetch_tweets, reusing what the tweet store already holds for the query:
+    only tweets newer than its newest id are fetched (since_id), plus older ones
+    (until_id) if the stored set is smaller than max_results.
+    Returns (tweets, number fetched from the API).
+    """
+    stored = tweet_store.load_query(query)
+    if not stored or not stored['newest_id']:
+        tweets = fetch_tweets(query, max_results)
+        return tweets, len(tweets)
+    new = fetch_tweets(query, max_results, since_id=stored['newest_id'])
+    seen = {t['id'] for t in new}
+    merged = new + [t for t in stored['tweets'] if t['id'] not in seen]
+    fetched = len(new)
+    if len(merged) < max_results:
+        ids = [int(t['id']) for t in merged if str(t['id']).isdigit()]
+        older = fetch_tweets(query, max_results - len(merged), until_id=str(min(ids))) if ids else []
+        seen.update(t['id'] for t in merged)
+        merged += [t for t in older if t['id'] not in seen]
+        fetched += len(older)
+    return merged[:max_results], fetched
 
 
 def save_tweets_cache(query, tweets):
-    path = _cache_path_for_query(query)
-    payload = {
-        'query': query,
-        'fetched_at': datetime.utcnow().isoformat(),
-        'tweets': tweets
-    }
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(payload, f, ensure_ascii=False)
+    """Store a search result in helpers.tweet_store (atomic, deduped by tweet id)."""
+    tweet_store.save_query(query, tweets)
 
 
 def load_tweets_cache(query, max_age_minutes=60):
-    path = _cache_path_for_query(query)
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            payload = json.load(f)
-        fetched = datetime.fromisoformat(payload.get('fetched_at'))
-        if datetime.utcnow() - fetched > timedelta(minutes=max_age_minutes):
-            return None
-        return payload.get('tweets', [])
-    except Exception:
-        return None
+    """Tweets cached for `query` within the last `max_age_minutes`, or None."""
+    stored = tweet_store.load_query(query, max_age=max_age_minutes * 60)
+    return stored['tweets'] if stored else None
 
 
 def mock_tweets(query, count=10):
@@ -88,27 +183,99 @@ def mock_tweets(query, count=10):
     return result
 
 
+def _live(query, max_results):
+    tweets, _ = fetch_tweets_incremental(query, max_results=max_results)
+    if tweets:
+        try:
+            save_tweets_cache(query, tweets)
+        except Exception as e:
+            print(f"[twitter_utils] cache write failed: {e}")
+    return tweets
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _single_flight(key, fn):
+    """Run fn() once for concurrent callers with the same key; the others wait for its result."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if leader:
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with _flights_lock:
+                _flights.pop(key, None)
+            flight.done.set()
+    else:
+        flight.done.wait()
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
+
+
+def _revalidate(query, max_results):
+    """Refresh a stale query in the background, once across threads and workers."""
+    key = (query, max_results)
+    with _flights_lock:
+        if key in _flights:
+            return
+    if not tweet_store.claim_refresh(query, REFRESH_LEASE_SECONDS):
+        return
+
+    def run():
+        try:
+            _single_flight(key, lambda: _live(query, max_results))
+        except Exception as e:
+            print(f"[twitter_utils] background refresh failed: {e}")
+        finally:
+            tweet_store.release_refresh(query)
+
+    threading.Thread(target=run, name='tweet-refresh', daemon=True).start()
+
+
 def fetch_tweets_resilient(query, max_results=30, use_cache=True, allow_mock=True):
-    """Try to fetch tweets from Twitter API. On failure, return cached results if available, otherwise return mock data if allowed.
+    """Return tweets for a query, from the cache when it is recent enough, else from the API.
+
+    - cached within TWEET_FRESH_SECONDS: served as is ('cache')
+    - cached within TWEET_STALE_SECONDS: served at once and refreshed in the background ('stale')
+    - otherwise fetched live, only what's newer than the stored tweets (since_id);
+      concurrent identical queries share one API call ('live')
+    A cached result counts only if it holds max_results tweets. If the API fails,
+    any stored result is used ('cache'), then mock data if allowed.
 
-    Returns tuple: (tweets_list, source) where source is 'live', 'cache', or 'mock'.
+    Returns tuple: (tweets_list, source) where source is 'live', 'cache', 'stale', 'mock' or 'empty'.
     """
+    max_results = max(5, min(int(max_results or 30), MAX_TWEETS))
+    if use_cache:
+        stored = tweet_store.load_query(query, max_age=STALE_SECONDS)
+        if stored and len(stored['tweets']) >= max_results:
+            if time.time() - stored['fetched_at'] <= FRESH_SECONDS:
+                return stored['tweets'][:max_results], 'cache'
+            _revalidate(query, max_results)
+            return stored['tweets'][:max_results], 'stale'
+
     try:
-        tweets = fetch_tweets(query, max_results=max_results)
+        tweets = _single_flight((query, max_results), lambda: _live(query, max_results))
         if tweets:
-            try:
-                save_tweets_cache(query, tweets)
-            except Exception:
-                pass
             return tweets, 'live'
     except Exception as e:
         # log to console (the caller will handle user-visible messages)
         print(f"[twitter_utils] fetch error: {e}")
 
     if use_cache:
-        cached = load_tweets_cache(query)
-        if cached:
-            return cached, 'cache'
+        stored = tweet_store.load_query(query)
+        if stored and stored['tweets']:
+            return stored['tweets'][:max_results], 'cache'
 
     if allow_mock:
         return mock_tweets(query, count=min(10, int(max_results or 10))), 'mock'